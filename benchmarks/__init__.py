@@ -0,0 +1 @@
+"""Offline benchmarks with local stand-ins for Telegram Bot API and office.reso.ru."""
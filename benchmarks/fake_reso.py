@@ -0,0 +1,141 @@
+"""Tiny local site that imitates office.reso.ru login page, welcome page and session cookie rotation."""
+
+import secrets
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Any, Dict, Optional, Tuple
+
+from src.choiches import CookieFields
+
+LOGIN_PAGE = '<html><body><form><div class="welcome">Добро пожаловать</div><input type="password"></form></body></html>'
+OFFICE_PAGE = '<html><body><div class="office">РЕСО офис</div></body></html>'
+
+
+class FakeReso(object):
+    """Sessions of fake office: ASP.NET_SessionId and ResoOffice60 pairs, the latter rotates on demand."""
+
+    def __init__(self) -> None:
+        """Site initial method."""
+        self.lock = Lock()
+        # ASP.NET_SessionId -> действующее значение ResoOffice60
+        self.sessions: Dict[str, str] = {}
+        # сессии, которым при следующем запросе выдается новый ResoOffice60
+        self.rotate_next: Dict[str, bool] = {}
+        # код ответа на каждый запрос, 5xx изображает сбой офиса
+        self.status = 200
+        self.requests = 0
+
+    def login(self) -> Tuple[str, str]:
+        """Create logged in session, like human entered password.
+
+        Returns:
+            Tuple with ASP.NET_SessionId and ResoOffice60 values.
+        """
+        with self.lock:
+            session, office = secrets.token_hex(12), secrets.token_hex(48).upper()
+            self.sessions[session] = office
+            return session, office
+
+    def logout(self, session: str) -> None:
+        """Finish session.
+
+        Args:
+            session: ASP.NET_SessionId value.
+        """
+        with self.lock:
+            self.sessions.pop(session, None)
+
+    def rotate(self, session: Optional[str] = None) -> None:
+        """Make server issue new ResoOffice60 on next request of session.
+
+        Args:
+            session: ASP.NET_SessionId value, all sessions if not passed.
+        """
+        with self.lock:
+            for name in ([session] if session else list(self.sessions)):
+                self.rotate_next[name] = True
+
+    def reissue(self, session: str) -> str:
+        """Issue new ResoOffice60 right now, like answer to request of the session owner.
+
+        Args:
+            session: ASP.NET_SessionId value.
+
+        Returns:
+            New ResoOffice60 value.
+        """
+        with self.lock:
+            self.sessions[session] = secrets.token_hex(48).upper()
+            return self.sessions[session]
+
+    def page(self, cookies: Dict[str, str]) -> Tuple[str, Optional[str]]:
+        """Get page for request cookies.
+
+        Args:
+            cookies: request cookies by name.
+
+        Returns:
+            Tuple with page html and new ResoOffice60 value, if it was rotated.
+        """
+        with self.lock:
+            self.requests += 1
+            session = cookies.get(CookieFields.aspnet, '')
+            if self.sessions.get(session) != cookies.get(CookieFields.reso_office60):
+                return LOGIN_PAGE, None
+            if self.rotate_next.pop(session, False):
+                self.sessions[session] = secrets.token_hex(48).upper()
+                return OFFICE_PAGE, self.sessions[session]
+            return OFFICE_PAGE, None
+
+
+class FakeResoHandler(BaseHTTPRequestHandler):
+    """Http handler of fake office, every path returns office or login page."""
+
+    def do_GET(self) -> None:
+        """Return page for request cookies."""
+        cookies = {name: morsel.value for name, morsel in SimpleCookie(self.headers.get('Cookie', '')).items()}
+        html, rotated = self.server.site.page(cookies)  # type: ignore
+        data = html.encode()
+        self.send_response(self.server.site.status)  # type: ignore
+        if rotated is not None:
+            self.send_header('Set-Cookie', '{name}={value}; path=/; HttpOnly'.format(
+                name=CookieFields.reso_office60, value=rotated,
+            ))
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        """Keep benchmark output clean."""
+
+
+class FakeResoServer(object):
+    """Run fake office on a free local port."""
+
+    def __init__(self, site: Optional[FakeReso] = None) -> None:
+        """Server initial method.
+
+        Args:
+            site: site state, new one is created if not passed.
+        """
+        self.site = site or FakeReso()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeResoHandler)
+        self.server.daemon_threads = True
+        self.server.site = self.site  # type: ignore
+
+    @property
+    def url(self) -> str:
+        """Main page url."""
+        return 'http://127.0.0.1:{port}/'.format(port=self.server.server_address[1])
+
+    def __enter__(self) -> 'FakeResoServer':
+        """Start server."""
+        Thread(target=self.server.serve_forever, name='FakeReso', daemon=True).start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Stop server."""
+        self.server.shutdown()
+        self.server.server_close()
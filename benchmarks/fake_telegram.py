@@ -0,0 +1,174 @@
+"""Local http stand-in for the Bot API methods used by MessageManager."""
+
+import json
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from telebot import apihelper, asyncio_helper
+
+NOT_MODIFIED = 'Bad Request: message is not modified: specified new message content is exactly the same'
+
+
+class FakeBotApi(object):
+    """Pinned messages of chats and api call counters, served by FakeBotApiServer."""
+
+    def __init__(self, latency: float = 0.0, rate_limit: Optional[int] = None) -> None:
+        """Api initial method.
+
+        Args:
+            latency: seconds added to every request, imitates network round trip.
+            rate_limit: requests per second of the whole bot, above it 429 is returned like telegram does.
+        """
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self._recent: deque = deque()
+        self.lock = Lock()
+        self.messages: Dict[int, Dict[str, Any]] = {}
+        self.pinned: Dict[str, int] = {}
+        self.calls: Counter = Counter()
+
+    def call(self, method: str, params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        """Execute api method.
+
+        Args:
+            method: api method name, like getChat.
+            params: request parameters.
+
+        Returns:
+            Tuple with http status and api response.
+        """
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls[method] += 1
+            if self._limited():
+                self.calls['429'] += 1
+                return 429, {
+                    'ok': False,
+                    'error_code': 429,
+                    'description': 'Too Many Requests: retry after 1',
+                    'parameters': {'retry_after': 1},
+                }
+            handler = getattr(self, '_' + method, None)
+            if handler is None:
+                return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+            return handler(params)
+
+    def total_calls(self) -> int:
+        """Get amount of all api calls.
+
+        Returns:
+            Calls count.
+        """
+        with self.lock:
+            return sum(count for method, count in self.calls.items() if method != '429')
+
+    def _limited(self) -> bool:
+        if self.rate_limit is None:
+            return False
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1:
+            self._recent.popleft()
+        if len(self._recent) >= self.rate_limit:
+            return True
+        self._recent.append(now)
+        return False
+
+    def _getChat(self, params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:  # noqa: N802
+        chat: Dict[str, Any] = {'id': int(params['chat_id']), 'type': 'group', 'title': 'reso'}
+        message_id = self.pinned.get(params['chat_id'])
+        if message_id is not None:
+            chat['pinned_message'] = self.messages[message_id]
+        return 200, {'ok': True, 'result': chat}
+
+    def _sendMessage(self, params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:  # noqa: N802
+        message_id = len(self.messages) + 1
+        self.messages[message_id] = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(params['chat_id']), 'type': 'group'},
+            'text': params['text'],
+        }
+        return 200, {'ok': True, 'result': self.messages[message_id]}
+
+    def _pinChatMessage(self, params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:  # noqa: N802
+        self.pinned[params['chat_id']] = int(params['message_id'])
+        return 200, {'ok': True, 'result': True}
+
+    def _editMessageText(self, params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:  # noqa: N802
+        message = self.messages[int(params['message_id'])]
+        if message['text'] == params['text']:
+            return 400, {'ok': False, 'error_code': 400, 'description': NOT_MODIFIED}
+        message['text'] = params['text']
+        message['edit_date'] = int(time.time())
+        return 200, {'ok': True, 'result': message}
+
+    def _getUpdates(self, params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:  # noqa: N802
+        return 200, {'ok': True, 'result': []}
+
+
+class FakeBotApiHandler(BaseHTTPRequestHandler):
+    """Http handler for /bot<token>/<method> urls."""
+
+    def do_GET(self) -> None:
+        """Handle api request with query parameters."""
+        self._handle()
+
+    def do_POST(self) -> None:
+        """Handle api request with query or form parameters."""
+        self._handle()
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        """Keep benchmark output clean."""
+
+    def _handle(self) -> None:
+        url = urlparse(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length', 0))
+        if length:
+            body = self.rfile.read(length).decode()
+            params.update({name: values[0] for name, values in parse_qs(body).items()})
+        status, response = self.server.api.call(url.path.rsplit('/', 1)[-1], params)  # type: ignore
+        data = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeBotApiServer(object):
+    """Run fake Bot API on a free local port and point telebot to it."""
+
+    def __init__(self, api: Optional[FakeBotApi] = None) -> None:
+        """Server initial method.
+
+        Args:
+            api: api state, new one is created if not passed.
+        """
+        self.api = api or FakeBotApi()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeBotApiHandler)
+        self.server.daemon_threads = True
+        self.server.api = self.api  # type: ignore
+        self._previous_urls: Tuple[str, str] = (apihelper.API_URL, asyncio_helper.API_URL)
+
+    @property
+    def url(self) -> str:
+        """Base url of server."""
+        return 'http://127.0.0.1:{port}'.format(port=self.server.server_address[1])
+
+    def __enter__(self) -> 'FakeBotApiServer':
+        """Start server and redirect requests of sync and async telebot to it."""
+        Thread(target=self.server.serve_forever, name='FakeBotApi', daemon=True).start()
+        self._previous_urls = (apihelper.API_URL, asyncio_helper.API_URL)
+        apihelper.API_URL = asyncio_helper.API_URL = self.url + '/bot{0}/{1}'
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Stop server and restore telebot urls."""
+        apihelper.API_URL, asyncio_helper.API_URL = self._previous_urls
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,159 @@
+"""Driver-less ResoBrowser: the real session logic on top of a plain http client instead of WebDriver."""
+
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from requests import Session
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+from src.codec import COOKIE_DEFAULTS
+from src.drivers import DriverCache
+from src.journal import CookieJournal
+from src.browser import ResoBrowserMixin
+from src.probe import SessionProbe
+from src.profiles import BrowserProfile
+from src.stores import CookieStore, SnapshotStore
+
+# признак страницы входа, который ищет ResoBrowser.auth_complete
+WELCOME_MARKER = 'class="welcome"'
+
+
+class HttpService(object):
+    """Service stand-in, there is no driver process."""
+
+    def __init__(self, executable_path: Optional[str] = None, log_output: Any = None) -> None:
+        """Service initial method."""
+        self.path = executable_path
+
+
+class HttpDriver(object):
+    """Minimal WebDriver stand-in with cookies and pages of one site, counts emulated WebDriver commands."""
+
+    def __init__(self, service: HttpService, options: Any = None) -> None:
+        """Driver initial method.
+
+        Args:
+            service: service stand-in.
+            options: unused browser options.
+        """
+        self.service = service
+        self.capabilities: Dict[str, Any] = {}
+        self.http = Session()
+        self.cookies: Dict[str, str] = {}
+        self.page_source = ''
+        self.commands: Counter = Counter()
+
+    @property
+    def network(self) -> None:
+        """No bidi, cookies are polled like in drivers without events."""
+        raise WebDriverException('bidi is not supported by http driver')
+
+    def get(self, url: str) -> None:
+        """Open page, cookies set by server are saved.
+
+        Args:
+            url: page url.
+        """
+        self.commands['get'] += 1
+        response = self.http.get(url, cookies=self.cookies, timeout=5)
+        self.http.cookies.clear()
+        self.cookies.update(response.cookies.get_dict())
+        self.page_source = response.text
+
+    def get_cookie(self, name: str) -> Optional[Dict[str, Any]]:
+        """Get cookie in selenium format.
+
+        Args:
+            name: cookie name.
+
+        Returns:
+            Cookie dictionary or None.
+        """
+        self.commands['get_cookie'] += 1
+        if name not in self.cookies:
+            return None
+        return {'name': name, 'value': self.cookies[name], **COOKIE_DEFAULTS}
+
+    def add_cookie(self, cookie: Dict[str, Any]) -> None:
+        """Add cookie.
+
+        Args:
+            cookie: selenium cookie dictionary.
+        """
+        self.commands['add_cookie'] += 1
+        self.cookies[cookie['name']] = cookie['value']
+
+    def delete_cookie(self, name: str) -> None:
+        """Delete cookie.
+
+        Args:
+            name: cookie name.
+        """
+        self.commands['delete_cookie'] += 1
+        self.cookies.pop(name, None)
+
+    def find_element(self, by: str, value: str) -> str:
+        """Find welcome message of login page, the only element ResoBrowser looks for.
+
+        Args:
+            by: locator strategy.
+            value: locator.
+
+        Returns:
+            Found marker.
+        """
+        self.commands['find_element'] += 1
+        if WELCOME_MARKER not in self.page_source:
+            raise NoSuchElementException(value)
+        return WELCOME_MARKER
+
+    def quit(self) -> None:
+        """Close http connections."""
+        self.http.close()
+
+    def __enter__(self) -> 'HttpDriver':
+        """Use driver in with statement."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Quit driver on exit."""
+        self.quit()
+
+
+def make_browser_class(
+    site_url: str,
+    manager: CookieStore,
+    snapshot: SnapshotStore,
+    hashes: List[str],
+    probe: bool = True,
+    journal: Optional[CookieJournal] = None,
+) -> type:
+    """Build ResoBrowser class that runs on HttpDriver against local site.
+
+    Args:
+        site_url: main page of fake office.
+        manager: cookie store of all browsers of class.
+        snapshot: local snapshot store.
+        hashes: account hashes.
+        probe: check session by http probe, otherwise by page.
+        journal: local journal of cookie versions, rollback is off if not passed.
+
+    Returns:
+        Browser class, instances are created with hash.
+    """
+    return type('HttpResoBrowser', (ResoBrowserMixin, HttpDriver), {
+        'url_main': site_url,
+        'url_light': site_url + 'favicon.ico',
+        'hash': hashes[0],
+        'hashes': hashes,
+        'service_class': HttpService,
+        'options': None,
+        'profile': BrowserProfile(),
+        'browser_name': 'Http',
+        'sync': 'poll',
+        'manager': manager,
+        'snapshot': snapshot,
+        'journal': journal,
+        'probe': SessionProbe(url=site_url, cache_time=0.0) if probe else None,
+        'driver_cache': DriverCache(None),
+    })
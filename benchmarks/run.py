@@ -0,0 +1,254 @@
+"""Offline benchmark: api calls per tick, tick latency percentiles and store write throughput.
+
+Usage: python -m benchmarks.run --accounts 20 --ticks 100 --output result.json
+
+Accounts are sharded across fake chats like with SHARD_CHAT_IDS, so any amount fits into pinned messages.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from telebot import TeleBot
+
+from benchmarks.fake_reso import FakeReso, FakeResoServer
+from benchmarks.fake_telegram import FakeBotApi, FakeBotApiServer
+from benchmarks.http_driver import make_browser_class
+from src.bot import RateLimitedBot, TokenBucket
+from src.choiches import CookieFields
+from src.codec import COOKIE_DEFAULTS
+from src.manager import MessageManager
+from src.stores import SnapshotStore
+
+BENCH_TOKEN = '123456:benchmark'
+BENCH_CHAT = '1'
+# аккаунтов на шард с запасом: сессия фейкового офиса занимает около 170 символов сообщения
+ACCOUNTS_PER_SHARD = 8
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    """Get latency summary in milliseconds.
+
+    Args:
+        values: seconds.
+
+    Returns:
+        Dictionary with p50, p90, p99, max and mean.
+    """
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def at(share: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(share * len(ordered)))] * 1000, 3)
+
+    return {
+        'p50_ms': at(0.5),
+        'p90_ms': at(0.9),
+        'p99_ms': at(0.99),
+        'max_ms': round(ordered[-1] * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def session_cookies(session: str, office: str) -> List[Dict[str, Any]]:
+    """Build selenium cookies of fake office session.
+
+    Args:
+        session: ASP.NET_SessionId value.
+        office: ResoOffice60 value.
+
+    Returns:
+        List with dict cookies.
+    """
+    return [
+        {'name': CookieFields.aspnet, 'value': session, **COOKIE_DEFAULTS},
+        {'name': CookieFields.reso_office60, 'value': office, **COOKIE_DEFAULTS},
+    ]
+
+
+def new_manager(rate: float, shards: int = 1) -> MessageManager:
+    """Create manager that talks to fake api through real TeleBot.
+
+    Args:
+        rate: telegram budget in tokens per second.
+        shards: amount of shard chats, the first one is BENCH_CHAT.
+
+    Returns:
+        MessageManager instance.
+    """
+    bucket = TokenBucket(rate=rate, capacity=rate * 1.5, reserve=rate * 0.3)
+    chats = [str(int(BENCH_CHAT) + index) for index in range(shards)]
+    return MessageManager(bot=RateLimitedBot(TeleBot(BENCH_TOKEN), bucket), chats=chats)
+
+
+def shards_for(accounts: int) -> int:
+    """Get amount of shard chats that keeps accounts.
+
+    Args:
+        accounts: amount of accounts.
+
+    Returns:
+        Amount of chats.
+    """
+    return max(1, math.ceil(accounts / ACCOUNTS_PER_SHARD))
+
+
+def measure(api: FakeBotApi, operations: List[Callable[[], Any]]) -> Dict[str, Any]:
+    """Run operations one by one and measure latency and api calls.
+
+    Args:
+        api: fake api with call counters.
+        operations: functions without arguments.
+
+    Returns:
+        Dictionary with throughput, calls per operation and latency percentiles.
+    """
+    calls = api.total_calls()
+    latencies = []
+    started = time.perf_counter()
+    for operation in operations:
+        operation_started = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - operation_started)
+    elapsed = time.perf_counter() - started
+    return {
+        'operations': len(operations),
+        'ops_per_second': round(len(operations) / elapsed, 3) if elapsed else None,
+        'api_calls_per_operation': round((api.total_calls() - calls) / len(operations), 3),
+        'latency': percentiles(latencies),
+    }
+
+
+def bench_store(api: FakeBotApi, site: FakeReso, accounts: int, rate: float, shards: int = 1) -> Dict[str, Any]:
+    """Measure add_account and set_cookies of one client.
+
+    Args:
+        api: fake api.
+        site: fake office.
+        accounts: amount of accounts.
+        rate: telegram budget.
+        shards: amount of shard chats.
+
+    Returns:
+        Results by operation.
+    """
+    manager = new_manager(rate, shards)
+    manager.reinit()
+    hashes = ['bench{index}'.format(index=index) for index in range(accounts)]
+    result = {'add_account': measure(api, [lambda hsh=hsh: manager.add_account(hsh) for hsh in hashes])}
+    result['set_cookies'] = measure(api, [
+        lambda hsh=hsh: manager.set_cookies(session_cookies(*site.login()), hsh) for hsh in hashes
+    ])
+    return result
+
+
+def bench_ticks(
+    api: FakeBotApi,
+    site_server: FakeResoServer,
+    accounts: int,
+    ticks: int,
+    rotate_every: int,
+    rate: float,
+    shards: int = 1,
+) -> Dict[str, Any]:
+    """Measure sync loop ticks of driver-less browsers, one client per account.
+
+    Args:
+        api: fake api.
+        site_server: running fake office.
+        accounts: amount of clients.
+        ticks: ticks of every client.
+        rotate_every: office rotates session cookie of every client once per this amount of ticks.
+        rate: telegram budget of every client.
+        shards: amount of shard chats.
+
+    Returns:
+        Api calls per tick by method, tick latency percentiles and rotation counters.
+    """
+    site = site_server.site
+    setup = new_manager(rate, shards)
+    setup.reinit()
+    hashes = ['tick{index}'.format(index=index) for index in range(accounts)]
+    for hsh in hashes:
+        setup.add_account(hsh)
+        setup.set_cookies(session_cookies(*site.login()), hsh)
+    with tempfile.TemporaryDirectory() as directory:
+        browsers = []
+        for index, hsh in enumerate(hashes):
+            snapshot = SnapshotStore(os.path.join(directory, '{index}.json'.format(index=index)))
+            browser_class = make_browser_class(site_server.url, new_manager(rate, shards), snapshot, hashes)
+            browser = browser_class(hsh)
+            browser.open_session()
+            browsers.append(browser)
+        calls_before = dict(api.calls)
+        latencies: List[float] = []
+        calm_ticks = 0
+        for tick in range(1, ticks + 1):
+            for browser in browsers:
+                if rotate_every and tick % rotate_every == 0:
+                    # человек переходит по страницам, сервер выдает новый ResoOffice60
+                    site.rotate(browser.cookies.get(CookieFields.aspnet))
+                    browser.get(browser.url_main)
+                started = time.perf_counter()
+                calm_ticks += browser.tick()
+                latencies.append(time.perf_counter() - started)
+        total = ticks * len(browsers)
+        calls = {method: count - calls_before.get(method, 0) for method, count in api.calls.items()}
+        commands = sum((browser.commands for browser in browsers), start=type(browsers[0].commands)())
+        for browser in browsers:
+            browser.quit()
+    return {
+        'clients': len(browsers),
+        'ticks': total,
+        'calm_ticks': calm_ticks,
+        'api_calls_per_tick': round(sum(calls.values()) / total, 4),
+        'api_calls_by_method': {method: count for method, count in calls.items() if count},
+        'driver_commands_per_tick': round(sum(commands.values()) / total, 4),
+        'latency': percentiles(latencies),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Parse arguments, run benchmarks and save json results.
+
+    Args:
+        argv: command line arguments without program name, sys.argv is used if not passed.
+    """
+    parser = argparse.ArgumentParser(description='Offline benchmark with fake Telegram Bot API and fake office.')
+    parser.add_argument('--accounts', type=int, default=20, help='accounts and clients')
+    parser.add_argument('--ticks', type=int, default=50, help='ticks of every client')
+    parser.add_argument('--rotate-every', type=int, default=10, help='ticks between session cookie rotations')
+    parser.add_argument('--latency', type=float, default=0.0, help='added api latency in milliseconds')
+    parser.add_argument('--rate', type=float, default=1000.0, help='telegram budget in tokens per second')
+    parser.add_argument('--shards', type=int, help='shard chats, enough for accounts if not passed')
+    parser.add_argument('--output', help='json file for results, printed only if not passed')
+    args = parser.parse_args(argv)
+    shards = args.shards or shards_for(args.accounts)
+
+    api = FakeBotApi(latency=args.latency / 1000)
+    with FakeBotApiServer(api), FakeResoServer() as site_server:
+        results = {
+            'meta': {
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'arguments': vars(args),
+            },
+            'store': bench_store(api, site_server.site, args.accounts, args.rate, shards),
+            'ticks': bench_ticks(api, site_server, args.accounts, args.ticks, args.rotate_every, args.rate, shards),
+        }
+    text = json.dumps(results, indent=4, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='UTF-8') as output_file:
+            output_file.write(text)
+
+
+if __name__ == '__main__':
+    main()
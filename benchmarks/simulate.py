@@ -0,0 +1,435 @@
+"""Convergence simulator: many driver-less clients of one account share a store with latency, failures and rotations.
+
+Every client is a real ResoBrowser session loop on HttpDriver with its own MessageManager, like separate computers.
+The store is the fake Bot API called in process, so hundreds of clients fit in one process. Time is scaled: tick,
+retry and cache intervals and the telegram rate limit are multiplied by --scale, api latency is not.
+
+Usage: python -m benchmarks.simulate --clients 2,10,50,200 --failure-rate 0.05 --output simulate.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from requests import ConnectionError as ConnectionErrorRequests
+from telebot.apihelper import ApiTelegramException
+from telebot.types import Chat, Message
+
+from benchmarks.fake_reso import FakeReso, FakeResoServer
+from benchmarks.fake_telegram import FakeBotApi
+from benchmarks.http_driver import make_browser_class
+from benchmarks.run import BENCH_CHAT, percentiles, session_cookies
+from src import codec
+from src.bot import RateLimitedBot, TokenBucket
+from src.choiches import CookieFields
+from src.config import INI_FILENAME, INI_INTERVALS, get_intervals
+from src.exceptions import ResoException
+from src.manager import MessageManager
+from src.scheduler import TickScheduler
+from src.settings import PINNED_CACHE_TTL
+from src.stores import SnapshotStore
+
+SIM_HASH = 'shared'
+# реальный лимит телеграм на бота, запросов в секунду
+TELEGRAM_LIMIT = 30
+
+
+class RecordingBotApi(FakeBotApi):
+    """Fake api that keeps history of session values written for the shared hash."""
+
+    def __init__(self, site: FakeReso, latency: float = 0.0, rate_limit: Optional[int] = None) -> None:
+        """Api initial method.
+
+        Args:
+            site: fake office, written sessions are checked against it.
+            latency: seconds added to every request.
+            rate_limit: requests per second of the whole bot.
+        """
+        super().__init__(latency=latency, rate_limit=rate_limit)
+        self.site = site
+        self.history: List[str] = []
+        self.lost_updates = 0
+        self.stale_writes = 0
+
+    def current(self) -> Optional[str]:
+        """Get ResoOffice60 value stored for the shared hash.
+
+        Returns:
+            Cookie value or None.
+        """
+        with self.lock:
+            return self.history[-1] if self.history else None
+
+    def _editMessageText(self, params: Dict[str, str]) -> Any:  # noqa: N802
+        status, response = super()._editMessageText(params)
+        if status == 200:
+            self._record(params['text'])
+        return status, response
+
+    def _sendMessage(self, params: Dict[str, str]) -> Any:  # noqa: N802
+        status, response = super()._sendMessage(params)
+        self._record(params['text'])
+        return status, response
+
+    def _record(self, text: str) -> None:
+        office = office_value(codec.loads(text).get(SIM_HASH))
+        if office is None or (self.history and self.history[-1] == office):
+            return
+        if office in self.history:
+            # более новое значение затерто старым
+            self.lost_updates += 1
+        with self.site.lock:
+            valid = office in self.site.sessions.values()
+        if not valid:
+            # записаны куки, которые сервер уже не принимает
+            self.stale_writes += 1
+        self.history.append(office)
+
+
+class LocalBot(object):
+    """TeleBot replacement that calls fake api in process and injects network failures."""
+
+    token = 'simulate'
+
+    def __init__(self, api: FakeBotApi, failure_rate: float = 0.0, scale: float = 1.0) -> None:
+        """Bot initial method.
+
+        Args:
+            api: fake api.
+            failure_rate: share of calls that fail with connection error.
+            scale: time scale, retry_after of telegram is multiplied by it.
+        """
+        self.api = api
+        self.failure_rate = failure_rate
+        self.scale = scale
+        self.calls = 0
+        self.failures = 0
+
+    def get_chat(self, chat_id: str) -> Chat:
+        """Get chat with pinned message."""
+        return Chat.de_json(self._call('getChat', chat_id=chat_id))
+
+    def send_message(self, chat_id: str, text: str) -> Message:
+        """Send message."""
+        return Message.de_json(self._call('sendMessage', chat_id=chat_id, text=text))
+
+    def pin_chat_message(self, chat_id: str, message_id: int) -> bool:
+        """Pin message."""
+        return self._call('pinChatMessage', chat_id=chat_id, message_id=str(message_id))
+
+    def edit_message_text(self, text: str, chat_id: str, message_id: int) -> Message:
+        """Edit message text."""
+        return Message.de_json(self._call('editMessageText', chat_id=chat_id, message_id=str(message_id), text=text))
+
+    def _call(self, method: str, **params: str) -> Any:
+        self.calls += 1
+        if random.random() < self.failure_rate:
+            self.failures += 1
+            raise ConnectionErrorRequests('simulated network failure')
+        status, response = self.api.call(method, params)
+        if status != 200:
+            response = json.loads(json.dumps(response))
+            if 'parameters' in response:
+                response['parameters']['retry_after'] *= self.scale
+            raise ApiTelegramException(method, None, response)
+        return response['result']
+
+
+def office_value(cookies: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+    """Get ResoOffice60 value of cookies.
+
+    Args:
+        cookies: selenium cookies list.
+
+    Returns:
+        Cookie value or None.
+    """
+    for cookie in cookies or []:
+        if cookie['name'] == CookieFields.reso_office60:
+            return cookie['value']
+    return None
+
+
+class SimClient(object):
+    """One computer: browser, its own store client and a thread with session loop."""
+
+    def __init__(self, browser: Any, bot: LocalBot) -> None:
+        """Client initial method.
+
+        Args:
+            browser: HttpResoBrowser instance.
+            bot: bot of client manager.
+        """
+        self.browser = browser
+        self.bot = bot
+        self.actions: List[Callable[[], None]] = []
+        self.lock = threading.Lock()
+        # значения ResoOffice60, которые клиент считал рабочими, по порядку
+        self.held: List[Optional[str]] = []
+        self.flaps = 0
+        self.errors = 0
+        self.thread = threading.Thread(target=self.loop, name='SimClient', daemon=True)
+        self.stop = threading.Event()
+
+    def act(self, action: Callable[[], None]) -> None:
+        """Run action of human in client thread before next tick.
+
+        Args:
+            action: function without arguments.
+        """
+        with self.lock:
+            self.actions.append(action)
+        self.browser.manager.changed.set()
+
+    def loop(self) -> None:
+        """Tick until stopped, like ResoBrowser.run."""
+        seen = self.browser.manager.changed.generation
+        while not self.stop.is_set():
+            with self.lock:
+                actions, self.actions = self.actions, []
+            for action in actions:
+                action()
+            try:
+                calm = self.browser.tick()
+            except ResoException:
+                # retry исчерпал попытки, настоящий клиент перезапустился бы
+                self.errors += 1
+                calm = False
+            self.track()
+            scheduler = self.browser.scheduler
+            seen = self.browser.manager.changed.wait_newer(seen, scheduler.stable() if calm else scheduler.activity())
+
+    def track(self) -> None:
+        """Count returns to cookies that client already left."""
+        office = office_value(self.browser.last_cookies)
+        if self.held and self.held[-1] == office:
+            return
+        if office in self.held:
+            self.flaps += 1
+        self.held.append(office)
+
+    def office(self) -> Optional[str]:
+        """Get ResoOffice60 value in browser.
+
+        Returns:
+            Cookie value or None.
+        """
+        return self.browser.cookies.get(CookieFields.reso_office60)
+
+
+def new_client(
+    api: FakeBotApi,
+    site_url: str,
+    directory: str,
+    index: int,
+    failure_rate: float,
+    scale: float,
+) -> SimClient:
+    """Create client with its own manager, snapshot and scaled scheduler.
+
+    Args:
+        api: fake api.
+        site_url: main page of fake office.
+        directory: directory for snapshots.
+        index: client number.
+        failure_rate: share of failed store calls.
+        scale: time scale.
+
+    Returns:
+        SimClient instance, thread isn't started.
+    """
+    bot = LocalBot(api, failure_rate=failure_rate, scale=scale)
+    # корзина каждого клиента своя, общий лимит бота держит fake api
+    bucket = TokenBucket(rate=TELEGRAM_LIMIT / scale, capacity=TELEGRAM_LIMIT / scale)
+    manager = MessageManager(bot=RateLimitedBot(bot, bucket), chats=[BENCH_CHAT], cache_ttl=PINNED_CACHE_TTL * scale)
+    snapshot = SnapshotStore(os.path.join(directory, '{index}.json'.format(index=index)))
+    browser = make_browser_class(site_url, manager, snapshot, [SIM_HASH])(SIM_HASH)
+    browser.scheduler = TickScheduler(
+        min_interval=INI_INTERVALS['tick-min'] * scale,
+        max_interval=INI_INTERVALS['tick-max'] * scale,
+        backoff_base=INI_INTERVALS['retry-base'] * scale,
+        backoff_cap=INI_INTERVALS['retry-cap'] * scale,
+    )
+    return SimClient(browser, bot)
+
+
+def wait_converged(clients: Sequence[SimClient], api: RecordingBotApi, office: str, timeout: float) -> Optional[float]:
+    """Wait until store and every browser hold the same working session.
+
+    Args:
+        clients: simulated clients.
+        api: fake api with stored value.
+        office: ResoOffice60 value that server accepts now.
+        timeout: seconds.
+
+    Returns:
+        Seconds to convergence or None on timeout.
+    """
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if api.current() == office and all(client.office() == office for client in clients):
+            return time.perf_counter() - started
+        time.sleep(0.005)
+    return None
+
+
+def simulate(
+    size: int,
+    rotations: int = 5,
+    latency: float = 0.0,
+    failure_rate: float = 0.0,
+    scale: float = 0.1,
+    timeout: float = 30.0,
+) -> Dict[str, Any]:
+    """Run scenario for one amount of clients: logout, human login on one client, then server rotations.
+
+    Args:
+        size: amount of clients.
+        rotations: server rotations of random clients after login.
+        latency: api latency in seconds.
+        failure_rate: share of failed store calls.
+        scale: time scale of intervals and rate limit.
+        timeout: seconds to wait for every convergence.
+
+    Returns:
+        Convergence times, lost updates, flaps and api calls.
+    """
+    site = FakeReso()
+    api = RecordingBotApi(site, latency=latency, rate_limit=round(TELEGRAM_LIMIT / scale))
+    session, office = site.login()
+    setup = MessageManager(bot=LocalBot(api), chats=[BENCH_CHAT])
+    setup.reinit()
+    setup.add_account(SIM_HASH)
+    setup.set_cookies(session_cookies(session, office), SIM_HASH)
+    api.stale_writes = 0
+    with FakeResoServer(site) as site_server, tempfile.TemporaryDirectory() as directory:
+        clients = [new_client(api, site_server.url, directory, index, failure_rate, scale) for index in range(size)]
+        for client in clients:
+            client.browser.open_session()
+            client.thread.start()
+        calls_before = dict(api.calls)
+        started = time.perf_counter()
+
+        # сервер завершил сессию, через паузу человек входит на первом компьютере
+        site.logout(session)
+        time.sleep(3 * scale)
+        session, office = site.login()
+        clients[0].act(lambda: clients[0].browser.cookies.update({
+            CookieFields.aspnet: session, CookieFields.reso_office60: office,
+        }))
+        login = wait_converged(clients, api, office, timeout)
+
+        rotation_times: List[Optional[float]] = []
+        for _ in range(rotations):
+            client = random.choice(clients)
+            # сервер выдает новое значение в ответ на переход человека по страницам
+            office = site.reissue(session)
+            client.act(lambda client=client, office=office: client.browser.cookies.update({
+                CookieFields.reso_office60: office,
+            }))
+            rotation_times.append(wait_converged(clients, api, office, timeout))
+
+        # спокойный период: сколько стоит поддержание синхронизации
+        calm_calls = api.total_calls()
+        time.sleep(10 * scale)
+        calm_calls = api.total_calls() - calm_calls
+        elapsed = time.perf_counter() - started
+
+        for client in clients:
+            client.stop.set()
+            client.browser.manager.changed.set()
+        for client in clients:
+            client.thread.join(timeout)
+            client.browser.quit()
+    calls_by_method = {method: count - calls_before.get(method, 0) for method, count in api.calls.items()}
+    calls = sum(count for method, count in calls_by_method.items() if method != '429')
+    finished = [value for value in rotation_times if value is not None]
+    return {
+        'clients': size,
+        'login_convergence_s': round(login, 4) if login is not None else None,
+        'rotation_convergence': percentiles(finished),
+        'not_converged': rotation_times.count(None) + (login is None),
+        'lost_updates': api.lost_updates,
+        'stale_writes': api.stale_writes,
+        'flaps': sum(client.flaps for client in clients),
+        'client_errors': sum(client.errors for client in clients),
+        'injected_failures': sum(client.bot.failures for client in clients),
+        'rate_limited': calls_by_method.get('429', 0),
+        'api_calls': calls,
+        'api_calls_by_method': {method: count for method, count in calls_by_method.items() if count},
+        'api_calls_per_client_per_s': round(calls / size / elapsed, 3),
+        'calm_api_calls_per_s': round(calm_calls / (10 * scale), 3),
+    }
+
+
+def use_scaled_intervals(directory: str, scale: float) -> None:
+    """Write reso.ini with scaled intervals, retry decorator of store calls reads them.
+
+    Args:
+        directory: working directory of simulation.
+        scale: time scale.
+    """
+    with open(os.path.join(directory, INI_FILENAME), 'w', encoding='UTF-8') as ini_file:
+        ini_file.write('[options]\n')
+        for field, default in INI_INTERVALS.items():
+            ini_file.write('{field} = {value}\n'.format(field=field, value=default * scale))
+    os.chdir(directory)
+    get_intervals.cache_clear()
+
+
+def main() -> None:
+    """Parse arguments, run scenario for every amount of clients and save json results."""
+    parser = argparse.ArgumentParser(description='Cookie convergence simulator with many clients of one account.')
+    parser.add_argument('--clients', default='2,5,10,20,50,100,200', help='comma separated amounts of clients')
+    parser.add_argument('--rotations', type=int, default=5, help='server rotations after login')
+    parser.add_argument('--latency', type=float, default=50.0, help='api latency in milliseconds')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of store calls that fail')
+    parser.add_argument('--scale', type=float, default=0.1, help='time scale of intervals and rate limit')
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds to wait for convergence')
+    parser.add_argument('--seed', type=int, help='random seed')
+    parser.add_argument('--output', help='json file for results, printed only if not passed')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        use_scaled_intervals(directory, args.scale)
+        try:
+            runs = [
+                simulate(
+                    int(size),
+                    rotations=args.rotations,
+                    latency=args.latency / 1000,
+                    failure_rate=args.failure_rate,
+                    scale=args.scale,
+                    timeout=args.timeout,
+                )
+                for size in args.clients.split(',')
+            ]
+        finally:
+            os.chdir(cwd)
+    results = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'arguments': vars(args),
+        },
+        'runs': runs,
+    }
+    text = json.dumps(results, indent=4, ensure_ascii=False)
+    print(text)
+    if output:
+        with open(output, 'w', encoding='UTF-8') as output_file:
+            output_file.write(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,4 +5,7 @@ pip install pyinstaller
 pyinstaller --onefile src\main.py --ico=reso-2-logo-png-transparent.ico --name=reso --windowed
 copy .env dist\.env
 copy src\reso.ini dist\reso.ini
-pyinstaller --onefile src\manager_console.py
\ No newline at end of file
+pyinstaller --onefile src\manager_console.py
+pyinstaller --onefile src\supervisor.py --ico=reso-2-logo-png-transparent.ico --name=reso_multi --windowed
+pyinstaller --onefile src\relay.py --name=reso_relay
+
@@ -0,0 +1,401 @@
+"""Asyncio pinned message manager and its blocking facade for existing callers."""
+
+import asyncio
+import copy
+from threading import Thread
+from typing import Any, Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from aiohttp import ClientError
+from telebot.apihelper import ApiTelegramException
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException as AsyncApiTelegramException
+from telebot.asyncio_helper import RequestTimeout
+
+from src import codec
+from src.bot import AsyncRateLimitedBot, TokenBucket
+from src.cookies import same
+from src.exceptions import InvalidBotToken, InvalidHash, UpdateConflict
+from src.handlers import RetryPolicy
+from src.manager import MessageManager, PinnedCache, Shards, token_error
+from src.metrics import metrics
+from src.settings import (
+    BOT_TOKEN, CHAT_ID, PAYLOAD_PACKING, PINNED_CACHE_TTL, SHARD_CHAT_IDS, TELEGRAM_BUDGET_FILE, TELEGRAM_BURST,
+    TELEGRAM_RATE,
+)
+from src.stores import ChangeSignal, CookieStore, Payload, add_change, remove_change, set_change
+
+Result = TypeVar('Result')
+API_ERRORS = (ApiTelegramException, AsyncApiTelegramException)
+
+
+def async_retry(fn: Callable[..., Awaitable[Result]]) -> Callable[..., Awaitable[Result]]:
+    """Retry decorator for coroutines, like handlers.retry, pauses don't block event loop.
+
+    Args:
+        fn: coroutine function that will be wrapped.
+
+    Returns:
+        Decorator closure.
+    """
+
+    async def inner(*args: Any, **kwargs: Any) -> Result:
+        policy = RetryPolicy(fn.__name__, API_ERRORS)
+        for _ in range(policy.attempts):
+            try:
+                return await fn(*args, **kwargs)
+            # aiohttp не смог выполнить запрос или телеграм вернул ошибку
+            except (ClientError, RequestTimeout, asyncio.TimeoutError, *API_ERRORS) as error:
+                await asyncio.sleep(policy.delay(error))
+        raise policy.error()
+    return inner
+
+
+class AsyncMessageManager(Shards):
+    """MessageManager for asyncio programs, api requests go through one keep-alive aiohttp session of telebot.
+
+    Shards are read concurrently, concurrent reads of one shard share one request.
+    Writes are optimistic with revision check, like in MessageManager.
+    """
+
+    write_attempts = MessageManager.write_attempts
+    message_sample = CookieStore.message_sample
+
+    def __init__(
+        self,
+        bot: Optional[Any] = None,
+        cache_ttl: float = PINNED_CACHE_TTL,
+        chats: Optional[List[str]] = None,
+    ) -> None:
+        """Account manager initial method.
+
+        Args:
+            bot: async telegram bot, rate limited AsyncTeleBot with BOT_TOKEN is created if not passed.
+            cache_ttl: seconds while pinned message is served from memory.
+            chats: shard chats, SHARD_CHAT_IDS or CHAT_ID are used if not passed.
+        """
+        self.bot = bot or AsyncRateLimitedBot(
+            AsyncTeleBot(BOT_TOKEN),
+            TokenBucket(
+                rate=TELEGRAM_RATE,
+                capacity=TELEGRAM_BURST,
+                reserve=TELEGRAM_BURST * 0.2,
+                path=TELEGRAM_BUDGET_FILE,
+            ),
+        )
+        self.chats: List[str] = chats or SHARD_CHAT_IDS or [CHAT_ID]  # type: ignore
+        self.chat = self.chats[0]
+        self.caches = {chat: PinnedCache(cache_ttl) for chat in self.chats}
+        # выставляется, когда данные изменил кто-то другой, ждать можно и из потоков
+        self.changed = ChangeSignal()
+        # чтения одного шарда ждут один запрос, записи идут по одной
+        self.read_locks = {chat: asyncio.Lock() for chat in self.chats}
+        self.write_lock = asyncio.Lock()
+        self.conflicts = 0
+        self.avoided_writes = 0
+
+    @async_retry
+    async def reinit(self) -> None:
+        """Initialize or reinitialize pinned messages of all shards concurrently."""
+        shards = self._split(self.message_sample)
+        await asyncio.gather(*(self._reinit_chat(chat, shards[chat]) for chat in self.chats))
+
+    @async_retry
+    async def load(self) -> Payload:
+        """Get payload from pinned messages of all shards.
+
+        Returns:
+            Payload that must not be changed by caller.
+        """
+        try:
+            return await self._merge(self.chats)
+        except API_ERRORS as error:
+            if token_error(error):
+                raise InvalidBotToken(InvalidBotToken.msg)
+            # ограничение частоты и сбои телеграм повторяет async_retry
+            raise
+
+    @async_retry
+    async def get_cookies(self, hsh: str) -> List:
+        """Get cookies by hash from pinned message of its shard only.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            List with dict cookies.
+        """
+        try:
+            _, payload = await self._pinned(self.chat_for(hsh))
+        except API_ERRORS as error:
+            if token_error(error):
+                raise InvalidBotToken(InvalidBotToken.msg)
+            raise
+        try:
+            return payload[hsh]
+        except KeyError:
+            raise InvalidHash(InvalidHash.msg.format(hash=hsh))
+
+    @async_retry
+    async def update(
+        self,
+        changes: Callable[[Payload], None],
+        hashes: Optional[List[str]] = None,
+    ) -> None:
+        """Apply changes to pinned message payload, only changed shards are edited.
+
+        Args:
+            changes: function that edits payload copy in place, must be idempotent.
+            hashes: hashes touched by changes, only their shards are read if passed.
+        """
+        chats = self._chats(hashes)
+        async with self.write_lock:
+            for _ in range(self.write_attempts):
+                revisions = {chat: self.caches[chat].revision for chat in chats}
+                as_json = copy.deepcopy(await self._merge(chats, force=True))
+                changes(as_json)
+                edits = self._edits(as_json, chats, revisions)
+                if not edits:
+                    return
+                # разные шарды правятся одновременно
+                await asyncio.gather(*(
+                    self._edit(chat, self.caches[chat].message_id, shard, text, revision)  # type: ignore
+                    for chat, (shard, text, revision) in edits.items()
+                ))
+        raise UpdateConflict(UpdateConflict.msg)
+
+    async def set_cookies(self, cookies: List, hsh: str) -> None:
+        """Set new cookies by hash.
+
+        Args:
+            cookies: list with dict cookies.
+            hsh: user identification hash.
+        """
+        try:
+            current = await self.get_cookies(hsh)
+        except InvalidHash:
+            return
+        if same(current, cookies):
+            self.avoided_writes += 1
+            return
+        await self.update(set_change(cookies, hsh), hashes=[hsh])
+
+    async def add_account(self, hsh: str) -> None:
+        """Add new account with sample cookies.
+
+        Args:
+            hsh: user identification hash.
+        """
+        await self.update(add_change(hsh, self.message_sample['test']), hashes=[hsh])
+
+    async def remove_account(self, hsh: str) -> None:
+        """Remove account.
+
+        Args:
+            hsh: user identification hash.
+        """
+        await self.update(remove_change(hsh), hashes=[hsh])
+
+    async def accounts(self) -> List[str]:
+        """Get available account hashes, shards are read concurrently without creating absent pinned messages.
+
+        Returns:
+            List with hashes.
+        """
+        payloads = await asyncio.gather(*(self._pinned(chat, create=False) for chat in self.chats))
+        return self._accounts([payload for _, payload in payloads])
+
+    @async_retry
+    async def lease(self, hsh: str) -> Optional[Tuple[str, float]]:
+        """Get writer lease of account from pinned message of its shard only.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            Tuple with owner and unix expiry time or None, if nobody holds it.
+        """
+        _, payload = await self._pinned(self.chat_for(hsh))
+        return self._lease(payload, hsh)
+
+    @async_retry
+    async def refresh(self, hashes: Optional[List[str]] = None) -> None:
+        """Read pinned messages from telegram bypassing cache.
+
+        Args:
+            hashes: only shards of these hashes are read if passed.
+        """
+        await self._merge(self._chats(hashes), force=True)
+
+    def changed_at(self, hsh: str) -> Optional[float]:
+        """Get edit time of cached pinned message of hash shard.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            Unix time with telegram second precision or None, if shard wasn't read yet.
+        """
+        version = self.caches[self.chat_for(hsh)].version
+        return None if version is None else float(version[1])
+
+    async def close(self) -> None:
+        """Close http session of bot."""
+        close_session = getattr(self.bot, 'close_session', None)
+        if close_session is not None:
+            await close_session()
+
+    async def _merge(self, chats: List[str], force: bool = False) -> Payload:
+        payloads = await asyncio.gather(*(self._pinned(chat, force=force) for chat in chats))
+        return self._join([payload for _, payload in payloads])
+
+    async def _reinit_chat(self, chat: str, payload: Payload) -> None:
+        pinned = (await self.bot.get_chat(chat)).pinned_message
+        if not pinned:
+            msg = await self.bot.send_message(chat_id=chat, text=codec.dumps(payload, PAYLOAD_PACKING))
+            await self.bot.pin_chat_message(chat_id=chat, message_id=msg.message_id)
+            self._edited(chat, msg, payload)
+        elif not self._kept(chat, pinned, payload):
+            await self._edit(chat, pinned.message_id, payload, *self._text(chat, payload))
+
+    async def _pinned(self, chat: str, force: bool = False, create: bool = True) -> Tuple[int, Payload]:
+        cached = None if force else self._cached(chat)
+        if cached is not None:
+            return cached
+        async with self.read_locks[chat]:
+            # пока ждали блокировку, кэш мог обновить другой запрос
+            cached = None if force else self._cached(chat)
+            if cached is not None:
+                return cached
+            self.caches[chat].misses += 1
+            metrics.inc('reso_cache_total', result='miss')
+            pinned = (await self.bot.get_chat(chat)).pinned_message
+            if not pinned and create:
+                await self._reinit_chat(chat, self._split(self.message_sample)[chat])
+                pinned = (await self.bot.get_chat(chat)).pinned_message
+            return self._fetched(chat, pinned)
+
+    async def _edit(self, chat: str, message_id: int, payload: Payload, text: str, revision: int) -> None:
+        try:
+            msg = await self.bot.edit_message_text(chat_id=chat, message_id=message_id, text=text)
+        except API_ERRORS as error:
+            # такой текст уже записан, например, повторной попыткой после обрыва связи
+            if 'message is not modified' not in error.description:
+                raise
+            msg = None
+        self._edited(chat, msg, payload, revision)
+
+
+class SyncMessageManager(CookieStore):
+    """Blocking CookieStore facade of AsyncMessageManager, coroutines run in a background event loop."""
+
+    def __init__(self, manager: Optional[AsyncMessageManager] = None) -> None:
+        """Facade initial method.
+
+        Args:
+            manager: async manager, created with defaults if not passed.
+        """
+        super().__init__()
+        self.loop = asyncio.new_event_loop()
+        Thread(target=self.loop.run_forever, name='AsyncMessageManager', daemon=True).start()
+        # все корутины менеджера выполняются в этом цикле, там же живет сессия aiohttp
+        self.manager = manager or AsyncMessageManager()
+        self.changed = self.manager.changed
+
+    def run(self, coroutine: Awaitable[Result]) -> Result:
+        """Run coroutine in background loop and wait for result.
+
+        Args:
+            coroutine: coroutine object.
+
+        Returns:
+            Coroutine result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()  # type: ignore
+
+    def load(self) -> Payload:
+        """Get payload from pinned messages of all shards.
+
+        Returns:
+            Payload that must not be changed by caller.
+        """
+        return self.run(self.manager.load())
+
+    def update(
+        self,
+        changes: Callable[[Payload], None],
+        hashes: Optional[List[str]] = None,
+    ) -> None:
+        """Apply changes to pinned message payload.
+
+        Args:
+            changes: function that edits payload copy in place, must be idempotent.
+            hashes: hashes touched by changes.
+        """
+        self.run(self.manager.update(changes, hashes))
+
+    def reinit(self) -> None:
+        """Initialize or reinitialize pinned messages."""
+        self.run(self.manager.reinit())
+
+    def get_cookies(self, hsh: str) -> List:
+        """Get cookies by hash.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            List with dict cookies.
+        """
+        return self.run(self.manager.get_cookies(hsh))
+
+    def set_cookies(self, cookies: List, hsh: str) -> None:
+        """Set new cookies by hash.
+
+        Args:
+            cookies: list with dict cookies.
+            hsh: user identification hash.
+        """
+        self.run(self.manager.set_cookies(cookies, hsh))
+
+    def accounts(self) -> List[str]:
+        """Get available account hashes.
+
+        Returns:
+            List with hashes.
+        """
+        return self.run(self.manager.accounts())
+
+    def lease(self, hsh: str) -> Optional[Tuple[str, float]]:
+        """Get writer lease of account from pinned message of its shard only.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            Tuple with owner and unix expiry time or None, if nobody holds it.
+        """
+        return self.run(self.manager.lease(hsh))
+
+    def refresh(self, hashes: Optional[List[str]] = None) -> None:
+        """Read pinned messages from telegram bypassing cache.
+
+        Args:
+            hashes: only shards of these hashes are read if passed.
+        """
+        self.run(self.manager.refresh(hashes))
+
+    def changed_at(self, hsh: str) -> Optional[float]:
+        """Get edit time of cached pinned message of hash shard.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            Unix time or None.
+        """
+        return self.manager.changed_at(hsh)
+
+    def close(self) -> None:
+        """Close http session and stop background loop."""
+        self.run(self.manager.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,224 @@
+"""Telegram bot wrapper that keeps all clients of one host within the bot request budget."""
+
+import asyncio
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+from telebot import TeleBot
+from telebot.apihelper import ApiTelegramException
+
+from src.files import file_lock
+from src.metrics import metrics
+
+
+class TokenBucket(object):
+    """Token bucket, shared by processes through a state file if path is passed."""
+
+    def __init__(self, rate: float, capacity: float, reserve: float = 0.0, path: Optional[str] = None) -> None:
+        """Bucket initial method.
+
+        Args:
+            rate: tokens added per second.
+            capacity: maximal amount of tokens.
+            reserve: tokens that only high priority requests can take.
+            path: state file path, state is kept in memory if not passed.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.reserve = reserve
+        self.path = path
+        self.lock = Lock()
+        self.tokens = capacity
+        self.updated = time.time()
+        # сколько запросов с высоким приоритетом сейчас ждут токены в этом процессе
+        self.waiting_high = 0
+
+    def take(self, cost: float, high: bool = False) -> float:
+        """Try to take tokens.
+
+        Args:
+            cost: tokens needed.
+            high: request may use reserved tokens and goes before waiting low priority requests.
+
+        Returns:
+            0 if tokens were taken, otherwise seconds to wait before next try.
+        """
+        floor = 0.0 if high else self.reserve
+        with self.lock, self._shared():
+            tokens, updated = self._load()
+            now = time.time()
+            tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+            if (high or not self.waiting_high) and tokens - cost >= floor:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = max(cost + floor - tokens, cost) / self.rate
+            self._save(tokens, now)
+        return wait
+
+    def acquire(self, cost: float, high: bool = False) -> float:
+        """Wait until tokens are taken.
+
+        Args:
+            cost: tokens needed.
+            high: request priority.
+
+        Returns:
+            Seconds spent waiting.
+        """
+        waited = 0.0
+        if high:
+            self._wait_high(1)
+        try:
+            while True:
+                wait = self.take(cost, high)
+                if not wait:
+                    return waited
+                time.sleep(wait)
+                waited += wait
+        finally:
+            if high:
+                self._wait_high(-1)
+
+    async def acquire_async(self, cost: float, high: bool = False) -> float:
+        """Wait until tokens are taken without blocking event loop.
+
+        Args:
+            cost: tokens needed.
+            high: request priority.
+
+        Returns:
+            Seconds spent waiting.
+        """
+        loop = asyncio.get_running_loop()
+        waited = 0.0
+        if high:
+            await loop.run_in_executor(None, self._wait_high, 1)
+        try:
+            while True:
+                # take ждет файловую блокировку других процессов, цикл событий в это время работает
+                wait = await loop.run_in_executor(None, self.take, cost, high)
+                if not wait:
+                    return waited
+                await asyncio.sleep(wait)
+                waited += wait
+        finally:
+            if high:
+                await loop.run_in_executor(None, self._wait_high, -1)
+
+    def _wait_high(self, delta: int) -> None:
+        with self.lock:
+            self.waiting_high += delta
+
+    @contextmanager
+    def _shared(self) -> Iterator[None]:
+        if self.path is None:
+            yield
+            return
+        with file_lock('{path}.lock'.format(path=self.path)):
+            yield
+
+    def _load(self) -> Tuple[float, float]:
+        if self.path is None:
+            return self.tokens, self.updated
+        try:
+            with open(self.path, encoding='UTF-8') as state_file:
+                state = json.load(state_file)
+            return float(state['tokens']), float(state['updated'])
+        except (OSError, ValueError, KeyError, TypeError):
+            # нет файла или он поврежден, начинаем с полного бюджета
+            return self.capacity, time.time()
+
+    def _save(self, tokens: float, updated: float) -> None:
+        self.tokens, self.updated = tokens, updated
+        if self.path is not None:
+            with open(self.path, 'w', encoding='UTF-8') as state_file:
+                json.dump({'tokens': tokens, 'updated': updated}, state_file)
+
+
+class RateLimitedBot(object):
+    """TeleBot proxy that takes tokens from bucket before every api request."""
+
+    # стоимость методов в токенах: правки сообщений телеграм ограничивает сильнее чтения
+    costs = {
+        'get_chat': 1,
+        'get_updates': 1,
+        'edit_message_text': 3,
+        'send_message': 3,
+        'pin_chat_message': 3,
+    }
+    # запись кук важнее рутинного чтения
+    high_priority = frozenset({'edit_message_text', 'send_message', 'pin_chat_message'})
+
+    def __init__(self, bot: TeleBot, bucket: TokenBucket) -> None:
+        """Wrapper initial method.
+
+        Args:
+            bot: wrapped bot.
+            bucket: request budget.
+        """
+        self.bot = bot
+        self.bucket = bucket
+        self.calls: Counter = Counter()
+        self.tokens: Counter = Counter()
+        self.waited = 0.0
+
+    def __getattr__(self, name: str) -> Any:
+        """Get bot attribute, api methods with cost are wrapped.
+
+        Args:
+            name: attribute name.
+
+        Returns:
+            Attribute value.
+        """
+        attr = getattr(self.bot, name)
+        if name not in self.costs:
+            return attr
+        return self._limited(name, attr)
+
+    def _limited(self, name: str, method: Callable) -> Callable:
+        def call(*args: Any, **kwargs: Any) -> Any:
+            self.waited += self.bucket.acquire(self.costs[name], name in self.high_priority)
+            self.calls[name] += 1
+            self.tokens[name] += self.costs[name]
+            outcome = 'ok'
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            except ApiTelegramException as error:
+                outcome = str(error.error_code)
+                raise
+            except Exception:
+                outcome = 'error'
+                raise
+            finally:
+                metrics.inc('reso_telegram_calls_total', method=name, outcome=outcome)
+                metrics.observe('reso_telegram_call_seconds', time.perf_counter() - started, method=name)
+        return call
+
+
+class AsyncRateLimitedBot(RateLimitedBot):
+    """AsyncTeleBot proxy with the same budget, api coroutines wait for tokens with asyncio.sleep."""
+
+    def _limited(self, name: str, method: Callable) -> Callable:
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            self.waited += await self.bucket.acquire_async(self.costs[name], name in self.high_priority)
+            self.calls[name] += 1
+            self.tokens[name] += self.costs[name]
+            outcome = 'ok'
+            started = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            except Exception as error:
+                # у асинхронного телебота свой класс ApiTelegramException
+                outcome = str(getattr(error, 'error_code', 'error'))
+                raise
+            finally:
+                metrics.inc('reso_telegram_calls_total', method=name, outcome=outcome)
+                metrics.observe('reso_telegram_call_seconds', time.perf_counter() - started, method=name)
+        return call
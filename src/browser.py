@@ -0,0 +1,379 @@
+"""Browser independent session logic of ResoBrowser."""
+
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import devnull
+from typing import Any, Callable, List, Type, Optional
+
+from selenium.common.exceptions import NoSuchElementException, NoSuchDriverException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.service import Service
+
+from src.choiches import CookieFields
+from src.cookies import fingerprint, same
+from src.config import get_intervals
+from src.diagnostics import startup
+from src.drivers import DriverCache
+from src.events import CookieEvents
+from src.exceptions import BrowserNotInstalled, InvalidHash
+from src.handlers import exception_run_handler
+from src.journal import CookieJournal
+from src.metrics import metrics
+from src.probe import SessionProbe
+from src.profiles import BrowserProfile
+from src.scheduler import TickScheduler
+from src.settings import DRIVER_CACHE_FILE
+from src.stores import CookieStore, SnapshotStore
+
+
+class ResoBrowserMixin(object):
+    """Main Webdriver logic, src.main.ResoBrowser adds browser class from reso.ini to its bases."""
+
+    url_main = 'https://office.reso.ru/'
+    # легкая страница того же домена, нужна только чтобы браузер разрешил добавить куки
+    url_light = 'https://office.reso.ru/favicon.ico'
+    driver_cache = DriverCache(DRIVER_CACHE_FILE)
+    # под супервизором падение драйвера не завершает программу, а заменяет браузер
+    supervised = False
+
+    # will fill in meta:
+    hash: str
+    hashes: List[str]
+    service_class: Type[Service]
+    options: Any
+    profile: BrowserProfile
+    browser_name: str
+    sync: str
+    manager: CookieStore
+    snapshot: SnapshotStore
+    journal: Optional[CookieJournal]
+    probe: Optional[SessionProbe]
+
+    def __init__(self, hsh: Optional[str] = None) -> None:
+        """Initialize method for class.
+
+        Args:
+            hsh: user identification hash, first hash from ini file is used if not passed.
+        """
+        if hsh:
+            self.hash = hsh
+        # куки из хранилища запрашиваются, пока запускается браузер
+        fetcher = ThreadPoolExecutor(max_workers=1)
+        remote_cookies = fetcher.submit(self.manager.get_cookies, self.hash)
+        fetcher.shutdown(wait=False)
+        self.start_driver()
+        startup.mark('driver')
+        self.profile.apply_to_driver(self)
+        self.need_to_set_telegram_cookies = False
+        self.scheduler = TickScheduler.from_ini()
+        # куки публикует только держатель аренды хэша, остальные клиенты их перенимают
+        self.owner = secrets.token_hex(4)
+        self.lease_ttl = get_intervals()['lease-ttl']
+        # куки хранилища, которые клиент видел в прошлом цикле
+        self.store_cookies: Optional[List] = None
+        self.snapshot_cookies: Optional[List] = None
+        self.browser_cookies: Optional[List] = None
+        # без поддержки bidi куки браузера опрашиваются каждый цикл
+        self.cookie_events = CookieEvents.attach(self, wake=self.manager.changed)
+        # запасной браузер заранее открывает домен ресо
+        self.warmed = False
+        # вызывается один раз, когда открыта главная страница
+        self.on_ready: Optional[Callable[[], None]] = None
+        try:
+            # старт не ждет телеграм, сверка с хранилищем пройдет в первом же цикле
+            self.last_cookies = self.snapshot_cookies = self.snapshot.get_cookies(self.hash)
+        except InvalidHash:
+            # первый запуск на этом компьютере
+            self.last_cookies = remote_cookies.result()
+        startup.mark('cookies')
+
+    def start_driver(self) -> None:
+        """Start browser with cached driver path, Selenium Manager resolves it only if cache doesn't fit."""
+        cached = self.driver_cache.get(self.browser_name)
+        if cached is not None:
+            if cached['browser_path'] and os.path.isfile(cached['browser_path']):
+                self.options.binary_location = cached['browser_path']
+            try:
+                self._start_driver(cached['driver_path'])
+                return
+            except WebDriverException:
+                # браузер обновился и старый драйвер к нему не подходит
+                self.driver_cache.drop(self.browser_name)
+        self._start_driver(None)
+        self.driver_cache.put(
+            self.browser_name,
+            driver_path=self.service.path,
+            browser_path=getattr(self.options, 'binary_location', '') or '',
+            version=self.capabilities.get('browserVersion', ''),
+        )
+
+    def _start_driver(self, driver_path: Optional[str]) -> None:
+        #browser in ini file is correct, but not installed in system
+        try:
+            # у каждого браузера должен быть свой процесс драйвера
+            super().__init__(  # type: ignore
+                service=self.service_class(executable_path=driver_path, log_output=devnull),
+                options=self.options,
+            )
+        except NoSuchDriverException:
+            raise BrowserNotInstalled(f'Браузер {self.browser_name} не установлен в системе')
+
+    def warm(self) -> None:
+        """Open reso domain in advance, so standby browser only has to insert cookies."""
+        self.get(self.url_light)
+        self.warmed = True
+
+    def resume_from(self, crashed: 'ResoBrowserMixin') -> None:
+        """Take session state of crashed browser, run inserts its cookies again.
+
+        Args:
+            crashed: browser that has to be replaced.
+        """
+        self.hash = crashed.hash
+        self.last_cookies = crashed.last_cookies
+        self.snapshot_cookies = crashed.snapshot_cookies
+        self.need_to_set_telegram_cookies = crashed.need_to_set_telegram_cookies
+        self.owner = crashed.owner
+        self.store_cookies = crashed.store_cookies
+
+    def delete_reso_cookies(self) -> None:
+        """Delete only necessary reso cookies."""
+        self.delete_cookie(CookieFields.aspnet)
+        self.delete_cookie(CookieFields.reso_office60)
+        self.browser_cookies = None
+
+    def insert_cookies(self, tele_cookies: List) -> None:
+        """Get cookies from telegram and insert them in browser."""
+        self.delete_reso_cookies()
+        for line in tele_cookies:
+            self.add_cookie(line)
+
+    def auth_complete(self) -> bool:
+        """Check is authentication was complete.
+
+        Returns:
+            bool variable.
+        """
+        if self.probe is not None:
+            cookies = self.get_browser_cookies()
+            with metrics.timer('reso_tick_phase_seconds', phase='probe'):
+                valid = self.probe.check(cookies)
+            if valid is not None:
+                return valid
+        # по http проверить не удалось, смотрим на страницу
+        with metrics.timer('reso_tick_phase_seconds', phase='dom'):
+            try:
+                # welcome message
+                self.find_element(By.XPATH, '/html/body/form/div[4]/div[1]/div[7]/div/div/div/div/div[1]')
+            except NoSuchElementException:
+                return True
+        return False
+
+    def get_browser_cookies(self) -> Optional[List]:
+        """Get cookies from browser.
+
+        Returns:
+            List with dict cookies.
+        """
+        if self.cookie_events is not None:
+            if self.browser_cookies is not None and not self.cookie_events.stale():
+                return self.browser_cookies
+            self.cookie_events.read()
+        with metrics.timer('reso_tick_phase_seconds', phase='cookie_read'):
+            cookies = [
+                self.get_cookie(CookieFields.aspnet),
+                self.get_cookie(CookieFields.reso_office60),
+            ]
+        #иногда сетится null, чтобы избежать этого:
+        self.browser_cookies = cookies if all(cookies) else None
+        return self.browser_cookies
+
+    def logged_in(self) -> None:
+        """Logic when browser is logged in service."""
+        with metrics.timer('reso_tick_phase_seconds', phase='store'):
+            tele_cookies = self.manager.get_cookies(self.hash)
+        browser_cookies = self.get_browser_cookies()
+        adopted = False
+
+        if browser_cookies and self.need_to_set_telegram_cookies:
+            # зашел текущий клиент, у него теперь другие куки и нужно поменять в телеге
+            self.publish(browser_cookies, event='login', force=True)
+            self.need_to_set_telegram_cookies = False
+            self.last_cookies = tele_cookies = browser_cookies
+        elif browser_cookies and not same(self.last_cookies, browser_cookies):
+            # я залогинен, но ресо сервер изменил мне куки
+            if self.publish(browser_cookies, event='rotation'):
+                tele_cookies = browser_cookies
+            else:
+                # публикует держатель аренды, свои куки остаются в браузере, пока он не опубликует новые
+                metrics.inc('reso_cookie_events_total', event='follower_rotation')
+            self.last_cookies = browser_cookies
+        elif not same(browser_cookies, tele_cookies):
+            unchanged = self.store_cookies is not None and same(self.store_cookies, tele_cookies)
+            if browser_cookies and unchanged:
+                # держатель аренды пропал, не опубликовав куки, а мои рабочие
+                if self.publish(browser_cookies, event='takeover'):
+                    tele_cookies = browser_cookies
+            else:
+                # другой клиент изменил кукисы на свои, рабочие, но при этом я тоже залогинен,
+                # так что нужно унифицировать
+                self.insert_cookies(tele_cookies)
+                self.last_cookies = tele_cookies
+                self.adopted()
+                adopted = True
+        self.store_cookies = tele_cookies
+        if self.journal is not None and not adopted:
+            # рабочая версия запоминается один раз, повторные подтверждения не пишутся,
+            # вставленные чужие куки браузер еще не проверил, их подтвердит следующий цикл
+            self.journal.record(self.hash, self.last_cookies, True, origin=self.owner)
+        self.save_snapshot()
+
+    def publish(self, cookies: List, event: str, force: bool = False) -> bool:
+        """Save browser cookies to store, if this client holds writer lease of hash.
+
+        Args:
+            cookies: list with dict cookies.
+            event: metrics event name, login, rotation or takeover.
+            force: take lease from other client.
+
+        Returns:
+            True if cookies are published.
+        """
+        with metrics.timer('reso_tick_phase_seconds', phase='store'):
+            published = self.manager.acquire_lease(self.hash, self.owner, self.lease_ttl, force=force, cookies=cookies)
+        if published:
+            metrics.inc('reso_cookie_events_total', event=event)
+            if self.journal is not None:
+                self.journal.record(self.hash, cookies, True, origin=self.owner)
+        return published
+
+    def adopted(self) -> None:
+        """Record adoption of cookies changed by other client."""
+        metrics.inc('reso_cookie_events_total', event='adoption')
+        changed_at = self.manager.changed_at(self.hash)
+        if changed_at is not None:
+            metrics.observe('reso_adoption_seconds', max(0.0, time.time() - changed_at))
+        if self.journal is not None:
+            # версия чужая, ее проверит следующий цикл
+            lease = self.manager.lease(self.hash)
+            self.journal.record(self.hash, self.last_cookies, None, origin=lease[0] if lease else '')
+
+    def save_snapshot(self) -> None:
+        """Save working cookies locally, if they changed."""
+        if not same(self.last_cookies, self.snapshot_cookies):
+            self.snapshot.set_cookies(self.last_cookies, self.hash)
+            self.snapshot_cookies = self.last_cookies
+
+    def logged_out(self) -> None:
+        """Logic, when browser is logged out from service."""
+        with metrics.timer('reso_tick_phase_seconds', phase='store'):
+            tele_cookies = self.manager.get_cookies(self.hash)
+        if same(self.last_cookies, tele_cookies):
+            # в телеге лежат неверные куки, которые я пытался использовать
+            if self.journal is not None:
+                self.journal.record(self.hash, tele_cookies, False, origin=self.owner)
+            if not self.need_to_set_telegram_cookies:
+                metrics.inc('reso_cookie_events_total', event='logout')
+                if self.rollback(tele_cookies):
+                    return
+                # аренду сразу забирает клиент, у которого сессия еще жива
+                self.manager.release_lease(self.hash, self.owner)
+            self.need_to_set_telegram_cookies = True
+        else:
+            # кто-то изменил куки и они рабочие с высокой вероятностью
+            self.need_to_set_telegram_cookies = False
+            self.insert_cookies(tele_cookies)
+            self.get(self.url_main)
+            self.last_cookies = tele_cookies
+            self.adopted()
+        self.store_cookies = tele_cookies
+
+    def rollback(self, bad_cookies: List) -> bool:
+        """Try recent known good cookies of hash from journal instead of waiting for human login.
+
+        Only the lease holder, or any client if the lease has expired, checks journal versions and publishes them,
+        other clients wait for its cookies.
+
+        Args:
+            bad_cookies: store cookies that don't work.
+
+        Returns:
+            True if working cookies are found and inserted.
+        """
+        if self.journal is None:
+            return False
+        with metrics.timer('reso_tick_phase_seconds', phase='store'):
+            # неверные куки мог уже заменить другой клиент, читаем хранилище мимо кэша
+            self.manager.refresh([self.hash])
+            tele_cookies = self.manager.get_cookies(self.hash)
+            lease = self.manager.lease(self.hash)
+        if not same(tele_cookies, bad_cookies):
+            self.insert_cookies(tele_cookies)
+            self.get(self.url_main)
+            self.last_cookies = self.store_cookies = tele_cookies
+            self.adopted()
+            return True
+        if lease is not None and lease[0] != self.owner and lease[1] > time.time():
+            # откат публикует держатель аренды
+            return False
+        exclude = {fingerprint(bad_cookies), fingerprint(self.last_cookies)}
+        for cookies in self.journal.candidates(self.hash, exclude=exclude):
+            with metrics.timer('reso_tick_phase_seconds', phase='rollback'):
+                self.insert_cookies(cookies)
+                self.get(self.url_main)
+                valid = self.auth_complete()
+            self.journal.record(self.hash, cookies, valid, origin=self.owner)
+            if valid:
+                self.last_cookies = cookies
+                # аренду мог успеть взять другой клиент, тогда его куки придут следующим циклом
+                self.store_cookies = cookies if self.publish(cookies, event='rollback') else bad_cookies
+                return True
+        return False
+
+    @exception_run_handler
+    def run(self) -> None:
+        """Run main logic."""
+        self.open_session()
+        # изменения приходят длинным опросом relay, а куки браузера событиями bidi, опрос остается страховкой
+        push_poll = 0.0
+        if self.sync == 'push':
+            self.manager.listen()
+            if self.cookie_events is not None:
+                push_poll = get_intervals()['push-poll']
+        # у каждой сессии свое поколение изменений, проснувшаяся первой не скрывает его от остальных
+        seen = self.manager.changed.generation
+        while True:
+            interval = max(self.scheduler.stable(), push_poll) if self.tick() else self.scheduler.activity()
+            # будит цикл раньше, если закрепленное сообщение изменил другой клиент или сервер ресо сменил куки
+            seen = self.manager.changed.wait_newer(seen, interval)
+
+    def open_session(self) -> None:
+        """Insert last cookies and open main page."""
+        # if it will be removed, don't forget about implicitly wait
+        if not self.warmed:
+            self.get(self.url_light)
+        self.warmed = False
+        self.insert_cookies(self.last_cookies)
+        self.get(self.url_main)
+        startup.mark('first page')
+        startup.report()
+        if self.on_ready is not None:
+            on_ready, self.on_ready = self.on_ready, None
+            on_ready()
+
+    def tick(self) -> bool:
+        """Check session once and sync cookies with store.
+
+        Returns:
+            True if nothing has changed during the tick.
+        """
+        state = (fingerprint(self.last_cookies), self.need_to_set_telegram_cookies)
+        with metrics.timer('reso_tick_seconds'):
+            if self.auth_complete():
+                self.logged_in()
+                return state == (fingerprint(self.last_cookies), self.need_to_set_telegram_cookies)
+            self.logged_out()
+        # после выхода ждем входа человека или новых кук, проверяем часто
+        return False
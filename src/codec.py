@@ -0,0 +1,94 @@
+"""Compact text encoding of cookie payload for pinned messages."""
+
+import base64
+import json
+import zlib
+from typing import Any, Dict, List, Union
+
+# поля, которые у reso кук всегда одинаковые и поэтому не хранятся
+COOKIE_DEFAULTS: Dict[str, Any] = {
+    'path': '/',
+    'secure': False,
+    'httpOnly': True,
+    'sameSite': 'None',
+    'domain': '.reso.ru',
+}
+PACKED_PREFIX = 'z:'
+RESERVED_PREFIX = '_'
+
+CompactCookie = List[Any]
+
+
+def compact_cookie(cookie: Dict[str, Any]) -> CompactCookie:
+    """Compact selenium cookie to [name, value] with only non default fields.
+
+    Args:
+        cookie: selenium cookie dictionary.
+
+    Returns:
+        List with name, value and optional dictionary with other fields.
+    """
+    extra = {
+        field: value for field, value in cookie.items()
+        if field not in {'name', 'value'} and (field not in COOKIE_DEFAULTS or COOKIE_DEFAULTS[field] != value)
+    }
+    if extra:
+        return [cookie['name'], cookie['value'], extra]
+    return [cookie['name'], cookie['value']]
+
+
+def expand_cookie(item: Union[CompactCookie, Dict[str, Any]]) -> Dict[str, Any]:
+    """Expand compact cookie back to selenium cookie.
+
+    Args:
+        item: compact cookie or full cookie dictionary of old format.
+
+    Returns:
+        Selenium cookie dictionary.
+    """
+    if isinstance(item, dict):
+        return item
+    cookie = {'name': item[0], 'value': item[1]}
+    cookie.update(COOKIE_DEFAULTS)
+    if len(item) > 2:
+        cookie.update(item[2])
+    return cookie
+
+
+def dumps(payload: Dict[str, Any], pack: bool = False) -> str:
+    """Encode payload to message text.
+
+    Args:
+        payload: dictionary with cookies lists by hash and reserved fields.
+        pack: compress text with zlib and base85, if it becomes shorter.
+
+    Returns:
+        Message text.
+    """
+    encoded = {
+        key: value if key.startswith(RESERVED_PREFIX) else [compact_cookie(cookie) for cookie in value]
+        for key, value in payload.items()
+    }
+    text = json.dumps(encoded, separators=(',', ':'))
+    if pack:
+        packed = PACKED_PREFIX + base64.b85encode(zlib.compress(text.encode(), 9)).decode()
+        if len(packed) < len(text):
+            return packed
+    return text
+
+
+def loads(text: str) -> Dict[str, Any]:
+    """Decode message text of any format: packed, compact or old full json.
+
+    Args:
+        text: message text.
+
+    Returns:
+        Dictionary with selenium cookies lists by hash and reserved fields.
+    """
+    if text.startswith(PACKED_PREFIX):
+        text = zlib.decompress(base64.b85decode(text[len(PACKED_PREFIX):])).decode()
+    return {
+        key: value if key.startswith(RESERVED_PREFIX) else [expand_cookie(item) for item in value]
+        for key, value in json.loads(text).items()
+    }
@@ -0,0 +1,155 @@
+"""Thread primitives of store clients: shared in-flight reads and combined writes."""
+
+import time
+from threading import Event, Lock, RLock
+from typing import Any, Callable, Dict, Hashable, List, Optional, Union
+
+
+class _Call(object):
+    """Result of one call that several threads wait for."""
+
+    def __init__(self) -> None:
+        """Call initial method."""
+        self.done = Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(object):
+    """Concurrent calls with the same key wait for the first one and share its result or error."""
+
+    def __init__(self) -> None:
+        """Single flight initial method."""
+        self.lock = Lock()
+        self.calls: Dict[Hashable, _Call] = {}
+        # сколько вызовов выполнено и сколько получили чужой результат
+        self.leaders = 0
+        self.shared = 0
+        self.waited = 0.0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Call function once for all threads that ask for the same key at the same time.
+
+        Args:
+            key: call identity.
+            fn: function without arguments.
+
+        Returns:
+            Function result.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.shared += 1
+        if not leader:
+            started = time.perf_counter()
+            call.done.wait()  # type: ignore
+            with self.lock:
+                self.waited += time.perf_counter() - started
+            if call.error is not None:  # type: ignore
+                raise call.error  # type: ignore
+            return call.result  # type: ignore
+        try:
+            call.result = fn()  # type: ignore
+        except BaseException as error:
+            call.error = error  # type: ignore
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()  # type: ignore
+        return call.result  # type: ignore
+
+
+class _Write(object):
+    """Queued write of one thread."""
+
+    def __init__(self, changes: Callable, hashes: Optional[List[str]]) -> None:
+        """Write initial method.
+
+        Args:
+            changes: function that edits payload in place.
+            hashes: hashes touched by changes, None means all.
+        """
+        self.changes = changes
+        self.hashes = hashes
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+
+class WriteQueue(object):
+    """Writes of all threads go through one lock, writes queued while lock is busy are applied together.
+
+    Thread that takes the lock applies every queued write with one call, others just get the outcome.
+    """
+
+    def __init__(self, apply: Callable[[Callable, Optional[List[str]]], None], lock: Union[Lock, RLock]) -> None:
+        """Queue initial method.
+
+        Args:
+            apply: function that writes combined changes, gets changes and touched hashes.
+            lock: lock that serializes writes.
+        """
+        self.apply = apply
+        self.lock = lock
+        self.queue_lock = Lock()
+        self.queue: List[_Write] = []
+        self.writes = 0
+        self.batches = 0
+        # записи, ушедшие вместе с чужими
+        self.combined = 0
+        # сколько раз запись ждала блокировку и сколько секунд всего
+        self.contended = 0
+        self.waited = 0.0
+
+    def submit(self, changes: Callable, hashes: Optional[List[str]] = None) -> None:
+        """Queue changes and wait until they are written by this or another thread.
+
+        Args:
+            changes: function that edits payload in place, must be idempotent.
+            hashes: hashes touched by changes, None means all.
+        """
+        write = _Write(changes, hashes)
+        with self.queue_lock:
+            self.queue.append(write)
+            self.writes += 1
+        if not self.lock.acquire(blocking=False):
+            started = time.perf_counter()
+            self.lock.acquire()
+            with self.queue_lock:
+                self.contended += 1
+                self.waited += time.perf_counter() - started
+        try:
+            if not write.done:
+                self._drain()
+        finally:
+            self.lock.release()
+        if write.error is not None:
+            raise write.error
+
+    def _drain(self) -> None:
+        with self.queue_lock:
+            batch, self.queue = self.queue, []
+            self.batches += 1
+            self.combined += len(batch) - 1
+        hashes: Optional[List[str]] = []
+        for write in batch:
+            hashes = None if hashes is None or write.hashes is None else [*hashes, *write.hashes]
+
+        def changes(payload: Any) -> None:
+            # правки применяются в порядке очереди, последняя запись хэша побеждает
+            for write in batch:
+                write.changes(payload)
+        try:
+            self.apply(changes, hashes)
+        except BaseException as error:
+            for write in batch:
+                write.error = error
+            raise
+        finally:
+            for write in batch:
+                write.done = True
@@ -0,0 +1,242 @@
+"""Reso.ini options reading and objects built from them."""
+
+from configparser import ConfigParser, SectionProxy
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from src.exceptions import InvalidIniFieldError, InvalidIniValueError, NoIniFileError, NoIniOptionsError
+from src.journal import DEFAULT_JOURNAL_PATH, DEFAULT_JOURNAL_SIZE, CookieJournal
+from src.metrics import MetricsExporter, metrics
+from src.profiles import RESOURCES, BrowserProfile
+from src.stores import CookieStore, FileStore, SnapshotStore
+
+#fixme: hardcode filenames
+INI_FILENAME = 'reso.ini'
+# интервалы в секундах и их значения по умолчанию
+INI_INTERVALS = {
+    'tick-min': 1.0,
+    'tick-max': 5.0,
+    'retry-base': 1.5,
+    'retry-cap': 30.0,
+    'metrics-interval': 60.0,
+    'keepalive-min': 300.0,
+    'keepalive-max': 900.0,
+    'lease-ttl': 120.0,
+    'push-poll': 60.0,
+}
+INI_FIELDS = {
+    'hash', 'browser', 'user-agent', 'proxy-server', 'sync', 'store', 'store-path', 'probe', 'snapshot-path',
+    'relay-url', 'relay-listen', 'relay-token', 'headless', 'block-resources', 'cache-size', 'disable-background',
+    'diagnostics', 'standby', 'metrics-file', 'metrics-log', 'metrics-listen', 'keepalive', 'journal-path',
+    'journal-size', *INI_INTERVALS,
+}
+# адреса, на которых relay доступен только с этого компьютера
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+# поля с ограниченным набором значений, первое значение используется по умолчанию
+INI_CHOICES = {
+    'sync': ('poll', 'push'),
+    'store': ('telegram', 'file', 'relay', 'telegram-async'),
+    'probe': ('http', 'dom'),
+    'headless': ('no', 'yes'),
+    'disable-background': ('no', 'yes'),
+    'diagnostics': ('no', 'yes'),
+    'standby': ('no', 'yes'),
+    'keepalive': ('no', 'yes'),
+}
+DEFAULT_STORE_PATH = 'reso_cookies.json'
+DEFAULT_SNAPSHOT_PATH = 'reso_snapshot.json'
+
+
+def get_ini_options(required: bool = True) -> Optional[SectionProxy]:
+    """Get and check that ini options is correct.
+
+    Args:
+        required: raise error if there is no ini file, otherwise None is returned.
+
+    Returns:
+        SectionProxy instance (like dict) with hash, user-agent and browser fields.
+    """
+    ini_options = ConfigParser()
+    ini_content = ini_options.read(filenames=INI_FILENAME, encoding='UTF-8')
+    # нет файла
+    if not ini_content:
+        if not required:
+            return None
+        raise NoIniFileError(NoIniFileError.msg)
+    try:
+        options = ini_options['options']
+    except KeyError:
+        raise NoIniOptionsError(NoIniFileError.msg)
+    for field, field_content in options.items():
+        if field not in INI_FIELDS:
+            raise InvalidIniFieldError(InvalidIniFieldError.msg.format(field=field))
+        if not options.get(field):
+            raise InvalidIniValueError(InvalidIniValueError.msg.format(field=field, value=field_content))
+        if field in INI_CHOICES and field_content not in INI_CHOICES[field]:
+            raise InvalidIniValueError(InvalidIniValueError.msg.format(field=field, value=field_content))
+        if field in INI_INTERVALS and not _is_positive_number(field_content):
+            raise InvalidIniValueError(InvalidIniValueError.msg.format(field=field, value=field_content))
+        if field in ('cache-size', 'journal-size') and not (field_content.isdigit() and int(field_content) > 0):
+            raise InvalidIniValueError(InvalidIniValueError.msg.format(field=field, value=field_content))
+        if field in ('relay-listen', 'metrics-listen') and not field_content.rpartition(':')[2].isdigit():
+            raise InvalidIniValueError(InvalidIniValueError.msg.format(field=field, value=field_content))
+        if field == 'block-resources' and not set(_split(field_content)) <= set(RESOURCES):
+            raise InvalidIniValueError(InvalidIniValueError.msg.format(field=field, value=field_content))
+    # уведомления об изменениях раздает только relay, телеграм не присылает боту его же правки
+    if get_choice(options, 'sync') == 'push' and get_choice(options, 'store') != 'relay':
+        raise InvalidIniValueError(InvalidIniValueError.msg.format(field='sync', value=options['sync']))
+    # relay, доступный из сети, отдает куки только клиентам с общим токеном
+    listen = options.get('relay-listen')
+    if listen and not options.get('relay-token') and parse_listen(listen)[0] not in LOOPBACK_HOSTS:
+        raise InvalidIniValueError(InvalidIniValueError.msg.format(field='relay-listen', value=listen))
+    return options
+
+
+def _is_positive_number(value: str) -> bool:
+    try:
+        return float(value) > 0
+    except ValueError:
+        return False
+
+
+def _split(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def get_choice(options: Optional[SectionProxy], field: str) -> str:
+    """Get value of field with limited choices.
+
+    Args:
+        options: checked ini options, defaults are used if not passed.
+        field: field name from INI_CHOICES.
+
+    Returns:
+        Field value or its default.
+    """
+    default = INI_CHOICES[field][0]
+    if options is None:
+        return default
+    return options.get(field, default)
+
+
+@lru_cache(maxsize=None)
+def get_intervals() -> Dict[str, float]:
+    """Get intervals from reso.ini, defaults are used for absent fields or absent file.
+
+    Returns:
+        Dictionary with seconds by field name.
+    """
+    options = get_ini_options(required=False)
+    if options is None:
+        return dict(INI_INTERVALS)
+    return {field: float(options.get(field, default)) for field, default in INI_INTERVALS.items()}
+
+
+def get_store(options: Optional[SectionProxy] = None) -> CookieStore:
+    """Create cookie store selected in ini options.
+
+    Args:
+        options: checked ini options, telegram store is used if not passed.
+
+    Returns:
+        CookieStore instance.
+    """
+    if get_choice(options, 'store') == 'file':
+        return FileStore(options.get('store-path', DEFAULT_STORE_PATH))  # type: ignore
+    if get_choice(options, 'store') == 'relay':
+        from src.relay import DEFAULT_RELAY_URL, RelayStore
+        return RelayStore(options.get('relay-url', DEFAULT_RELAY_URL), options.get('relay-token'))  # type: ignore
+    if get_choice(options, 'store') == 'telegram-async':
+        from src.async_manager import SyncMessageManager
+        return SyncMessageManager()
+    # телеграм тянет за собой бота, импортируется только когда нужен
+    from src.manager import MessageManager
+    return MessageManager()
+
+
+def get_snapshot(options: Optional[SectionProxy] = None) -> SnapshotStore:
+    """Create local snapshot of last known good cookies.
+
+    Args:
+        options: checked ini options.
+
+    Returns:
+        SnapshotStore instance.
+    """
+    if options is None:
+        return SnapshotStore(DEFAULT_SNAPSHOT_PATH)
+    return SnapshotStore(options.get('snapshot-path', DEFAULT_SNAPSHOT_PATH))
+
+
+def get_journal(options: Optional[SectionProxy] = None) -> CookieJournal:
+    """Create local journal of cookie versions.
+
+    Args:
+        options: checked ini options.
+
+    Returns:
+        CookieJournal instance.
+    """
+    if options is None:
+        return CookieJournal()
+    size = options.get('journal-size')
+    return CookieJournal(
+        options.get('journal-path', DEFAULT_JOURNAL_PATH),
+        int(size) if size else DEFAULT_JOURNAL_SIZE,
+    )
+
+
+def get_profile(options: Optional[SectionProxy] = None) -> BrowserProfile:
+    """Create lightweight browser profile from ini options.
+
+    Args:
+        options: checked ini options, usual browser is used if not passed.
+
+    Returns:
+        BrowserProfile instance.
+    """
+    if options is None:
+        return BrowserProfile()
+    cache_size = options.get('cache-size')
+    return BrowserProfile(
+        headless=get_choice(options, 'headless') == 'yes',
+        block=_split(options.get('block-resources', '')),
+        cache_size=int(cache_size) if cache_size else None,
+        disable_background=get_choice(options, 'disable-background') == 'yes',
+    )
+
+
+def parse_listen(listen: str) -> Tuple[str, int]:
+    """Parse host:port string.
+
+    Args:
+        listen: string like 127.0.0.1:8765.
+
+    Returns:
+        Tuple with host and port.
+    """
+    host, _, port = listen.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def get_metrics_exporter(options: Optional[SectionProxy] = None) -> Optional[MetricsExporter]:
+    """Create metrics exporter, if any metrics output is set in ini options.
+
+    Args:
+        options: checked ini options.
+
+    Returns:
+        Not started MetricsExporter instance or None.
+    """
+    if options is None:
+        return None
+    path, log_path, listen = options.get('metrics-file'), options.get('metrics-log'), options.get('metrics-listen')
+    if not (path or log_path or listen):
+        return None
+    return MetricsExporter(
+        metrics,
+        interval=get_intervals()['metrics-interval'],
+        path=path,
+        log_path=log_path,
+        listen=parse_listen(listen) if listen else None,
+    )
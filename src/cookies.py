@@ -0,0 +1,50 @@
+"""Canonical cookie model for change detection."""
+
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+# имя, значение и домен без ведущей точки: остальные поля браузеры отдают по-разному
+CanonicalCookie = Tuple[str, str, str]
+
+
+def canonical(cookies: List[Dict]) -> Tuple[CanonicalCookie, ...]:
+    """Get cookies in canonical form that doesn't depend on order and browser specific fields.
+
+    Args:
+        cookies: selenium cookies list.
+
+    Returns:
+        Sorted tuple with (name, value, domain) of every cookie.
+    """
+    return tuple(sorted(
+        (cookie['name'], cookie['value'], cookie.get('domain', '').lstrip('.').lower())
+        for cookie in cookies
+    ))
+
+
+def fingerprint(cookies: Optional[List[Dict]]) -> Optional[str]:
+    """Get stable hash of cookies, equal sessions have equal fingerprints.
+
+    Args:
+        cookies: selenium cookies list.
+
+    Returns:
+        Hex digest or None, if there are no cookies.
+    """
+    if not cookies:
+        return None
+    return hashlib.sha1(json.dumps(canonical(cookies)).encode()).hexdigest()
+
+
+def same(first: Optional[List[Dict]], second: Optional[List[Dict]]) -> bool:
+    """Check that two cookies lists are the same session.
+
+    Args:
+        first: selenium cookies list.
+        second: selenium cookies list.
+
+    Returns:
+        bool variable.
+    """
+    return fingerprint(first) == fingerprint(second)
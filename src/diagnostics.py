@@ -0,0 +1,65 @@
+"""Startup time breakdown for diagnostics mode."""
+
+import os
+import sys
+import time
+from threading import Lock
+from typing import List, Tuple
+
+from src.settings import DIAGNOSTICS
+
+DIAGNOSTICS_FILENAME = 'reso_startup.log'
+
+
+class StartupTimer(object):
+    """Measure time between startup phases, counting from the first import of this module."""
+
+    def __init__(self, enabled: bool = False) -> None:
+        """Timer initial method.
+
+        Args:
+            enabled: print report, phases are measured anyway.
+        """
+        self.enabled = enabled
+        self.started = self.last = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.reported = False
+        self.lock = Lock()
+
+    def mark(self, phase: str) -> None:
+        """Finish phase that started at previous mark.
+
+        Args:
+            phase: phase name.
+        """
+        with self.lock:
+            now = time.perf_counter()
+            self.phases.append((phase, now - self.last))
+            self.last = now
+
+    def text(self) -> str:
+        """Format phases.
+
+        Returns:
+            Report text with seconds per phase and total.
+        """
+        lines = ['{phase:<24}{seconds:8.3f} s'.format(phase=phase, seconds=seconds) for phase, seconds in self.phases]
+        lines.append('{phase:<24}{seconds:8.3f} s'.format(phase='total', seconds=self.last - self.started))
+        return '\n'.join(lines)
+
+    def report(self) -> None:
+        """Print report once, to the console or to the file if program has no console."""
+        with self.lock:
+            if not self.enabled or self.reported:
+                return
+            self.reported = True
+        text = self.text()
+        # у оконной сборки pyinstaller нет консоли
+        if sys.stderr is not None:
+            print(text, file=sys.stderr)
+        else:
+            with open(os.path.abspath(DIAGNOSTICS_FILENAME), 'a', encoding='UTF-8') as report_file:
+                report_file.write(text + '\n\n')
+
+
+startup = StartupTimer(enabled=DIAGNOSTICS)
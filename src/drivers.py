@@ -0,0 +1,78 @@
+"""Cache of resolved driver and browser paths, so launches after the first skip Selenium Manager."""
+
+import json
+import os
+from typing import Dict, Optional
+
+from src.files import atomic_write
+
+
+class DriverCache(object):
+    """Json file with driver path, browser path and browser version by browser name."""
+
+    def __init__(self, path: Optional[str]) -> None:
+        """Cache initial method.
+
+        Args:
+            path: cache file path, cache is disabled if None.
+        """
+        self.path = path
+
+    def get(self, browser: str) -> Optional[Dict[str, str]]:
+        """Get cached paths, if driver file still exists.
+
+        Args:
+            browser: browser name, like 'Firefox'.
+
+        Returns:
+            Dictionary with driver_path, browser_path and version or None.
+        """
+        entry = self._load().get(browser)
+        if not entry or not os.path.isfile(entry.get('driver_path', '')):
+            return None
+        return entry
+
+    def put(self, browser: str, driver_path: str, browser_path: str, version: str) -> None:
+        """Save resolved paths, file is not written if nothing changed.
+
+        Args:
+            browser: browser name.
+            driver_path: path to driver executable.
+            browser_path: path to browser executable, empty for default location.
+            version: browser version.
+        """
+        if self.path is None or not driver_path:
+            return
+        entries = self._load()
+        entry = {'driver_path': driver_path, 'browser_path': browser_path, 'version': version}
+        if entries.get(browser) == entry:
+            return
+        entries[browser] = entry
+        self._save(entries)
+
+    def drop(self, browser: str) -> None:
+        """Forget paths, for example when browser was updated and cached driver doesn't fit.
+
+        Args:
+            browser: browser name.
+        """
+        entries = self._load()
+        if entries.pop(browser, None) is not None:
+            self._save(entries)
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path, encoding='UTF-8') as cache_file:
+                entries = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _save(self, entries: Dict[str, Dict[str, str]]) -> None:
+        try:
+            atomic_write(self.path, json.dumps(entries, indent=4))  # type: ignore
+        except OSError:
+            # кэш только ускоряет запуск, без него все работает
+            pass
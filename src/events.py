@@ -0,0 +1,97 @@
+"""Browser side notifications about reso cookies set by server."""
+
+import time
+from threading import Event
+from typing import Any, Dict, Iterable, Optional, Union
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.bidi.network import NetworkEvent
+from selenium.webdriver.common.bidi.session import Session
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from src.choiches import CookieFields
+from src.stores import ChangeSignal
+
+
+class CookieEvents(object):
+    """Watch Set-Cookie headers of browser responses through WebDriver BiDi network events."""
+
+    event = 'network.responseStarted'
+    cookie_names = (CookieFields.aspnet, CookieFields.reso_office60)
+    # даже без событий куки перечитываются не реже, на случай потерянного события или истечения срока
+    max_age = 30.0
+
+    def __init__(self, wake: Optional[Union[Event, ChangeSignal]] = None) -> None:
+        """Events initial method.
+
+        Args:
+            wake: event that is set together with own one, for example to wake run loop.
+        """
+        self.changed = Event()
+        self.wake = wake
+        self.events = 0
+        self.read_at = 0.0
+
+    @classmethod
+    def attach(cls, driver: WebDriver, wake: Optional[Union[Event, ChangeSignal]] = None) -> Optional['CookieEvents']:
+        """Subscribe to network events of driver.
+
+        Args:
+            driver: webdriver started with enabled bidi.
+            wake: event to set on cookie change.
+
+        Returns:
+            CookieEvents instance or None, if driver doesn't support bidi and cookies have to be polled.
+        """
+        events = cls(wake)
+        try:
+            connection = driver.network.conn
+            connection.add_callback(NetworkEvent(cls.event), events.on_response)
+            connection.execute(Session(connection).subscribe(cls.event))
+        except (WebDriverException, OSError):
+            return None
+        return events
+
+    def on_response(self, event: NetworkEvent) -> None:
+        """Handle network event, called from websocket thread.
+
+        Args:
+            event: bidi network event.
+        """
+        headers = event.params.get('response', {}).get('headers', [])
+        if self.sets_reso_cookie(headers):
+            self.events += 1
+            self.changed.set()
+            if self.wake is not None:
+                self.wake.set()
+
+    def sets_reso_cookie(self, headers: Iterable[Dict[str, Any]]) -> bool:
+        """Check that response headers set one of reso session cookies.
+
+        Args:
+            headers: bidi headers list.
+
+        Returns:
+            bool variable.
+        """
+        for header in headers:
+            if header.get('name', '').lower() != 'set-cookie':
+                continue
+            value = header.get('value', {})
+            text = value.get('value', '') if isinstance(value, dict) else str(value)
+            if any(text.lstrip().startswith(name + '=') for name in self.cookie_names):
+                return True
+        return False
+
+    def stale(self) -> bool:
+        """Check that browser cookies must be read again.
+
+        Returns:
+            bool variable.
+        """
+        return self.changed.is_set() or time.monotonic() - self.read_at > self.max_age
+
+    def read(self) -> None:
+        """Mark browser cookies as just read."""
+        self.changed.clear()
+        self.read_at = time.monotonic()
@@ -15,6 +15,9 @@ class BrowserNotInstalled(ResoException):
 class BrowserNotFoundError(IniFileError):
     pass
 
+class DriverCrashed(ResoException):
+    msg = 'Браузер перестал отвечать: {error}'
+
 class NoIniFileError(IniFileError):
     msg = 'Не найден файл reso.ini'
 
@@ -30,8 +33,14 @@ class InvalidIniValueError(IniFileError):
 class InvalidBotToken(TelegramError):
     msg = 'Невалидный токен в .env файле'
 
+class InvalidRelayToken(TelegramError):
+    msg = 'Relay отклонил запрос: поле relay-token в reso.ini не совпадает с токеном relay'
+
 class InvalidHash(TelegramError):
     msg = 'Невалидный хэш "{hash}" в reso.ini, такой хэш отсутствует на сервере.'
 
+class UpdateConflict(TelegramError):
+    msg = 'Не удалось сохранить изменения: закрепленное сообщение одновременно меняют другие клиенты'
+
 class MessageTooLong(TelegramError):
     msg = f'При добавлении нового аккаунта будет превышен лимит {TELEGRAM_MSG_LIMIT} байт (символов). Такое количество аккаунтов создать не получится'
@@ -0,0 +1,60 @@
+"""Local file helpers shared by on-disk stores."""
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+def atomic_write(path: str, text: str) -> None:
+    """Write file so readers see either old or new content, never a half-written one.
+
+    Args:
+        path: destination file path.
+        text: new file content.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'w', encoding='UTF-8') as tmp:
+            tmp.write(text)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextmanager
+def file_lock(path: str, stale: float = 10.0) -> Iterator[None]:
+    """Cross-process lock based on exclusive creation of a lock file.
+
+    Args:
+        path: lock file path.
+        stale: seconds after which lock left by dead process is broken.
+
+    Yields:
+        Nothing, lock is held inside with block.
+    """
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(path).st_mtime > stale:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+            time.sleep(0.01)
+            continue
+        os.close(fd)
+        break
+    try:
+        yield
+    finally:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
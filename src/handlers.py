@@ -10,7 +10,7 @@ from http.client import RemoteDisconnected
 from sys import exit
 from typing import Any, Callable, Dict, Optional, Tuple
 
-from requests import ConnectionError as ConnectionErrorRequests
+from requests import RequestException
 from selenium.common.exceptions import (
     InvalidCookieDomainException, InvalidSessionIdException, NoSuchWindowException, UnexpectedAlertPresentException,
     WebDriverException, NoAlertPresentException
@@ -21,7 +21,78 @@ from telebot.apihelper import ApiTelegramException
 from urllib3.exceptions import MaxRetryError
 
 from src.choiches import Systems
-from src.exceptions import TelegramError
+from src.exceptions import DriverCrashed, TelegramError
+from src.metrics import metrics
+from src.scheduler import TickScheduler, retry_after
+
+
+# пауза перед повтором после восстановимой ошибки браузера
+RECOVERY_DELAY = 1.0
+
+
+class RetryPolicy(object):
+    """Attempts, pauses and final error of retried store call, shared by sync and async retry decorators."""
+
+    attempts = 11
+
+    def __init__(
+        self,
+        name: str,
+        api_errors: Tuple[type, ...] = (ApiTelegramException,),
+        store: str = 'Telegram',
+    ) -> None:
+        """Policy initial method.
+
+        Args:
+            name: retried function name.
+            api_errors: telegram errors, their retry_after is respected, other errors are network ones.
+            store: name of store in error message.
+        """
+        self.name = name
+        self.api_errors = api_errors
+        self.store = store
+        self.scheduler = TickScheduler.from_ini()
+        self.exception: Optional[Exception] = None
+
+    def delay(self, error: Exception) -> float:
+        """Count failed attempt.
+
+        Args:
+            error: attempt error.
+
+        Returns:
+            Seconds to wait before next attempt.
+        """
+        self.exception = error
+        if isinstance(error, self.api_errors):
+            # проблемы с телеграмм
+            delay = self.scheduler.failure(retry_after(error))  # type: ignore
+        else:
+            # проблемы с интернетом
+            delay = self.scheduler.failure()
+        metrics.inc('reso_retries_total', function=self.name, error=type(error).__name__)
+        return delay
+
+    def error(self) -> TelegramError:
+        """Get error raised when attempts are over.
+
+        Returns:
+            TelegramError instance.
+        """
+        if isinstance(self.exception, self.api_errors):
+            err_msg = "Программа не смогла связаться с {store} по неизвестной причине. Исключение {name}"
+        else:
+            err_msg = (
+                "Программа не смогла связаться с сервером {store}. Проверьте соединение с интернетом. "
+                "Исключение {name}"
+            )
+        err_msg = err_msg.format(store=self.store, name=type(self.exception).__name__)
+        return TelegramError(
+            'Проблемы с интернетом.\n{err_type}\nФункция: {name}'.format(
+                err_type=err_msg,
+                name=self.name,
+            )
+        )
 
 
 def retry(fn: Callable) -> Callable:
@@ -41,37 +112,23 @@ def retry(fn: Callable) -> Callable:
             args: Tuple with any values.
             kwargs: Dictionary with any variables and values.
         """
-        err_counter = 0
-        exception = None
-        while err_counter <= 10:
+        # relay называет себя сам, остальные хранилища ходят в телеграм
+        policy = RetryPolicy(fn.__name__, store=getattr(args[0], 'store_name', 'Telegram') if args else 'Telegram')
+        for _ in range(policy.attempts):
             try:
                 return fn(*args, **kwargs)
-            # проблемы с интернетом
-            # телеграм апи использует реквестс
-            except ConnectionErrorRequests as e:
-                err_counter += 1
-                exception = e
-            # проблемы с телеграмм
-            except ApiTelegramException as e:
-                err_counter += 1
-                exception = e
-            time.sleep(1.5)
-        if isinstance(exception, ConnectionErrorRequests):
-            err_msg = "Программа не смогла связаться с сервером Telegram. Проверьте соединение с интернетом. Исключение ConnectionErrorRequests"
-        else:
-            err_msg = "Программа не смогла связаться с Telegram по неизвестной причине. Исключение ApiTelegramException"
-        raise TelegramError(
-            'Проблемы с интернетом.\n{err_type}\nФункция: {name}'.format(
-                err_type=err_msg,
-                name=fn.__name__,
-            )
-        )
+            # телеграм апи и relay используют реквестс, таймауты повторяются как обрывы связи
+            except (RequestException, ApiTelegramException) as error:
+                time.sleep(policy.delay(error))
+        raise policy.error()
     return inner
 
 
 def exception_run_handler(fn: Callable) -> Callable:
     """Run function exception handler that.
 
+    Fatal driver errors finish program, or raise DriverCrashed if driver is supervised and can be replaced.
+
     Args:
         fn: function that will be wrapped.
     """
@@ -102,22 +159,35 @@ def exception_run_handler(fn: Callable) -> Callable:
                 pass
             except InvalidSessionIdException:
                 exit(0)
-            except IndexError:
-                driver.quit()
-                break
-            except WebDriverException:
-                driver.quit()
-                break
-            except MaxRetryError:
+            except (IndexError, WebDriverException) as e:
+                quit_driver(driver)
+                if getattr(driver, 'supervised', False):
+                    raise DriverCrashed(DriverCrashed.msg.format(error=e)) from e
                 break
             # если закрыть браузер при выполнении второго гет запроса
-            except RemoteDisconnected:
+            except (MaxRetryError, RemoteDisconnected) as e:
+                if getattr(driver, 'supervised', False):
+                    quit_driver(driver)
+                    raise DriverCrashed(DriverCrashed.msg.format(error=e)) from e
                 break
-            time.sleep(1)
+            # окно, алерт и куки восстанавливаются сразу, сбои хранилища и сети ждут в retry с отступом
+            time.sleep(RECOVERY_DELAY)
         exit(0)
     return inner
 
 
+def quit_driver(driver: WebDriver) -> None:
+    """Quit driver that may be already dead.
+
+    Args:
+        driver: ResoBrowser object.
+    """
+    try:
+        driver.quit()
+    except (WebDriverException, MaxRetryError, RemoteDisconnected, OSError):
+        pass
+
+
 def show_error(title, message):
     system = platform.system()
     if system == Systems.windows:
@@ -0,0 +1,194 @@
+"""Local append-only journal of cookie versions, used to roll back to the last known good session."""
+
+import json
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, List, Optional
+
+from src.codec import compact_cookie, expand_cookie
+from src.cookies import fingerprint
+from src.files import atomic_write, file_lock
+
+DEFAULT_JOURNAL_PATH = 'reso_journal.jsonl'
+DEFAULT_JOURNAL_SIZE = 256 * 1024
+
+
+class JournalEntry(object):
+    """Latest known state of one cookie version of hash."""
+
+    def __init__(self, key: str, cookies: List, created: float, origin: str) -> None:
+        """Entry initial method.
+
+        Args:
+            key: cookies fingerprint.
+            cookies: list with dict cookies.
+            created: unix time when version was recorded first.
+            origin: id of client that recorded version first.
+        """
+        self.fingerprint = key
+        self.cookies = cookies
+        self.created = created
+        self.origin = origin
+        # последний результат проверки и его время
+        self.valid: Optional[bool] = None
+        self.checked = created
+
+
+class CookieJournal(object):
+    """Journal lines are appended by every client of this host, file is rotated when it grows over max size.
+
+    Version line keeps compact cookies only the first time, later lines keep only validity outcome.
+    Rotated file starts with known good versions, so rollback survives rotation.
+    """
+
+    # сколько версий каждого хэша держать в памяти
+    max_versions = 20
+
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH, max_size: int = DEFAULT_JOURNAL_SIZE) -> None:
+        """Journal initial method.
+
+        Args:
+            path: jsonl file path.
+            max_size: file size in bytes that triggers rotation.
+        """
+        self.path = path
+        self.backup_path = '{path}.1'.format(path=path)
+        self.lock_path = '{path}.lock'.format(path=path)
+        self.max_size = max_size
+        self.lock = Lock()
+        self.entries: Dict[str, 'OrderedDict[str, JournalEntry]'] = {}
+        # прочитанная часть файла: inode и смещение
+        self._inode: Optional[int] = None
+        self._offset = 0
+
+    def record(self, hsh: str, cookies: Optional[List], valid: Optional[bool], origin: str = '') -> None:
+        """Append version of hash or its validity outcome, nothing is written if outcome is already known.
+
+        Args:
+            hsh: user identification hash.
+            cookies: list with dict cookies.
+            valid: validity outcome, None if it wasn't checked yet.
+            origin: id of client that saw the version.
+        """
+        key = fingerprint(cookies)
+        if key is None:
+            return
+        with self.lock:
+            self._sync()
+            entry = self.entries.get(hsh, {}).get(key)
+            if entry is not None and (valid is None or entry.valid == valid):
+                return
+            line = {'t': round(time.time(), 3), 'h': hsh, 'f': key, 'o': origin, 'v': valid}
+            if entry is None:
+                line['c'] = [compact_cookie(cookie) for cookie in cookies]  # type: ignore
+            with file_lock(self.lock_path):
+                self._sync()
+                if self._size() >= self.max_size:
+                    self._rotate()
+                with open(self.path, 'a', encoding='UTF-8') as journal_file:
+                    journal_file.write(json.dumps(line, separators=(',', ':')) + '\n')
+            self._sync()
+
+    def history(self, hsh: str) -> List[JournalEntry]:
+        """Get known versions of hash.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            Entries from the oldest to the newest.
+        """
+        with self.lock:
+            self._sync()
+            return list(self.entries.get(hsh, {}).values())
+
+    def candidates(self, hsh: str, exclude: Iterable[Optional[str]] = (), limit: int = 3) -> List[List]:
+        """Get versions of hash that worked last time they were checked.
+
+        Args:
+            hsh: user identification hash.
+            exclude: fingerprints to skip, like current store cookies.
+            limit: maximum amount of versions.
+
+        Returns:
+            Cookies lists, the most recently confirmed first.
+        """
+        skip = set(exclude)
+        good = [entry for entry in self.history(hsh) if entry.valid and entry.fingerprint not in skip]
+        good.sort(key=lambda entry: entry.checked, reverse=True)
+        return [entry.cookies for entry in good[:limit]]
+
+    def last_good(self, hsh: str, exclude: Iterable[Optional[str]] = ()) -> Optional[List]:
+        """Get the most recent version of hash that is known to work.
+
+        Args:
+            hsh: user identification hash.
+            exclude: fingerprints to skip.
+
+        Returns:
+            Cookies list or None.
+        """
+        found = self.candidates(hsh, exclude=exclude, limit=1)
+        return found[0] if found else None
+
+    def _size(self) -> int:
+        try:
+            return os.stat(self.path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _rotate(self) -> None:
+        # вызывается под file_lock: старый файл уходит в бэкап, новый начинается с рабочих версий
+        good = [
+            {'t': entry.checked, 'h': hsh, 'f': entry.fingerprint, 'o': entry.origin, 'v': True,
+             'c': [compact_cookie(cookie) for cookie in entry.cookies]}
+            for hsh, entries in self.entries.items() for entry in entries.values() if entry.valid
+        ]
+        os.replace(self.path, self.backup_path)
+        atomic_write(self.path, ''.join(json.dumps(line, separators=(',', ':')) + '\n' for line in good))
+
+    def _sync(self) -> None:
+        # дочитываем строки, дописанные другими клиентами, после ротации читаем заново
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self.entries.clear()
+            self._inode, self._offset = stat.st_ino, 0
+            self._read(self.backup_path, 0)
+        self._offset = self._read(self.path, self._offset)
+
+    def _read(self, path: str, offset: int) -> int:
+        try:
+            with open(path, 'rb') as journal_file:
+                journal_file.seek(offset)
+                data = journal_file.read()
+        except FileNotFoundError:
+            return offset
+        # недописанная строка будет прочитана в следующий раз
+        complete = data[:data.rfind(b'\n') + 1]
+        for raw in complete.splitlines():
+            try:
+                self._apply(json.loads(raw))
+            except (ValueError, KeyError, TypeError, IndexError):
+                continue
+        return offset + len(complete)
+
+    def _apply(self, line: Dict) -> None:
+        entries = self.entries.setdefault(line['h'], OrderedDict())
+        entry = entries.get(line['f'])
+        if entry is None:
+            if 'c' not in line:
+                # версия осталась в удаленном бэкапе
+                return
+            entry = entries[line['f']] = JournalEntry(
+                line['f'], [expand_cookie(item) for item in line['c']], line['t'], line['o'],
+            )
+            if len(entries) > self.max_versions:
+                entries.popitem(last=False)
+        if line['v'] is not None:
+            entry.valid = line['v']
+            entry.checked = line['t']
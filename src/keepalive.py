@@ -0,0 +1,213 @@
+"""Background keep-alive of shared reso sessions, rotated cookies are published before the old ones expire."""
+
+import secrets
+import time
+from threading import Event, Thread
+from typing import Dict, List, Optional
+
+from src.choiches import CookieFields
+from src.config import get_intervals
+from src.cookies import fingerprint
+from src.exceptions import ResoException
+from src.metrics import metrics
+from src.probe import SessionProbe
+from src.stores import CookieStore
+
+# куки ресо, которые сервер может выдать заново
+SESSION_COOKIES = (CookieFields.aspnet, CookieFields.reso_office60)
+
+
+class KeepAliveState(object):
+    """Learned touch interval and observed lifetime of shared session of one hash."""
+
+    def __init__(self, interval: float) -> None:
+        """State initial method.
+
+        Args:
+            interval: initial seconds between touches.
+        """
+        self.interval = interval
+        self.next_touch = 0.0
+        # сессия, к которой относится состояние
+        self.fingerprint: Optional[str] = None
+        self.last_ok: Optional[float] = None
+        # наибольшая пауза между касаниями, которую сессия пережила
+        self.worked: Optional[float] = None
+        # наименьшая пауза между касаниями, после которой сессия умерла
+        self.idle_limit: Optional[float] = None
+        self.expired = False
+        self.touches = 0
+        self.rotations = 0
+        self.expirations = 0
+
+
+class SessionKeeper(Thread):
+    """Touch office with shared cookies of every hash, so idle sessions don't expire on the server.
+
+    Interval of hash grows up to max_interval, which stays below server session timeout, and after expiration
+    drops back to the last pause that session survived, never growing past it again. Sessions leased by other
+    clients aren't touched, cookies issued by server are published under writer lease of the hash,
+    so browsers adopt them instead of logging out.
+    """
+
+    # доля паузы, после которой сессия умерла, и рост интервала после удачного касания
+    safety = 0.5
+    growth = 1.25
+
+    def __init__(
+        self,
+        store: CookieStore,
+        probe: Optional[SessionProbe] = None,
+        hashes: Optional[List[str]] = None,
+        min_interval: Optional[float] = None,
+        max_interval: Optional[float] = None,
+    ) -> None:
+        """Keeper initial method.
+
+        Args:
+            store: shared cookie store.
+            probe: pooled http client, new one is created if not passed.
+            hashes: hashes to keep alive, all accounts of store if not passed.
+            min_interval: shortest seconds between touches of hash, keepalive-min from reso.ini if not passed.
+            max_interval: longest seconds between touches of hash, keepalive-max from reso.ini if not passed.
+        """
+        super().__init__(name='SessionKeeper', daemon=True)
+        intervals = get_intervals()
+        self.store = store
+        self.probe = probe or SessionProbe()
+        self.hashes = hashes
+        self.min_interval = intervals['keepalive-min'] if min_interval is None else min_interval
+        self.max_interval = intervals['keepalive-max'] if max_interval is None else max_interval
+        # касания публикуют куки под той же арендой записи, что и браузеры
+        self.owner = 'keepalive-' + secrets.token_hex(4)
+        self.lease_ttl = intervals['lease-ttl']
+        self.states: Dict[str, KeepAliveState] = {}
+        self.stopped = Event()
+
+    def run(self) -> None:
+        """Touch due hashes until stopped."""
+        while not self.stopped.is_set():
+            try:
+                self.tick()
+            except ResoException:
+                # хранилище недоступно, попробуем в следующий раз
+                metrics.inc('reso_keepalive_total', result='error')
+            self.stopped.wait(self.sleep_time())
+
+    def stop(self) -> None:
+        """Stop after current touch."""
+        self.stopped.set()
+
+    def tick(self) -> None:
+        """Touch every hash whose interval has passed."""
+        now = time.monotonic()
+        for hsh in self.hashes or self.store.accounts():
+            state = self.states.get(hsh)
+            if state is None or state.next_touch <= now:
+                self.touch(hsh)
+
+    def sleep_time(self) -> float:
+        """Get seconds until the nearest touch.
+
+        Returns:
+            Seconds to wait.
+        """
+        if not self.states:
+            return self.min_interval
+        return max(1.0, min(state.next_touch for state in self.states.values()) - time.monotonic())
+
+    def touch(self, hsh: str) -> Optional[bool]:
+        """Request office with shared cookies of hash and publish cookies issued by server.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            Session validity or None, if it wasn't checked.
+        """
+        state = self.states.setdefault(hsh, KeepAliveState(self.min_interval))
+        now = time.monotonic()
+        cookies = self.store.get_cookies(hsh)
+        current = fingerprint(cookies)
+        if current != state.fingerprint:
+            # человек или браузер записал новую сессию, выученный интервал остается
+            state.fingerprint, state.last_ok, state.expired = current, None, False
+        if state.expired or not cookies:
+            # мертвую сессию не трогаем, ждем новых кук в хранилище
+            state.next_touch = now + self.min_interval
+            return None
+        lease = self.store.lease(hsh)
+        if lease is not None and lease[0] != self.owner and lease[1] > time.time():
+            # сессию держит живой браузер, касание сменило бы его куки без права их опубликовать
+            metrics.inc('reso_keepalive_total', result='lease_held')
+            state.next_touch = now + self.min_interval
+            return None
+        valid, issued = self.probe.touch(cookies)
+        state.touches += 1
+        if valid is None:
+            metrics.inc('reso_keepalive_total', result='error')
+            state.next_touch = now + self.min_interval
+            return None
+        if not valid:
+            self._expired(state, now)
+            return False
+        fresh = [
+            dict(cookie, value=issued[cookie['name']])
+            if cookie['name'] in SESSION_COOKIES and issued.get(cookie['name'], cookie['value']) != cookie['value']
+            else cookie
+            for cookie in cookies
+        ]
+        if fresh == cookies:
+            metrics.inc('reso_keepalive_total', result='ok')
+        elif self.store.acquire_lease(hsh, self.owner, self.lease_ttl, cookies=fresh):
+            state.fingerprint = fingerprint(fresh)
+            state.rotations += 1
+            metrics.inc('reso_keepalive_total', result='rotated')
+        else:
+            # аренду успел взять браузер, он опубликует свои куки
+            metrics.inc('reso_keepalive_total', result='lease_held')
+        if state.last_ok is not None:
+            state.worked = max(state.worked or 0.0, now - state.last_ok)
+        state.last_ok = now
+        state.interval = self._grown(state, cookies)
+        state.next_touch = now + state.interval
+        return True
+
+    def _expired(self, state: KeepAliveState, now: float) -> None:
+        state.expired = True
+        state.expirations += 1
+        metrics.inc('reso_keepalive_total', result='expired')
+        if state.last_ok is not None:
+            # сессия пережила прошлое касание, но не эту паузу: возвращаемся к последнему рабочему интервалу
+            pause = now - state.last_ok
+            state.idle_limit = pause if state.idle_limit is None else min(state.idle_limit, pause)
+            state.interval = max(self.min_interval, self._ceiling(state))
+        state.next_touch = now + self.min_interval
+
+    def _ceiling(self, state: KeepAliveState) -> float:
+        limit = (state.idle_limit or 0.0) * self.safety
+        if state.worked is not None and state.worked < (state.idle_limit or 0.0):
+            limit = max(limit, state.worked)
+        return limit
+
+    def _grown(self, state: KeepAliveState, cookies: List) -> float:
+        interval = min(self.max_interval, state.interval * self.growth)
+        if state.idle_limit is not None:
+            # выученный предел больше не пересекаем, иначе снова убьем сессию
+            interval = min(interval, self._ceiling(state))
+        # куки с известным сроком обновляем до его окончания
+        expiries = [cookie['expiry'] - time.time() for cookie in cookies if cookie.get('expiry')]
+        if expiries:
+            interval = min(interval, min(expiries) * self.safety)
+        return max(self.min_interval, interval)
+
+
+if __name__ == '__main__':
+    from src.config import get_ini_options, get_store
+    ini_options = get_ini_options(required=False)
+    keeper = SessionKeeper(
+        get_store(ini_options),
+        SessionProbe(user_agent=ini_options['user-agent'] if ini_options is not None else None),
+    )
+    keeper.start()
+    keeper.join()
@@ -1,30 +1,36 @@
 """Main file to run main functionality."""
 
+# отсчет времени запуска начинается с этого импорта, поэтому он первый
+from src.diagnostics import startup
+
 import os
-import time
-from configparser import ConfigParser, SectionProxy
-from os import devnull
-from typing import Any, Dict, List, Tuple, Type, Optional
+from configparser import SectionProxy
+from typing import Any, Dict, Tuple, Type, Optional
 
-from selenium.common.exceptions import NoSuchElementException, NoSuchDriverException
 from selenium.webdriver import Chrome, Edge, Firefox
 from selenium.webdriver.chrome.options import ChromiumOptions as ChromeOptions
 from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.common.by import By
 from selenium.webdriver.edge.options import Options as EdgeOptions
 from selenium.webdriver.edge.service import Service as EdgeService
 from selenium.webdriver.firefox.options import Options as FirefoxOptions
 from selenium.webdriver.firefox.service import Service as FirefoxService
 from selenium.webdriver.remote.webdriver import WebDriver
 
-from src.choiches import CookieFields
-from src.exceptions import NoIniFileError, NoIniOptionsError, InvalidIniFieldError, InvalidIniValueError, \
-    BrowserNotFoundError, BrowserNotInstalled
-from src.handlers import exception_run_handler
-from src.manager import MessageManager
+from src.browser import ResoBrowserMixin
+from src.config import (
+    get_choice, get_ini_options, get_journal, get_metrics_exporter, get_profile, get_snapshot, get_store,
+)
+from src.exceptions import BrowserNotFoundError
+from src.keepalive import SessionKeeper
+from src.probe import SessionProbe
+from src.profiles import BrowserProfile
 
 BaseDriverMeta: Type = type(WebDriver)
 
+startup.mark('imports')
+
+
+
 class BrowserDetector(object):
     """Detect browser class and his services and options."""
 
@@ -34,24 +40,27 @@ class BrowserDetector(object):
         'Edge': (Edge, EdgeService, EdgeOptions),
     }
 
-    def __init__(self, name: str, user_agent: str):
-        """Create instance with options and service by name.
+    def __init__(self, name: str, user_agent: str, profile: Optional[BrowserProfile] = None):
+        """Create instance with options and service class by name.
 
         Args:
             name: browser string capitalized name, like 'Firefox',
             user_agent: string User-Agent value.
+            profile: lightweight profile options, usual browser if not passed.
         """
         self.name = name
         if self.name == 'Edge':
             # https://github.com/seleniumhq/selenium/issues/16073
             os.environ["SE_DRIVER_MIRROR_URL"] = "https://msedgedriver.microsoft.com"
+        # сервис создается для каждого браузера при запуске, здесь нужен только класс
         try:
-            self.klass = self.browser_dictionary[name][0]
+            self.klass, self.service_class, options_class = self.browser_dictionary[name]
         except KeyError:
             raise BrowserNotFoundError(f'Браузер {self.name} не поддерживается программой. Проверьте корректность ввода данных в reso.ini файле.')
-        self.service = self.browser_dictionary[name][1](log_output=devnull)
-        self.options = self.browser_dictionary[name][2]()
-        if isinstance(self.options, FirefoxOptions):
+        self.options = options_class()
+        # bidi дает события сети, по ним видно смену кук без опроса драйвера
+        self.options.enable_bidi = True
+        if hasattr(self.options, 'set_preference'):
             self.options.set_preference('general.useragent.override', user_agent)
             self.options.set_preference("dom.webdriver.enabled", False)
             self.options.set_preference("useAutomationExtension", False)  # на всякий случай
@@ -61,10 +70,12 @@ class BrowserDetector(object):
             self.options.add_experimental_option("excludeSwitches", ["enable-automation"])
             self.options.add_argument("--disable-blink-features=AutomationControlled")
             self.options.set_capability("unhandledPromptBehavior", "ignore")
+        self.profile = profile or BrowserProfile()
+        self.profile.apply(self.options)
 
 
 class BrowserMeta(BaseDriverMeta):
-    """Metaclass for detect browser in ini options and change ResoBrowser class inheritance."""
+    """Metaclass for detect browser in ini options and add browser class to ResoBrowser inheritance."""
 
     def __new__(cls, name: str, bases: Tuple, attrs: Dict) -> Any:
         """Class creation method.
@@ -81,12 +92,27 @@ class BrowserMeta(BaseDriverMeta):
         browser = BrowserDetector(
             name=options['browser'].capitalize(),
             user_agent=options['user-agent'].capitalize(),
+            profile=get_profile(options),
         )  # type: ignore
-        new_browser_class = super().__new__(cls, name, (browser.klass,), attrs)
-        new_browser_class.hash = options.get('hash', 'None')
-        new_browser_class.service = browser.service
+        new_browser_class = super().__new__(cls, name, (*bases, browser.klass), attrs)
+        new_browser_class.hashes = [hsh.strip() for hsh in options.get('hash', 'None').split(',') if hsh.strip()]
+        new_browser_class.hash = new_browser_class.hashes[0]
+        new_browser_class.service_class = browser.service_class
         new_browser_class.options = browser.options
+        new_browser_class.profile = browser.profile
         new_browser_class.browser_name = options['browser'].capitalize()
+        new_browser_class.sync = get_choice(options, 'sync')
+        new_browser_class.manager = get_store(options)
+        new_browser_class.snapshot = get_snapshot(options)
+        new_browser_class.journal = get_journal(options)
+        new_browser_class.probe = None
+        if get_choice(options, 'probe') == 'http':
+            new_browser_class.probe = SessionProbe(user_agent=options['user-agent'].capitalize())
+        if get_choice(options, 'diagnostics') == 'yes':
+            startup.enabled = True
+        exporter = get_metrics_exporter(options)
+        if exporter is not None:
+            exporter.start()
         return new_browser_class
 
     @classmethod
@@ -96,131 +122,19 @@ class BrowserMeta(BaseDriverMeta):
         Returns:
             SectionProxy instance (like dict) with hash, user-agent and browser fields.
         """
-        ini_options = ConfigParser()
-        #fixme: hardcode filenames
-        ini_content = ini_options.read(filenames='reso.ini', encoding='UTF-8')
-        # нет файла
-        if not ini_content:
-            raise NoIniFileError(NoIniFileError.msg)
-        try:
-            options = ini_options['options']
-        except KeyError:
-            raise NoIniOptionsError(NoIniFileError.msg)
-        for field, field_content in options.items():
-            if field not in {'hash', 'browser', 'user-agent', 'proxy-server'}:
-                raise InvalidIniFieldError(InvalidIniFieldError.msg.format(field=field))
-            if not options.get(field):
-                raise InvalidIniValueError(InvalidIniValueError.msg.format(field=field, value=field_content))
-        return options
+        return get_ini_options()  # type: ignore
 
 
-class ResoBrowser(Firefox, metaclass=BrowserMeta):
+class ResoBrowser(ResoBrowserMixin, metaclass=BrowserMeta):
     """Main Webdriver class."""
 
-    url_main = 'https://office.reso.ru/'
-    manager = MessageManager()
-
-    # will fill in meta:
-    hash: str
-    service: FirefoxService
-    options: FirefoxOptions
-    browser_name: str
-
-    def __init__(self) -> None:
-        """Initialize method for class."""
-        #browser in ini file is correct, but not installed in system
-        try:
-            super().__init__(service=self.service, options=self.options)
-        except NoSuchDriverException:
-            raise BrowserNotInstalled(f'Браузер {self.browser_name} не установлен в системе')
-        self.need_to_set_telegram_cookies = False
-        self.last_cookies = self.manager.get_telegram_cookies(self.hash)
-
-    def delete_reso_cookies(self) -> None:
-        """Delete only necessary reso cookies."""
-        self.delete_cookie(CookieFields.aspnet)
-        self.delete_cookie(CookieFields.reso_office60)
-
-    def insert_cookies(self, tele_cookies: List) -> None:
-        """Get cookies from telegram and insert them in browser."""
-        self.delete_reso_cookies()
-        for line in tele_cookies:
-            self.add_cookie(line)
-
-    def auth_complete(self) -> bool:
-        """Check is authentication was complete.
 
-        Returns:
-            bool variable.
-        """
-        try:
-            # welcome message
-            self.find_element(By.XPATH, '/html/body/form/div[4]/div[1]/div[7]/div/div/div/div/div[1]')
-        except NoSuchElementException:
-            return True
-        return False
-
-    def get_browser_cookies(self) -> Optional[List]:
-        """Get cookies from browser.
-
-        Returns:
-            List with dict cookies.
-        """
-        cookies = [
-            self.get_cookie(CookieFields.aspnet),
-            self.get_cookie(CookieFields.reso_office60),
-        ]
-        #иногда сетится null, чтобы избежать этого:
-        if all(cookies):
-            return cookies
-        return None
-
-    def logged_in(self) -> None:
-        """Logic when browser is logged in service."""
-        tele_cookies = self.manager.get_telegram_cookies(self.hash)
-        browser_cookies = self.get_browser_cookies()
-
-        if browser_cookies and self.need_to_set_telegram_cookies:
-            # зашел текущий клиент, у него теперь другие куки и нужно поменять в телеге
-            self.manager.set_telegram_cookies(cookies=browser_cookies, hsh=self.hash)
-            self.need_to_set_telegram_cookies = False
-            self.last_cookies = browser_cookies
-        elif browser_cookies and self.last_cookies != browser_cookies:
-            # я залогинен, но ресо сервер изменил мне куки
-            self.manager.set_telegram_cookies(cookies=browser_cookies, hsh=self.hash)
-            self.last_cookies = browser_cookies
-        elif browser_cookies != tele_cookies:
-            # другой клиент изменил кукисы на свои, рабочие, но при этом я тоже залогинен, так что нужно унифицировать
-            self.insert_cookies(tele_cookies)
-            self.last_cookies = tele_cookies
-
-    def logged_out(self) -> None:
-        """Logic, when browser is logged out from service."""
-        tele_cookies = self.manager.get_telegram_cookies(self.hash)
-        if self.last_cookies == tele_cookies:
-            # в телеге лежат неверные куки, которые я пытался использовать
-            self.need_to_set_telegram_cookies = True
-        else:
-            # кто-то изменил куки и они рабочие с высокой вероятностью
-            self.need_to_set_telegram_cookies = False
-            self.insert_cookies(tele_cookies)
-            self.get(self.url_main)
-
-    @exception_run_handler
-    def run(self) -> None:
-        """Run main logic."""
-        # if it will be removed, don't forget about implicitly wait
-        self.get(self.url_main)
-        self.insert_cookies(self.last_cookies)
-        self.get(self.url_main)
-        while True:
-            if self.auth_complete():
-                self.logged_in()
-            else:
-                self.logged_out()
-            time.sleep(1)
+startup.mark('config')
 
 
 if __name__ == '__main__':
+    if get_choice(get_ini_options(required=False), 'keepalive') == 'yes':
+        # без супервизора общие сессии касается этот же процесс
+        SessionKeeper(ResoBrowser.manager, ResoBrowser.probe or SessionProbe(), hashes=[ResoBrowser.hash]).start()
     with ResoBrowser() as driver:
         driver.run()
@@ -1,103 +1,722 @@
 """Pinned message manager module."""
 
-import json
-from functools import cached_property
-from typing import Dict, List
+import copy
+import time
+import zlib
+from http import HTTPStatus
+from threading import Lock, RLock
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from telebot import TeleBot
 from telebot.apihelper import ApiTelegramException
+from telebot.types import Message
 
-from src.exceptions import InvalidBotToken, InvalidHash, MessageTooLong
+from src import codec
+from src.bot import RateLimitedBot, TokenBucket
+from src.codec import RESERVED_PREFIX
+from src.concurrency import SingleFlight, WriteQueue
+from src.cookies import same
+from src.exceptions import InvalidBotToken, InvalidHash, MessageTooLong, UpdateConflict
 from src.handlers import retry
-from src.settings import BOT_TOKEN, CHAT_ID, TELEGRAM_MSG_LIMIT
+from src.metrics import metrics
+from src.settings import (
+    BOT_TOKEN, CHAT_ID, PAYLOAD_PACKING, PINNED_CACHE_TTL, SHARD_CHAT_IDS, TELEGRAM_BUDGET_FILE, TELEGRAM_BURST,
+    TELEGRAM_MSG_LIMIT, TELEGRAM_RATE,
+)
+from src.stores import LEASE_FIELD, ChangeSignal, CookieStore, Payload, set_change
 
+REVISION_FIELD = '_rev'
+# ответы телеграм о неверном токене или чате, повтор запроса их не исправит
+TOKEN_ERROR_CODES = (HTTPStatus.BAD_REQUEST, HTTPStatus.UNAUTHORIZED, HTTPStatus.FORBIDDEN)
 
-class MessageManager(object):
-    """Account manager class for manage pinned message data."""
 
-    @cached_property
-    def message_sample(self) -> Dict:
-        """Read json file with message sample.
+def token_error(error: Exception) -> bool:
+    """Check that telegram error is caused by bot token or chat, not by limits or telegram failure.
 
-            Returns:
-                JSON message sample.
-            """
-        return json.loads('{"test":[{"name":"ASP.NET_SessionId","value":"yrtu1tgknmxnjpeswaygtxqw","path":"/","secure":false,"httpOnly":true,"sameSite":"None","domain":".reso.ru"},{"name":"ResoOffice60","value":"3BDDB47353A1DBFBC4AE88C9659B35F136FEAB9E3F00A7E9F0FB21ADAC89E66B05F3D8E06052F6AF30C5B7628B4610979B604C5DB4046828B1B8658C7657F8AE45D53DE18201013C1492F10EE56F1469575D2D89","path":"/","secure":false,"httpOnly":true,"sameSite":"None","domain":".reso.ru"}]}')
+    Args:
+        error: telegram api error.
 
-    def __init__(self) -> None:
-        """Account manager initial method."""
-        self.bot = TeleBot(BOT_TOKEN)
-        self.chat = CHAT_ID
+    Returns:
+        bool variable.
+    """
+    return getattr(error, 'error_code', None) in TOKEN_ERROR_CODES
+
+
+class PinnedCache(object):
+    """Read-through cache for parsed pinned message payload."""
+
+    def __init__(self, ttl: float) -> None:
+        """Cache initial method.
+
+        Args:
+            ttl: seconds while payload is served from memory without telegram requests.
+        """
+        self.ttl = ttl
+        self.message_id: Optional[int] = None
+        # (message_id, edit_date) of the cached message
+        self.version: Optional[Tuple[int, int]] = None
+        self.text: Optional[str] = None
+        self.payload: Optional[Payload] = None
+        # счетчик записей, хранится в самом сообщении
+        self.revision = 0
+        self.expires = 0.0
+        self.hits = 0
+        self.misses = 0
+        # кэш читают и пишут сессии из разных потоков
+        self.lock = Lock()
+        # растет при сбросе, чтения после сброса не присоединяются к начатым до него
+        self.generation = 0
+
+    def fresh(self) -> bool:
+        """Check that cached payload can be used without telegram request.
+
+        Returns:
+            bool variable.
+        """
+        return self.payload is not None and time.monotonic() < self.expires
+
+    def get(self) -> Optional[Tuple[int, Payload]]:
+        """Get message id and payload together, if cache is fresh.
+
+        Returns:
+            Tuple with message id and payload or None.
+        """
+        with self.lock:
+            if not self.fresh():
+                return None
+            return self.message_id, self.payload  # type: ignore
+
+    def store(self, message: Message, payload: Optional[Payload] = None, revision: int = 0) -> Payload:
+        """Save pinned message into cache.
+
+        Args:
+            message: pinned telegram message.
+            payload: already parsed message text without revision, parsed from message if not passed.
+            revision: revision of passed payload.
+
+        Returns:
+            Parsed payload of the message.
+        """
+        with self.lock:
+            return self._store(message, payload, revision)
+
+    def _store(self, message: Message, payload: Optional[Payload], revision: int) -> Payload:
+        version = (message.message_id, message.edit_date or message.date)
+        if payload is None:
+            if version == self.version and message.text == self.text and self.payload is not None:
+                # сообщение не менялось, повторно json не разбираем
+                payload = self.payload
+                revision = self.revision
+            else:
+                payload = codec.loads(message.text)
+                revision = payload.pop(REVISION_FIELD, 0)  # type: ignore
+        self.revision = revision
+        self.message_id = message.message_id
+        self.version = version
+        self.text = message.text
+        self.payload = payload
+        self.expires = time.monotonic() + self.ttl
+        return payload
+
+    def invalidate(self) -> None:
+        """Force next read to go to telegram."""
+        self.expires = 0.0
+        self.generation += 1
+
+
+class Shards(object):
+    """Placement of accounts in pinned messages of shard chats, shared by sync and async managers."""
+
+    chats: List[str]
+    chat: str
+    caches: Dict[str, PinnedCache]
+    changed: ChangeSignal
+    conflicts: int
+
+    @property
+    def cache(self) -> PinnedCache:
+        """Cache of the first shard.
+
+        Returns:
+            PinnedCache instance.
+        """
+        return self.caches[self.chat]
+
+    def chat_for(self, hsh: str) -> str:
+        """Get chat of the shard that keeps hash.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            Chat id.
+        """
+        return self.placement(hsh, self.chats)
+
+    @staticmethod
+    def placement(hsh: str, chats: List[str]) -> str:
+        """Get chat of the shard that keeps hash with given shard list.
+
+        Args:
+            hsh: user identification hash.
+            chats: shard chats.
+
+        Returns:
+            Chat id.
+        """
+        return chats[zlib.crc32(hsh.encode()) % len(chats)]
+
+    def _chats(self, hashes: Optional[List[str]]) -> List[str]:
+        """Get chats of shards that keep hashes.
+
+        Args:
+            hashes: user identification hashes, all chats are returned if not passed.
+
+        Returns:
+            Sorted list with chat ids.
+        """
+        return sorted({self.chat_for(hsh) for hsh in hashes}) if hashes else self.chats
+
+    def _edits(
+        self,
+        payload: Payload,
+        chats: List[str],
+        revisions: Dict[str, int],
+    ) -> Dict[str, Tuple[Payload, str, int]]:
+        """Get shard payloads that differ from cached ones with texts of their edits.
+
+        Every text is checked before any edit is sent, so too long payload doesn't leave shards half written.
+
+        Args:
+            payload: changed payload of chats.
+            chats: chats that were read.
+            revisions: cached revisions of chats before the read.
+
+        Returns:
+            Dictionary with new shard payload, edit text and revision by chat, empty if nothing changed.
+        """
+        shards = self._split(payload)
+        edits = {}
+        for chat in chats:
+            if shards[chat] == self.caches[chat].payload:
+                continue
+            if self.caches[chat].revision != revisions[chat]:
+                # сообщение изменил другой клиент, правки накладываются на его версию
+                self.conflicts += 1
+            edits[chat] = (shards[chat], *self._text(chat, shards[chat]))
+        return edits
+
+    def _text(self, chat: str, payload: Payload) -> Tuple[str, int]:
+        """Get text of the next edit of shard, exactly as it will be sent.
+
+        Args:
+            chat: chat id of the shard.
+            payload: new shard payload.
+
+        Returns:
+            Tuple with message text and its revision.
+
+        Raises:
+            MessageTooLong: text with revision doesn't fit into telegram message.
+        """
+        revision = self.caches[chat].revision + 1
+        text = codec.dumps({**payload, REVISION_FIELD: revision}, PAYLOAD_PACKING)
+        if len(text) >= TELEGRAM_MSG_LIMIT:
+            raise MessageTooLong(MessageTooLong.msg)
+        return text, revision
+
+    def _edited(self, chat: str, message: Optional[Message], payload: Payload, revision: int = 0) -> None:
+        """Update cache of shard after edit or send.
+
+        Args:
+            chat: chat id of the shard.
+            message: message returned by telegram, cache is reset if it isn't a message.
+            payload: written shard payload.
+            revision: written revision.
+        """
+        if isinstance(message, Message):
+            self.caches[chat].store(message, payload, revision)
+        else:
+            self.caches[chat].invalidate()
+
+    def _cached(self, chat: str) -> Optional[Tuple[int, Payload]]:
+        """Get message id and payload of shard from cache, hits are counted.
+
+        Args:
+            chat: chat id of the shard.
+
+        Returns:
+            Tuple with message id and payload or None, if cache isn't fresh.
+        """
+        cache = self.caches[chat]
+        cached = cache.get()
+        if cached is not None:
+            cache.hits += 1
+            metrics.inc('reso_cache_total', result='hit')
+        return cached
+
+    def _fetched(self, chat: str, pinned: Message) -> Tuple[int, Payload]:
+        """Save pinned message read from telegram in cache, change by other client is signalled.
+
+        Args:
+            chat: chat id of the shard.
+            pinned: pinned message.
+
+        Returns:
+            Tuple with message id and payload.
+        """
+        cache = self.caches[chat]
+        previous = cache.text
+        payload = cache.store(pinned)
+        if previous is not None and pinned.text != previous:
+            self.changed.set()
+        return pinned.message_id, payload
+
+    def _kept(self, chat: str, pinned: Message, payload: Payload) -> bool:
+        """Check that existing pinned message already keeps initial payload, it is cached if so.
+
+        Args:
+            chat: chat id of the shard.
+            pinned: pinned message.
+            payload: initial shard payload.
+
+        Returns:
+            bool variable.
+        """
+        if pinned.text != codec.dumps(payload, PAYLOAD_PACKING):
+            return False
+        self.caches[chat].store(pinned)
+        return True
+
+    def _split(self, payload: Payload) -> Dict[str, Payload]:
+        """Split payload by shards, reserved dictionaries are split by hash keys.
+
+        Args:
+            payload: whole payload.
+
+        Returns:
+            Dictionary with shard payloads by chat.
+        """
+        shards: Dict[str, Payload] = {chat: {} for chat in self.chats}
+        for key, value in payload.items():
+            if not key.startswith(RESERVED_PREFIX):
+                shards[self.chat_for(key)][key] = value
+            elif isinstance(value, dict):
+                for hsh, hash_value in value.items():
+                    shards[self.chat_for(hsh)].setdefault(key, {})[hsh] = hash_value  # type: ignore
+            else:
+                shards[self.chat][key] = value
+        return shards
+
+    def _resplit(self, payloads: List[Payload]) -> Dict[str, Payload]:
+        """Merge shard payloads of any shard list and split them by current shards.
+
+        Args:
+            payloads: shard payloads, values of later payloads win.
+
+        Returns:
+            Dictionary with new copies of shard payloads by chat.
+        """
+        return self._split(copy.deepcopy(self._join(payloads)))
+
+    @staticmethod
+    def _join(payloads: List[Payload]) -> Payload:
+        """Merge shard payloads into one payload.
+
+        Args:
+            payloads: payloads of shards.
+
+        Returns:
+            Payload, the only shard payload itself if one is passed.
+        """
+        if len(payloads) == 1:
+            return payloads[0]
+        merged: Payload = {}
+        for payload in payloads:
+            for key, value in payload.items():
+                if key.startswith(RESERVED_PREFIX) and isinstance(value, dict):
+                    merged.setdefault(key, {}).update(value)  # type: ignore
+                else:
+                    merged[key] = value
+        return merged
+
+    @staticmethod
+    def _accounts(payloads: List[Payload]) -> List[str]:
+        """Get account hashes of shard payloads.
+
+        Args:
+            payloads: payloads of shards.
+
+        Returns:
+            List with hashes.
+        """
+        return [hsh for payload in payloads for hsh in payload if not hsh.startswith(RESERVED_PREFIX)]
+
+    @staticmethod
+    def _lease(payload: Payload, hsh: str) -> Optional[Tuple[str, float]]:
+        """Get writer lease of hash from payload of its shard.
+
+        Args:
+            payload: shard payload.
+            hsh: user identification hash.
+
+        Returns:
+            Tuple with owner and unix expiry time or None, if nobody holds it.
+        """
+        lease = payload.get(LEASE_FIELD, {}).get(hsh)  # type: ignore
+        return (lease[0], lease[1]) if lease else None
+
+
+class MessageManager(Shards, CookieStore):
+    """Account manager class for manage pinned message data.
+
+    Accounts can be sharded across pinned messages of several chats, the shard of hash is
+    derived from the hash itself, so reading one account costs one request for any number of accounts.
+
+    Telegram has no conditional edit, so writes are optimistic: changes are applied to freshly read
+    payload, written with next revision and checked by one more read, lost writes are applied again.
+    """
+
+    # сколько раз запись повторяется, если ее затер другой клиент
+    write_attempts = 5
+
+    def __init__(
+        self,
+        bot: Optional[TeleBot] = None,
+        cache_ttl: float = PINNED_CACHE_TTL,
+        chats: Optional[List[str]] = None,
+    ) -> None:
+        """Account manager initial method.
+
+        Args:
+            bot: telegram bot, rate limited bot with BOT_TOKEN is created if not passed.
+            cache_ttl: seconds while pinned message is served from memory.
+            chats: shard chats, SHARD_CHAT_IDS or CHAT_ID are used if not passed.
+        """
+        super().__init__()
+        self.bot = bot or RateLimitedBot(
+            TeleBot(BOT_TOKEN),
+            TokenBucket(
+                rate=TELEGRAM_RATE,
+                capacity=TELEGRAM_BURST,
+                reserve=TELEGRAM_BURST * 0.2,
+                path=TELEGRAM_BUDGET_FILE,
+            ),
+        )
+        self.chats: List[str] = chats or SHARD_CHAT_IDS or [CHAT_ID]  # type: ignore
+        self.chat = self.chats[0]
+        self.caches = {chat: PinnedCache(cache_ttl) for chat in self.chats}
+        # записи и создание сообщений идут по одной
+        self.lock = RLock()
+        # одновременные чтения одного шарда ждут один запрос
+        self.flights = SingleFlight()
+        # правки, накопившиеся пока идет запись, уходят в телеграм одной правкой
+        self.writes = WriteQueue(self._write, self.lock)
+        self.conflicts = 0
 
     @retry
     def reinit(self) -> None:
-        """Initialize or reinitialize pinned message."""
-        pinned = self.bot.get_chat(self.chat).pinned_message
-        if pinned:
-            if pinned.text != json.dumps(self.message_sample):
-                self.bot.edit_message_text(
-                    chat_id=self.chat,
-                    message_id=pinned.message_id,
-                    text=json.dumps(self.message_sample),
-                )
-        else:
-            msg = self.bot.send_message(chat_id=self.chat, text=json.dumps(self.message_sample))
-            self.bot.pin_chat_message(chat_id=self.chat, message_id=msg.message_id)
+        """Initialize or reinitialize pinned messages of all shards."""
+        shards = self._split(self.message_sample)
+        for chat in self.chats:
+            self._reinit_chat(chat, shards[chat])
+
+    @retry
+    def load(self) -> Payload:
+        """Get payload from pinned messages of all shards.
+
+        Returns:
+            Payload that must not be changed by caller.
+        """
+        try:
+            return self._merge(self.chats)
+        except ApiTelegramException as error:
+            if token_error(error):
+                raise InvalidBotToken(InvalidBotToken.msg)
+            # ограничение частоты и сбои телеграм повторяет retry
+            raise
 
     @retry
-    def get_telegram_cookies(self, hsh: str) -> List:
-        """Get cookies by hash from pinned message.
+    def get_cookies(self, hsh: str) -> List:
+        """Get cookies by hash from pinned message of its shard only.
 
         Args:
             hsh: user identification hash.
 
         Returns:
-            Telegram cookies dictionary or None, if hash does not exist.
+            List with dict cookies.
         """
         try:
-            pinned = self.bot.get_chat(self.chat).pinned_message
-        except ApiTelegramException:
-            raise InvalidBotToken(InvalidBotToken.msg)
-        if not pinned:
-            self.reinit()
+            _, payload = self._pinned(self.chat_for(hsh))
+        except ApiTelegramException as error:
+            if token_error(error):
+                raise InvalidBotToken(InvalidBotToken.msg)
+            raise
         try:
-            return json.loads(pinned.text)[hsh]
+            return payload[hsh]
         except KeyError:
             raise InvalidHash(InvalidHash.msg.format(hash=hsh))
 
+    def update(
+        self,
+        changes: Callable[[Payload], None],
+        hashes: Optional[List[str]] = None,
+    ) -> None:
+        """Apply changes to pinned message payload, changes of other threads queued meanwhile go with them.
+
+        Args:
+            changes: function that edits payload copy in place, must be idempotent.
+            hashes: hashes touched by changes, only their shards are read if passed.
+        """
+        self.writes.submit(changes, hashes)
+
+    @property
+    def coalesced(self) -> int:
+        """Writes that went to telegram together with writes of other threads."""
+        return self.writes.combined
+
+    def stats(self) -> Dict[str, Any]:
+        """Get contention and deduplication counters.
+
+        Returns:
+            Dictionary with counters and seconds spent waiting.
+        """
+        return {
+            'reads': self.flights.leaders,
+            'shared_reads': self.flights.shared,
+            'read_wait_seconds': round(self.flights.waited, 6),
+            'writes': self.writes.writes,
+            'write_batches': self.writes.batches,
+            'coalesced_writes': self.coalesced,
+            'contended_writes': self.writes.contended,
+            'write_wait_seconds': round(self.writes.waited, 6),
+            'conflicts': self.conflicts,
+            'cache_hits': sum(cache.hits for cache in self.caches.values()),
+            'cache_misses': sum(cache.misses for cache in self.caches.values()),
+        }
+
     @retry
-    def set_telegram_cookies(self, cookies: List, hsh: str) -> None:
-        """Set new cookies to pinned message by hash.
+    def _write(self, changes: Callable[[Payload], None], hashes: Optional[List[str]] = None) -> None:
+        """Apply changes to pinned message payload, only changed shards are edited, called under write lock.
 
         Args:
-            cookies: cookies dictionary that will be set.
+            changes: function that edits payload copy in place, must be idempotent.
+            hashes: hashes touched by changes, only their shards are read if passed.
+        """
+        chats = self._chats(hashes)
+        for _ in range(self.write_attempts):
+            revisions = {chat: self.caches[chat].revision for chat in chats}
+            # перед записью и для проверки записи читаем из телеграм, а не из кэша
+            as_json = copy.deepcopy(self._merge(chats, force=True))
+            changes(as_json)
+            edits = self._edits(as_json, chats, revisions)
+            if not edits:
+                return
+            for chat, (shard, text, revision) in edits.items():
+                self._edit(chat, self.caches[chat].message_id, shard, text, revision)  # type: ignore
+        raise UpdateConflict(UpdateConflict.msg)
+
+    def set_cookies(self, cookies: List, hsh: str) -> None:
+        """Set new cookies by hash, cookies of other sessions waiting for write go with the same edit.
+
+        Args:
+            cookies: list with dict cookies.
             hsh: user identification hash.
         """
-        pinned = self.bot.get_chat(self.chat).pinned_message
-        as_json: Dict[str, List] = json.loads(pinned.text)
-        as_json[hsh] = cookies
-        self.bot.edit_message_text(chat_id=self.chat, message_id=pinned.message_id, text=json.dumps(as_json))
+        try:
+            current = self.get_cookies(hsh)
+        except InvalidHash:
+            return
+        if same(current, cookies):
+            # в сообщении уже эта сессия, отличаются только поля вроде expiry
+            self.avoided_writes += 1
+            return
+        self.update(set_change(cookies, hsh), hashes=[hsh])
 
-    def add_account(self, hsh: str) -> None:
-        """Add new account to pinned message.
+    @retry
+    def lease(self, hsh: str) -> Optional[Tuple[str, float]]:
+        """Get writer lease of account from pinned message of its shard only.
 
         Args:
             hsh: user identification hash.
+
+        Returns:
+            Tuple with owner and unix expiry time or None, if nobody holds it.
         """
-        pinned = self.bot.get_chat(self.chat).pinned_message
-        as_json = json.loads(pinned.text)
-        as_json[hsh] = self.message_sample['test']
-        if len(str(as_json)) >= TELEGRAM_MSG_LIMIT:
-            raise MessageTooLong(MessageTooLong.msg)
-        self.bot.edit_message_text(chat_id=self.chat, message_id=pinned.message_id, text=json.dumps(as_json))
+        _, payload = self._pinned(self.chat_for(hsh))
+        return self._lease(payload, hsh)
 
-    def remove_account(self, hsh: str) -> None:
-        """Remove account from pinned message.
+    def accounts(self) -> List[str]:
+        """Get available account hashes, without creating pinned message if it is absent.
+
+        Returns:
+            List with hashes.
+        """
+        return self._accounts([self._pinned(chat, create=False)[1] for chat in self.chats])
+
+    def reshard(self, previous: List[str]) -> List[str]:
+        """Move accounts from shards of previous shard list to current shards.
+
+        Accounts are written to new shards first and only then removed from old ones,
+        so interrupted migration can be run again. Clients with old SHARD_CHAT_IDS must be restarted.
+
+        Args:
+            previous: shard chats that were used before.
+
+        Returns:
+            Hashes that changed shard.
+        """
+        chats = [*[chat for chat in previous if chat not in self.chats], *self.chats]
+        extra = [chat for chat in chats if chat not in self.caches]
+        with self.lock:
+            for chat in extra:
+                self.caches[chat] = PinnedCache(self.cache.ttl)
+            try:
+                return self._reshard(previous, chats)
+            finally:
+                for chat in extra:
+                    self.caches.pop(chat)
+
+    @retry
+    def _reshard(self, previous: List[str], chats: List[str]) -> List[str]:
+        """Read shards of both lists and rewrite them, called under write lock.
+
+        Args:
+            previous: shard chats that were used before.
+            chats: old chats that aren't used anymore followed by current chats.
+
+        Returns:
+            Hashes that changed shard.
+        """
+        payloads: Dict[str, Payload] = {}
+        for chat in chats:
+            try:
+                payloads[chat] = self._pinned(chat, force=True, create=False)[1]
+            except AttributeError:
+                # в чате нет закрепленного сообщения
+                continue
+        # текущие шарды идут последними: их данные новее, если прошлая миграция прервалась
+        shards = self._resplit(list(payloads.values()))
+        edits = {
+            chat: (shards[chat], *self._text(chat, shards[chat]))
+            for chat in self.chats if chat in payloads and shards[chat] != payloads[chat]
+        }
+        for chat in self.chats:
+            if chat not in payloads:
+                self._reinit_chat(chat, shards[chat])
+        for chat, (shard, text, revision) in edits.items():
+            self._edit(chat, self.caches[chat].message_id, shard, text, revision)  # type: ignore
+        for chat in chats:
+            if chat not in self.chats and payloads.get(chat):
+                self._edit(chat, self.caches[chat].message_id, {}, *self._text(chat, {}))  # type: ignore
+        return sorted(
+            hsh for shard in shards.values() for hsh in shard
+            if not hsh.startswith(RESERVED_PREFIX) and self.placement(hsh, previous) != self.chat_for(hsh)
+        )
+
+    @retry
+    def refresh(self, hashes: Optional[List[str]] = None) -> None:
+        """Read pinned messages from telegram bypassing cache.
+
+        Args:
+            hashes: only shards of these hashes are read if passed.
+        """
+        for chat in self._chats(hashes):
+            self._pinned(chat, force=True)
+
+    def changed_at(self, hsh: str) -> Optional[float]:
+        """Get edit time of cached pinned message of hash shard.
 
         Args:
             hsh: user identification hash.
+
+        Returns:
+            Unix time with telegram second precision or None, if shard wasn't read yet.
         """
-        pinned = self.bot.get_chat(self.chat).pinned_message
-        as_json = json.loads(pinned.text)
-        as_json.pop(hsh)
-        self.bot.edit_message_text(chat_id=self.chat, message_id=pinned.message_id, text=json.dumps(as_json))
+        version = self.caches[self.chat_for(hsh)].version
+        return None if version is None else float(version[1])
+
+    def _merge(self, chats: List[str], force: bool = False) -> Payload:
+        """Read shards and merge them into one payload.
+
+        Args:
+            chats: chats of shards to read.
+            force: skip cache and request telegram.
+
+        Returns:
+            Payload, the only shard payload itself if one chat is passed.
+        """
+        return self._join([self._pinned(chat, force=force)[1] for chat in chats])
+
+    def _reinit_chat(self, chat: str, payload: Payload) -> None:
+        """Initialize or reinitialize pinned message of one shard.
+
+        Args:
+            chat: chat id.
+            payload: initial shard payload.
+        """
+        pinned = self.bot.get_chat(chat).pinned_message
+        if not pinned:
+            msg = self.bot.send_message(chat_id=chat, text=codec.dumps(payload, PAYLOAD_PACKING))
+            self.bot.pin_chat_message(chat_id=chat, message_id=msg.message_id)
+            self._edited(chat, msg, payload)
+        elif not self._kept(chat, pinned, payload):
+            self._edit(chat, pinned.message_id, payload, *self._text(chat, payload))
+
+    def _pinned(self, chat: str, force: bool = False, create: bool = True) -> Tuple[int, Payload]:
+        """Get pinned message id and parsed payload of shard, from cache if it is fresh.
+
+        Args:
+            chat: chat id of the shard.
+            force: skip cache and request telegram.
+            create: create pinned message if it is absent, otherwise AttributeError is raised.
+
+        Returns:
+            Tuple with message id and payload. Payload must not be changed by caller.
+        """
+        cached = None if force else self._cached(chat)
+        if cached is not None:
+            return cached
+        if force:
+            # проверочные чтения записи не должны получать ответ, запрошенный до правки
+            return self._fetch(chat, create)
+        return self.flights.do((chat, create, self.caches[chat].generation), lambda: self._fetch(chat, create))
+
+    def _fetch(self, chat: str, create: bool) -> Tuple[int, Payload]:
+        """Read pinned message of shard from telegram and save it in cache.
+
+        Args:
+            chat: chat id of the shard.
+            create: create pinned message if it is absent, otherwise AttributeError is raised.
+
+        Returns:
+            Tuple with message id and payload.
+        """
+        cache = self.caches[chat]
+        cache.misses += 1
+        metrics.inc('reso_cache_total', result='miss')
+        pinned = self.bot.get_chat(chat).pinned_message
+        if not pinned and create:
+            with self.lock:
+                self._reinit_chat(chat, self._split(self.message_sample)[chat])
+            pinned = self.bot.get_chat(chat).pinned_message
+        return self._fetched(chat, pinned)
+
+    def _edit(self, chat: str, message_id: int, payload: Payload, text: str, revision: int) -> None:
+        """Edit pinned message of shard and update cache in place.
+
+        Args:
+            chat: chat id of the shard.
+            message_id: pinned message id.
+            payload: new shard payload.
+            text: message text with revision, made by _text.
+            revision: revision of the text.
+        """
+        try:
+            msg = self.bot.edit_message_text(chat_id=chat, message_id=message_id, text=text)
+        except ApiTelegramException as error:
+            # такой текст уже записан, например, повторной попыткой после обрыва связи
+            if 'message is not modified' not in error.description:
+                raise
+            msg = None
+        self._edited(chat, msg, payload, revision)
@@ -1,20 +1,54 @@
-"""Console for manage pinned message."""
+"""Console for manage pinned message.
 
+Without arguments interactive menu is started, with arguments commands are run without questions:
+
+    python -m src.manager_console list --json
+    python -m src.manager_console apply --add ivan --add petr --remove <hash> --rename <old> <new>
+    python -m src.manager_console apply --file accounts.txt
+    python -m src.manager_console export accounts.json
+    python -m src.manager_console import accounts.json --replace
+    python -m src.manager_console reshard --previous <chat>,<chat>
+
+Lines of apply file: `add <name>`, `remove <hash>` or `rename <old hash> <new hash>`, `#` starts a comment.
+Reshard moves accounts to shards of current SHARD_CHAT_IDS after the list was changed, previous list is passed.
+"""
+
+import argparse
 import json
+import sys
+from contextlib import nullcontext
 from http import HTTPStatus
 from random import getrandbits
-from typing import List
+from typing import Any, ContextManager, Dict, List, Optional, Sequence, TextIO, Tuple
 
 from telebot.apihelper import ApiTelegramException
 
+from src.config import get_ini_options, get_store
+from src.exceptions import MessageTooLong, ResoException
 from src.manager import MessageManager
-from src.exceptions import MessageTooLong
+from src.stores import CookieStore
+
+BITS = 128
+
+
+def new_hash(name: str = '') -> str:
+    """Generate account hash with optional name.
+
+    Args:
+        name: name that will be added to hash.
+
+    Returns:
+        New hash.
+    """
+    return '{hash}_{name}'.format(hash=str(getrandbits(BITS)), name=name)
+
 
 class Console(object):
     """Pinned message console class."""
 
-    manager = MessageManager()
-    bits = 128
+    # консоль можно запускать и без reso.ini, тогда используется телеграм, хранилище создается при запуске
+    manager: CookieStore
+    bits = BITS
     accounts: List
 
     @classmethod
@@ -26,7 +60,7 @@ class Console(object):
         """
         if command == '1':
             name = input('Имя, которое будет добавлено к хэшу (можно оставить пустым): ')
-            hsh = '{hash}_{name}'.format(hash=str(getrandbits(cls.bits)), name=name)
+            hsh = new_hash(name)
             try:
                 cls.manager.add_account(hsh)
             except MessageTooLong:
@@ -47,24 +81,20 @@ class Console(object):
 
         elif command == '3':
             cls.manager.reinit()
-            cls.accounts = list(
-                json.loads(cls.manager.bot.get_chat(chat_id=cls.manager.chat).pinned_message.text).keys(),
-            )
+            cls.accounts = cls.manager.accounts()
             print('Сообщение сброшено к изначальным настройкам.')
 
     @classmethod
     def main(cls) -> None:
         """Console execution."""
         try:
-            cls.accounts = list(
-                json.loads(cls.manager.bot.get_chat(chat_id=cls.manager.chat).pinned_message.text).keys(),
-            )
+            cls.accounts = cls.manager.accounts()
         except ApiTelegramException as error:
-            cls._initial_error_handler(error.error_code)
-        except AttributeError:
-            cls._initial_error_handler(0)
-        except Exception:
-            cls._initial_error_handler(HTTPStatus.UNAUTHORIZED)
+            cls._initial_error_handler(error.error_code, error)
+        except AttributeError as error:
+            cls._initial_error_handler(0, error)
+        except Exception as error:
+            cls._initial_error_handler(HTTPStatus.UNAUTHORIZED, error)
         command = ''
         menu = '\nКоманды:\n1 - Добавить новый аккаунт\n2 - Удалить существующий аккаунт\n3 - Сбросить сообщение к изначальным настройкам\n4 - Выход'
 
@@ -82,12 +112,16 @@ class Console(object):
             print('{num}) {hsh}'.format(num=num, hsh=hsh))
 
     @classmethod
-    def _initial_error_handler(cls, error_code: int) -> None:
+    def _initial_error_handler(cls, error_code: int, error: Optional[BaseException] = None) -> None:
         """Handle initial errors, like invalid token or chat.
 
         Args:
             error_code: standard http error code.
+            error: raised error, it is shown for stores without telegram chat.
         """
+        if not isinstance(cls.manager, MessageManager):
+            # у файла и relay нет чата и токена бота
+            exit('Хранилище кук недоступно: {error}'.format(error=error))
         if error_code == HTTPStatus.BAD_REQUEST:
             exit('Чат {chat} не найден необходимо написать боту /start'.format(chat=cls.manager.chat))
         elif error_code == HTTPStatus.UNAUTHORIZED:
@@ -100,14 +134,162 @@ class Console(object):
             command = input('1 - Да\n2 - Выход\n')
             if command == '1':
                 cls.manager.reinit()
-                cls.accounts = list(
-                    json.loads(cls.manager.bot.get_chat(chat_id=cls.manager.chat).pinned_message.text).keys(),
-                )
+                cls.accounts = cls.manager.accounts()
             else:
                 exit(0)
 
 
+def parse_batch(lines: Sequence[str]) -> Tuple[List[str], List[str], Dict[str, str]]:
+    """Parse lines of apply file.
+
+    Args:
+        lines: lines like `add <name>`, `remove <hash>` or `rename <old hash> <new hash>`.
+
+    Returns:
+        Tuple with names to add, hashes to remove and new hashes by old ones.
+    """
+    add: List[str] = []
+    remove: List[str] = []
+    rename: Dict[str, str] = {}
+    for number, line in enumerate(lines, start=1):
+        words = line.split('#', 1)[0].split()
+        if not words:
+            continue
+        command, arguments = words[0], words[1:]
+        if command == 'add' and len(arguments) <= 1:
+            add.append(arguments[0] if arguments else '')
+        elif command == 'remove' and len(arguments) == 1:
+            remove.append(arguments[0])
+        elif command == 'rename' and len(arguments) == 2:
+            rename[arguments[0]] = arguments[1]
+        else:
+            raise ValueError('Неверная строка {number}: {line}'.format(number=number, line=line.strip()))
+    return add, remove, rename
+
+
+def _open(path: str, mode: str = 'r') -> ContextManager[TextIO]:
+    # "-" означает стандартный ввод или вывод, их не закрываем
+    if path == '-':
+        return nullcontext(sys.stdin if 'r' in mode else sys.stdout)
+    return open(path, mode, encoding='UTF-8')
+
+
+def _apply(store: CookieStore, args: argparse.Namespace) -> Dict[str, Any]:
+    names = list(args.add)
+    remove = list(args.remove)
+    rename = dict(args.rename)
+    if args.file:
+        with _open(args.file) as batch_file:
+            batch = parse_batch(batch_file.read().splitlines())
+        names.extend(batch[0])
+        remove.extend(batch[1])
+        rename.update(batch[2])
+    # одно чтение для проверки, одна запись для всех изменений
+    before = set(store.accounts())
+    added = {new_hash(name): name for name in names}
+    store.change_accounts(add=list(added), remove=remove, rename=rename)
+    return {
+        'added': list(added),
+        'removed': [hsh for hsh in remove if hsh in before],
+        'renamed': {old: new for old, new in rename.items() if old in before and new not in before},
+        'missing': [hsh for hsh in [*remove, *rename] if hsh not in before],
+    }
+
+
+def _export(store: CookieStore, args: argparse.Namespace) -> Dict[str, Any]:
+    accounts = store.export_accounts()
+    if args.path:
+        with _open(args.path, 'w') as export_file:
+            json.dump(accounts, export_file, ensure_ascii=False, indent=4)
+    return {'exported': list(accounts)}
+
+
+def _import(store: CookieStore, args: argparse.Namespace) -> Dict[str, Any]:
+    with _open(args.path) as import_file:
+        accounts = json.load(import_file)
+    if not isinstance(accounts, dict):
+        raise ValueError('Файл должен содержать словарь с куками по хэшам')
+    removed = [hsh for hsh in store.accounts() if hsh not in accounts] if args.replace else []
+    store.import_accounts(accounts, replace=args.replace)
+    return {'imported': list(accounts), 'removed': removed}
+
+
+def _reshard(store: CookieStore, args: argparse.Namespace) -> Dict[str, Any]:
+    reshard = getattr(store, 'reshard', None)
+    if reshard is None:
+        raise ValueError('Хранилище не делится на шарды')
+    previous = [chat.strip() for chat in args.previous.split(',') if chat.strip()]
+    if not previous:
+        raise ValueError('Не указан прошлый список чатов')
+    return {'moved': reshard(previous)}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build parser of non-interactive commands.
+
+    Returns:
+        ArgumentParser instance.
+    """
+    parser = argparse.ArgumentParser(prog='manager_console', description='Управление аккаунтами без вопросов.')
+    parser.add_argument('--json', action='store_true', help='вывод в формате json')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='список аккаунтов')
+    apply_parser = commands.add_parser('apply', help='добавить, удалить и переименовать аккаунты одной записью')
+    apply_parser.add_argument('--add', action='append', default=[], metavar='NAME', help='добавить аккаунт с именем')
+    apply_parser.add_argument('--remove', action='append', default=[], metavar='HASH', help='удалить аккаунт')
+    apply_parser.add_argument(
+        '--rename', action='append', default=[], nargs=2, metavar=('OLD', 'NEW'), help='переименовать хэш',
+    )
+    apply_parser.add_argument('--file', help='файл с командами add, remove, rename, "-" для стандартного ввода')
+    export_parser = commands.add_parser('export', help='выгрузить аккаунты с куками в json')
+    export_parser.add_argument('path', nargs='?', help='файл, "-" для стандартного вывода')
+    import_parser = commands.add_parser('import', help='загрузить аккаунты с куками из json')
+    import_parser.add_argument('path', help='файл, "-" для стандартного ввода')
+    import_parser.add_argument('--replace', action='store_true', help='удалить аккаунты, которых нет в файле')
+    reshard_parser = commands.add_parser('reshard', help='перенести аккаунты после изменения SHARD_CHAT_IDS')
+    reshard_parser.add_argument('--previous', required=True, metavar='CHATS', help='прошлые чаты через запятую')
+    return parser
+
+
+def run(argv: Sequence[str], store: CookieStore, output: Optional[TextIO] = None) -> int:
+    """Run non-interactive command.
+
+    Args:
+        argv: command line arguments without program name.
+        store: cookie store.
+        output: stream for results, stdout if not passed.
+
+    Returns:
+        Exit code.
+    """
+    output = output or sys.stdout
+    args = build_parser().parse_args(argv)
+    handlers = {'apply': _apply, 'export': _export, 'import': _import, 'reshard': _reshard}
+    try:
+        result = handlers[args.command](store, args) if args.command in handlers else {}
+        result['accounts'] = store.accounts()
+    except (ResoException, ValueError, OSError) as error:
+        result, code = {'error': str(error) or type(error).__name__}, 1
+    else:
+        code = 0
+    if args.json:
+        output.write(json.dumps(result, ensure_ascii=False) + '\n')
+        return code
+    for field, value in result.items():
+        if not value and field != 'accounts':
+            continue
+        if isinstance(value, dict):
+            value = ', '.join('{old} -> {new}'.format(old=old, new=new) for old, new in value.items())
+        elif isinstance(value, list):
+            value = '\n'.join(['', *value]) if field == 'accounts' else ', '.join(value)
+        output.write('{field}: {value}\n'.format(field=field, value=value))
+    return code
+
+
 if __name__ == '__main__':
+    Console.manager = get_store(get_ini_options(required=False))
+    if len(sys.argv) > 1:
+        exit(run(sys.argv[1:], Console.manager))
     try:
         Console.main()
     except KeyboardInterrupt:
@@ -0,0 +1,267 @@
+"""Process metrics: counters and timing histograms, exported as Prometheus text and json log lines."""
+
+import json
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.files import atomic_write
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# границы корзин гистограмм в секундах
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram(object):
+    """Timing histogram with fixed buckets."""
+
+    def __init__(self) -> None:
+        """Histogram initial method."""
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add value.
+
+        Args:
+            value: seconds.
+        """
+        index = bisect_left(BUCKETS, value)
+        if index < len(BUCKETS):
+            self.buckets[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Metrics(object):
+    """Thread safe registry of labeled counters and histograms."""
+
+    def __init__(self) -> None:
+        """Registry initial method."""
+        self.lock = Lock()
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.help: Dict[str, str] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        """Increase counter.
+
+        Args:
+            name: metric name.
+            value: increment.
+            labels: metric labels.
+        """
+        key = self._labels(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        """Add value to histogram.
+
+        Args:
+            name: metric name.
+            seconds: observed duration.
+            labels: metric labels.
+        """
+        key = self._labels(labels)
+        with self.lock:
+            self.histograms.setdefault(name, {}).setdefault(key, Histogram()).observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        """Measure duration of block into histogram.
+
+        Args:
+            name: metric name.
+            labels: metric labels.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def describe(self, name: str, text: str) -> None:
+        """Set help text of metric.
+
+        Args:
+            name: metric name.
+            text: help text.
+        """
+        self.help[name] = text
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get compact copy of all metrics for json log.
+
+        Returns:
+            Dictionary with counters and histogram count, sum and average by series.
+        """
+        with self.lock:
+            result: Dict[str, Any] = {}
+            for name, series in self.counters.items():
+                result[name] = {self._series_name(key): value for key, value in series.items()}
+            for name, histograms in self.histograms.items():
+                result[name] = {
+                    self._series_name(key): {
+                        'count': histogram.count,
+                        'sum': round(histogram.sum, 6),
+                        'avg': round(histogram.sum / histogram.count, 6) if histogram.count else 0.0,
+                    }
+                    for key, histogram in histograms.items()
+                }
+            return result
+
+    def prometheus(self) -> str:
+        """Format metrics in Prometheus text exposition format.
+
+        Returns:
+            Metrics text.
+        """
+        lines: List[str] = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                self._header(lines, name, 'counter')
+                for key, value in series.items():
+                    lines.append('{name}{labels} {value}'.format(name=name, labels=self._format(key), value=value))
+            for name, histograms in sorted(self.histograms.items()):
+                self._header(lines, name, 'histogram')
+                for key, histogram in histograms.items():
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, histogram.buckets):
+                        cumulative += count
+                        labels = self._format(key + (('le', str(bound)),))
+                        lines.append('{name}_bucket{labels} {value}'.format(name=name, labels=labels, value=cumulative))
+                    labels = self._format(key + (('le', '+Inf'),))
+                    total = histogram.count
+                    lines.append('{name}_bucket{labels} {value}'.format(name=name, labels=labels, value=total))
+                    labels = self._format(key)
+                    lines.append('{name}_sum{labels} {value}'.format(name=name, labels=labels, value=histogram.sum))
+                    lines.append('{name}_count{labels} {value}'.format(name=name, labels=labels, value=total))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self) -> None:
+        """Remove all series."""
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def _header(self, lines: List[str], name: str, kind: str) -> None:
+        if name in self.help:
+            lines.append('# HELP {name} {text}'.format(name=name, text=self.help[name]))
+        lines.append('# TYPE {name} {kind}'.format(name=name, kind=kind))
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Labels:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    @staticmethod
+    def _format(key: Labels) -> str:
+        if not key:
+            return ''
+        pairs = ','.join(
+            '{name}="{value}"'.format(name=name, value=value.replace('\\', '\\\\').replace('"', '\\"'))
+            for name, value in key
+        )
+        return '{' + pairs + '}'
+
+    @staticmethod
+    def _series_name(key: Labels) -> str:
+        return ','.join('{name}={value}'.format(name=name, value=value) for name, value in key) or 'total'
+
+
+class MetricsExporter(Thread):
+    """Write Prometheus text file, serve /metrics and append json log line periodically."""
+
+    def __init__(
+        self,
+        registry: Metrics,
+        interval: float = 60.0,
+        path: Optional[str] = None,
+        log_path: Optional[str] = None,
+        listen: Optional[Tuple[str, int]] = None,
+    ) -> None:
+        """Exporter initial method.
+
+        Args:
+            registry: exported metrics.
+            interval: seconds between file writes and log lines.
+            path: Prometheus text file for node exporter textfile collector, not written if not passed.
+            log_path: file for json lines, one line per interval, not written if not passed.
+            listen: host and port of http endpoint, not started if not passed.
+        """
+        super().__init__(name='MetricsExporter', daemon=True)
+        self.registry = registry
+        self.interval = interval
+        self.path = path
+        self.log_path = log_path
+        self.listen = listen
+        self.stopped = Event()
+
+    def run(self) -> None:
+        """Export metrics until stopped."""
+        if self.listen is not None:
+            self.serve()
+        while not self.stopped.wait(self.interval):
+            self.export()
+
+    def export(self) -> None:
+        """Write file and log line once."""
+        # метрики не должны ронять программу, ошибки записи пропускаются
+        if self.path is not None:
+            try:
+                atomic_write(self.path, self.registry.prometheus())
+            except OSError:
+                pass
+        if self.log_path is not None:
+            line = json.dumps({'time': round(time.time(), 3), 'metrics': self.registry.snapshot()})
+            try:
+                with open(self.log_path, 'a', encoding='UTF-8') as log_file:
+                    log_file.write(line + '\n')
+            except OSError:
+                pass
+
+    def serve(self) -> None:
+        """Start http endpoint in its own thread."""
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                data = registry.prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                pass
+
+        server = ThreadingHTTPServer(self.listen, MetricsHandler)  # type: ignore
+        server.daemon_threads = True
+        Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+
+    def stop(self) -> None:
+        """Stop exporter, last values are exported."""
+        self.stopped.set()
+        self.export()
+
+
+# общий реестр процесса
+metrics = Metrics()
+metrics.describe('reso_tick_seconds', 'Duration of one sync loop tick.')
+metrics.describe('reso_tick_phase_seconds', 'Duration of tick phases: dom, probe, cookie_read, store.')
+metrics.describe('reso_telegram_calls_total', 'Telegram Bot API calls by method and outcome.')
+metrics.describe('reso_telegram_call_seconds', 'Telegram Bot API call duration by method.')
+metrics.describe('reso_retries_total', 'Retries of store calls by function and error.')
+metrics.describe('reso_cache_total', 'Pinned message cache hits and misses.')
+metrics.describe(
+    'reso_cookie_events_total', 'Cookie rotation, login, takeover, rollback, adoption and invalidation events.',
+)
+metrics.describe('reso_adoption_seconds', 'Time from remote cookie change to local adoption.')
+metrics.describe('reso_keepalive_total', 'Keep-alive requests by result: ok, rotated, lease_held, expired or error.')
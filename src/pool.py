@@ -0,0 +1,80 @@
+"""Pool with warm standby browser, which replaces crashed session without full browser startup."""
+
+from threading import Lock, Thread
+from typing import Any, Callable, Optional
+
+from src.handlers import quit_driver
+
+
+class DriverPool(object):
+    """Create browsers for sessions, one warm standby browser is kept ready if enabled."""
+
+    def __init__(self, factory: Callable[[Optional[str]], Any], standby: bool = False) -> None:
+        """Pool initial method.
+
+        Args:
+            factory: creates browser by hash, like ResoBrowser class.
+            standby: keep one started browser in reserve.
+        """
+        self.factory = factory
+        self.standby = standby
+        self.lock = Lock()
+        self._spare: Optional[Any] = None
+        self._warming: Optional[Thread] = None
+        self.closed = False
+        self.cold_starts = 0
+        self.warm_starts = 0
+
+    def start(self) -> None:
+        """Start warming standby browser in background."""
+        if not self.standby:
+            return
+        with self.lock:
+            if self.closed or self._spare is not None or (self._warming and self._warming.is_alive()):
+                return
+            self._warming = Thread(target=self._warm, name='StandbyBrowser', daemon=True)
+            self._warming.start()
+
+    def take(self, hsh: str) -> Any:
+        """Get replacement browser for crashed session: warm standby if it's ready, otherwise new one.
+
+        Standby was created for another hash, session state has to be passed to it with resume_from.
+
+        Args:
+            hsh: user identification hash, used for new browser.
+
+        Returns:
+            Browser.
+        """
+        with self.lock:
+            spare, self._spare = self._spare, None
+        if spare is None:
+            self.cold_starts += 1
+            driver = self.factory(hsh)
+        else:
+            self.warm_starts += 1
+            driver = spare
+        # следующий запасной браузер готовится, пока этот работает
+        self.start()
+        return driver
+
+    def close(self) -> None:
+        """Quit standby browser, pool doesn't create new ones anymore."""
+        with self.lock:
+            self.closed = True
+            spare, self._spare = self._spare, None
+        if spare is not None:
+            quit_driver(spare)
+
+    def _warm(self) -> None:
+        try:
+            driver = self.factory(None)
+            driver.warm()
+        except Exception:
+            # без запасного браузера сессия просто запустится с нуля
+            return
+        with self.lock:
+            if not self.closed and self._spare is None:
+                self._spare, driver = driver, None
+        if driver is not None:
+            quit_driver(driver)
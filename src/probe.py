@@ -0,0 +1,92 @@
+"""Reso session validity check by plain http request."""
+
+import time
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from requests import RequestException, Session
+from requests.adapters import HTTPAdapter
+
+
+class SessionProbe(object):
+    """Check reso cookies with one pooled http request instead of browser DOM."""
+
+    url = 'https://office.reso.ru/'
+    # признаки страницы входа, которую ресо отдает без рабочей сессии
+    login_markers = ('type="password"', "type='password'")
+    timeout = 5.0
+    # сколько результатов держать в памяти
+    max_results = 256
+
+    def __init__(self, user_agent: Optional[str] = None, cache_time: float = 10.0, url: Optional[str] = None) -> None:
+        """Probe initial method.
+
+        Args:
+            user_agent: User-Agent header, the same as browser uses.
+            cache_time: seconds while result for the same cookies is reused.
+            url: page to request, office.reso.ru if not passed.
+        """
+        self.url = url or self.url
+        self.cache_time = cache_time
+        self.session = Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        self.lock = Lock()
+        self._results: Dict[Tuple, Tuple[float, bool]] = {}
+        self.requests = 0
+        self.hits = 0
+
+    def check(self, cookies: Optional[List[Dict]]) -> Optional[bool]:
+        """Check that cookies belong to logged in session.
+
+        Args:
+            cookies: selenium cookies list.
+
+        Returns:
+            bool variable or None, if it can't be checked by http.
+        """
+        if not cookies:
+            return None
+        key = tuple((cookie['name'], cookie['value']) for cookie in cookies)
+        with self.lock:
+            cached = self._results.get(key)
+            if cached and time.monotonic() < cached[0]:
+                self.hits += 1
+                return cached[1]
+        return self._request(key)[0]
+
+    def touch(self, cookies: List[Dict]) -> Tuple[Optional[bool], Dict[str, str]]:
+        """Request page with cookies like browser does, without result cache.
+
+        Args:
+            cookies: selenium cookies list.
+
+        Returns:
+            Tuple with validity, None if it can't be checked, and cookies set by server by name.
+        """
+        return self._request(tuple((cookie['name'], cookie['value']) for cookie in cookies))
+
+    def _request(self, key: Tuple) -> Tuple[Optional[bool], Dict[str, str]]:
+        try:
+            response = self.session.get(self.url, cookies=dict(key), timeout=self.timeout)
+        except RequestException:
+            return None, {}
+        finally:
+            # куки передаются явно, ответные не должны попасть в следующие проверки
+            self.session.cookies.clear()
+        if response.status_code >= 500:
+            return None, {}
+        valid = response.ok and not any(marker in response.text for marker in self.login_markers)
+        # куки, выставленные сервером, в том числе при редиректах; общий jar сессии другие потоки очищают
+        issued: Dict[str, str] = {}
+        for hop in (*response.history, response):
+            issued.update(hop.cookies.get_dict())
+        with self.lock:
+            self.requests += 1
+            if len(self._results) >= self.max_results:
+                self._results.clear()
+            self._results[key] = (time.monotonic() + self.cache_time, valid)
+        return valid, issued
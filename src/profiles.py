@@ -0,0 +1,124 @@
+"""Lightweight browser profile for unattended sessions that only keep cookies alive."""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.firefox.options import Options as FirefoxOptions
+from selenium.webdriver.remote.webdriver import WebDriver
+
+# типы ресурсов, которые можно не загружать
+RESOURCES = ('images', 'media', 'fonts')
+
+# настройки firefox по типу ресурса
+FIREFOX_BLOCK_PREFS: Dict[str, Dict[str, Any]] = {
+    'images': {'permissions.default.image': 2},
+    'media': {'media.autoplay.default': 5, 'media.mediasource.enabled': False, 'media.play-stand-alone': False},
+    'fonts': {'gfx.downloadable_fonts.enabled': False, 'browser.display.use_document_fonts': 0},
+}
+FIREFOX_BACKGROUND_PREFS: Dict[str, Any] = {
+    'app.update.auto': False,
+    'app.update.enabled': False,
+    'extensions.update.enabled': False,
+    'browser.safebrowsing.malware.enabled': False,
+    'browser.safebrowsing.phishing.enabled': False,
+    'browser.shell.checkDefaultBrowser': False,
+    'datareporting.healthreport.uploadEnabled': False,
+    'datareporting.policy.dataSubmissionEnabled': False,
+    'toolkit.telemetry.enabled': False,
+    'network.prefetch-next': False,
+    'network.dns.disablePrefetch': True,
+}
+CHROMIUM_BACKGROUND_ARGUMENTS = (
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-domain-reliability',
+    '--disable-extensions',
+    '--disable-sync',
+    '--metrics-recording-only',
+    '--no-first-run',
+)
+# шрифты и медиа хромиум умеет блокировать только по адресу, через devtools
+CHROMIUM_BLOCK_URLS: Dict[str, List[str]] = {
+    'images': [],
+    'media': ['*.mp4', '*.webm', '*.ogg', '*.mp3', '*.wav'],
+    'fonts': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+}
+
+
+class BrowserProfile(object):
+    """Options that make browser session cheaper, applied the same way to firefox and chromium browsers."""
+
+    def __init__(
+        self,
+        headless: bool = False,
+        block: Iterable[str] = (),
+        cache_size: Optional[int] = None,
+        disable_background: bool = False,
+    ) -> None:
+        """Profile initial method.
+
+        Args:
+            headless: run browser without window.
+            block: resource types from RESOURCES that are not loaded.
+            cache_size: disk cache limit in megabytes, browser default if not passed.
+            disable_background: turn off updates, telemetry, sync and prefetch.
+        """
+        self.headless = headless
+        self.block = tuple(block)
+        self.cache_size = cache_size
+        self.disable_background = disable_background
+
+    def apply(self, options: Any) -> None:
+        """Edit browser options before start.
+
+        Args:
+            options: firefox, chrome or edge options.
+        """
+        if isinstance(options, FirefoxOptions):
+            self._apply_firefox(options)
+        else:
+            self._apply_chromium(options)
+
+    def apply_to_driver(self, driver: WebDriver) -> None:
+        """Edit started browser, that can't be done with options.
+
+        Args:
+            driver: started webdriver.
+        """
+        urls = [url for resource in self.block for url in CHROMIUM_BLOCK_URLS.get(resource, [])]
+        if not urls or not hasattr(driver, 'execute_cdp_cmd'):
+            return
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': urls})
+        except WebDriverException:
+            # без devtools сессия просто грузит эти ресурсы
+            pass
+
+    def _apply_firefox(self, options: FirefoxOptions) -> None:
+        if self.headless:
+            options.add_argument('-headless')
+        for resource in self.block:
+            for name, value in FIREFOX_BLOCK_PREFS[resource].items():
+                options.set_preference(name, value)
+        if self.cache_size is not None:
+            options.set_preference('browser.cache.disk.smart_size.enabled', False)
+            options.set_preference('browser.cache.disk.capacity', self.cache_size * 1024)
+        if self.disable_background:
+            for name, value in FIREFOX_BACKGROUND_PREFS.items():
+                options.set_preference(name, value)
+
+    def _apply_chromium(self, options: Any) -> None:
+        if self.headless:
+            options.add_argument('--headless=new')
+        if 'images' in self.block:
+            options.add_argument('--blink-settings=imagesEnabled=false')
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        if 'media' in self.block:
+            options.add_argument('--autoplay-policy=user-gesture-required')
+        if self.cache_size is not None:
+            options.add_argument('--disk-cache-size={size}'.format(size=self.cache_size * 1024 * 1024))
+        if self.disable_background:
+            for argument in CHROMIUM_BACKGROUND_ARGUMENTS:
+                options.add_argument(argument)
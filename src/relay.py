@@ -0,0 +1,493 @@
+"""Local cookie relay: one process owns telegram connection and serves cookies to LAN clients over http."""
+
+import copy
+import hmac
+import json
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Condition, Thread
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from requests import RequestException, Response, Session
+
+from src.codec import RESERVED_PREFIX
+from src.exceptions import InvalidHash, InvalidRelayToken, MessageTooLong, TelegramError
+from src.handlers import retry
+from src.stores import CookieStore, Payload
+
+DEFAULT_RELAY_URL = 'http://127.0.0.1:8765'
+DEFAULT_RELAY_LISTEN = '127.0.0.1:8765'
+
+
+class Relay(object):
+    """Upstream store with change version and long-poll notifications."""
+
+    # максимальное время ожидания изменений одним запросом
+    max_wait = 60.0
+
+    def __init__(self, store: CookieStore, poll_interval: float = 1.0, token: Optional[str] = None) -> None:
+        """Relay initial method.
+
+        Args:
+            store: upstream store, usually telegram manager.
+            poll_interval: seconds between upstream checks.
+            token: shared token that clients send in Authorization header, requests aren't checked if not passed.
+        """
+        self.store = store
+        self.poll_interval = poll_interval
+        self.token = token
+        self.version = 0
+        self.condition = Condition()
+        self._text: Optional[str] = None
+
+    def observe(self) -> int:
+        """Read upstream store and bump version if payload has changed.
+
+        Returns:
+            Current version.
+        """
+        text = json.dumps(self.store.load(), sort_keys=True)
+        with self.condition:
+            if text != self._text:
+                self._text = text
+                self.version += 1
+                self.condition.notify_all()
+            return self.version
+
+    def wait(self, version: int, timeout: float) -> int:
+        """Wait until version differs from passed one.
+
+        Args:
+            version: version known by client.
+            timeout: seconds to wait.
+
+        Returns:
+            Current version.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, min(timeout, self.max_wait))
+            return self.version
+
+    def authorized(self, header: Optional[str]) -> bool:
+        """Check Authorization header of request.
+
+        Args:
+            header: header value like `Bearer <token>`.
+
+        Returns:
+            bool variable.
+        """
+        if not self.token:
+            return True
+        return hmac.compare_digest((header or '').encode(), 'Bearer {token}'.format(token=self.token).encode())
+
+    def poll_forever(self) -> None:
+        """Check upstream store for changes made by other clients."""
+        seen = self.store.changed.generation
+        while True:
+            try:
+                self.observe()
+            except TelegramError:
+                pass
+            seen = self.store.changed.wait_newer(seen, self.poll_interval)
+
+    def serve(self, host: str, port: int) -> None:
+        """Run poller thread and http server.
+
+        Args:
+            host: interface to listen.
+            port: port to listen.
+        """
+        Thread(target=self.poll_forever, name='RelayPoller', daemon=True).start()
+        server = ThreadingHTTPServer((host, port), RelayHandler)
+        server.daemon_threads = True
+        server.relay = self  # type: ignore
+        server.serve_forever()
+
+
+class RelayHandler(BaseHTTPRequestHandler):
+    """Http api of relay.
+
+    GET /payload, GET /accounts, GET /cookies/<hash>, PUT /cookies/<hash>, PUT /accounts/<hash>,
+    DELETE /accounts/<hash>, POST /patch, POST /reinit, GET /wait?version=<n>&timeout=<seconds>,
+    GET /lease/<hash>, POST /lease/<hash>, DELETE /lease/<hash>?owner=<id>.
+
+    Leases are taken and released by upstream store itself, clients leasing different hashes don't overwrite each other.
+    If relay has token, every request must have `Authorization: Bearer <token>` header, otherwise 401 is returned.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self) -> None:
+        """Handle read requests."""
+        self._handle('GET')
+
+    def do_PUT(self) -> None:
+        """Handle write requests."""
+        self._handle('PUT')
+
+    def do_POST(self) -> None:
+        """Handle patch and reinit requests."""
+        self._handle('POST')
+
+    def do_DELETE(self) -> None:
+        """Handle account removing."""
+        self._handle('DELETE')
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        """Keep relay console quiet, every client polls it."""
+
+    def _handle(self, method: str) -> None:
+        relay: Relay = self.server.relay  # type: ignore
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        try:
+            if not relay.authorized(self.headers.get('Authorization')):
+                # тело запроса не читаем, соединение закрывается после ответа
+                self.close_connection = True
+                status, body = HTTPStatus.UNAUTHORIZED, {'error': 'unauthorized'}
+            else:
+                status, body = self._route(relay, method, parts, parse_qs(url.query))
+        except InvalidHash as error:
+            status, body = HTTPStatus.NOT_FOUND, {'error': str(error)}
+        except MessageTooLong as error:
+            status, body = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': str(error)}
+        except TelegramError as error:
+            status, body = HTTPStatus.BAD_GATEWAY, {'error': str(error)}
+        except (KeyError, ValueError):
+            status, body = HTTPStatus.BAD_REQUEST, {'error': 'bad request'}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self, relay: Relay, method: str, parts: List[str], query: Dict) -> Tuple[int, Dict]:
+        store = relay.store
+        route = (method, parts[0], len(parts))
+        if route == ('GET', 'wait', 1):
+            version = relay.wait(int(query['version'][0]), float(query.get('timeout', ['25'])[0]))
+            return HTTPStatus.OK, {'version': version}
+        if route == ('GET', 'payload', 1):
+            return HTTPStatus.OK, {'version': relay.version, 'payload': store.load()}
+        if route == ('GET', 'accounts', 1):
+            return HTTPStatus.OK, {'accounts': store.accounts()}
+        if route == ('GET', 'cookies', 2):
+            return HTTPStatus.OK, {'version': relay.version, 'cookies': store.get_cookies(parts[1])}
+        if route == ('GET', 'lease', 2):
+            return HTTPStatus.OK, {'lease': store.lease(parts[1])}
+        if route == ('POST', 'lease', 2):
+            body = self._body()
+            acquired = store.acquire_lease(
+                parts[1], body['owner'], float(body['ttl']), force=bool(body.get('force')), cookies=body.get('cookies'),
+            )
+            return HTTPStatus.OK, {'version': relay.observe(), 'acquired': acquired}
+        if route == ('PUT', 'cookies', 2):
+            store.set_cookies(self._body()['cookies'], parts[1])
+        elif route == ('PUT', 'accounts', 2):
+            store.add_account(parts[1])
+        elif route == ('DELETE', 'accounts', 2):
+            store.remove_account(parts[1])
+        elif route == ('DELETE', 'lease', 2):
+            store.release_lease(parts[1], query['owner'][0])
+        elif route == ('POST', 'patch', 1):
+            patch = self._body()
+            store.update(apply_patch(patch), hashes=patch_hashes(patch))
+        elif route == ('POST', 'reinit', 1):
+            store.reinit()
+        else:
+            return HTTPStatus.NOT_FOUND, {'error': 'unknown method'}
+        return HTTPStatus.OK, {'version': relay.observe()}
+
+    def _body(self) -> Dict:
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+
+def make_patch(old: Payload, new: Payload) -> Dict:
+    """Get difference between payloads, reserved dictionaries are compared by hash keys.
+
+    Keys missing in old payload are added, others are only changed, so relay doesn't bring back
+    account removed by other client meanwhile.
+
+    Args:
+        old: payload before changes.
+        new: payload after changes.
+
+    Returns:
+        Dictionary with added and set values, removed keys and changes of reserved dictionaries.
+    """
+    patch: Dict[str, Any] = {'add': {}, 'set': {}, 'remove': [], 'reserved': {}}
+    for key in [*new, *(key for key in old if key not in new)]:
+        before, after = old.get(key), new.get(key)
+        if key.startswith(RESERVED_PREFIX) and isinstance(before or {}, dict) and isinstance(after or {}, dict):
+            # словарь аренд и подобные правятся по хэшам, чтобы не затереть чужие записи
+            before, after = before or {}, after or {}
+            part = {
+                'set': {hsh: value for hsh, value in after.items() if before.get(hsh) != value},
+                'remove': [hsh for hsh in before if hsh not in after],
+            }
+            if part['set'] or part['remove']:
+                patch['reserved'][key] = part
+        elif key not in new:
+            patch['remove'].append(key)
+        elif key not in old:
+            patch['add'][key] = after
+        elif before != after:
+            patch['set'][key] = after
+    return patch
+
+
+def patch_hashes(patch: Dict) -> List[str]:
+    """Get hashes touched by patch.
+
+    Args:
+        patch: make_patch result.
+
+    Returns:
+        List with hashes.
+    """
+    hashes = [*patch.get('add', {}), *patch['set'], *patch['remove']]
+    for part in patch.get('reserved', {}).values():
+        hashes.extend([*part['set'], *part['remove']])
+    return hashes
+
+
+def apply_patch(patch: Dict) -> Callable[[Payload], None]:
+    """Get changes function for store update from patch, relay runs it against latest upstream payload.
+
+    Args:
+        patch: dictionary with added and set values, removed keys and changes of reserved dictionaries.
+
+    Returns:
+        Function that edits payload in place.
+    """
+    def changes(payload: Payload) -> None:
+        payload.update(patch.get('add', {}))
+        for key, value in patch['set'].items():
+            # аккаунт удалили после того, как клиент прочитал данные
+            if key in payload:
+                payload[key] = value
+        for key in patch['remove']:
+            payload.pop(key, None)
+        for key, part in patch.get('reserved', {}).items():
+            values = payload.setdefault(key, {})  # type: ignore
+            values.update({hsh: value for hsh, value in part['set'].items() if hsh in payload})  # type: ignore
+            for hsh in part['remove']:
+                values.pop(hsh, None)  # type: ignore
+    return changes
+
+
+class RelayStore(CookieStore):
+    """Store client of relay, reads are LAN requests and changes come by long-poll."""
+
+    timeout = 5.0
+    long_poll = 25.0
+    # пауза после ошибки связи с relay
+    error_delay = 5.0
+
+    def __init__(self, url: str = DEFAULT_RELAY_URL, token: Optional[str] = None) -> None:
+        """Relay client initial method.
+
+        Args:
+            url: relay base url.
+            token: shared token of relay, relay-token from reso.ini.
+        """
+        super().__init__()
+        self.url = url.rstrip('/')
+        self.token = token
+        # имя хранилища в сообщении об ошибке связи
+        self.store_name = 'relay {url}'.format(url=self.url)
+        self.session = self._new_session()
+        self.version: Optional[int] = None
+        self._listener: Optional[Thread] = None
+
+    @retry
+    def load(self) -> Payload:
+        """Get whole payload from relay.
+
+        Returns:
+            Payload.
+        """
+        return self._request('GET', '/payload').json()['payload']
+
+    @retry
+    def get_cookies(self, hsh: str) -> List:
+        """Get cookies by hash from relay.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            List with dict cookies.
+        """
+        return self._request('GET', '/cookies/{hsh}'.format(hsh=hsh), hsh=hsh).json()['cookies']
+
+    @retry
+    def set_cookies(self, cookies: List, hsh: str) -> None:
+        """Set new cookies by hash, relay skips unchanged sessions by itself.
+
+        Args:
+            cookies: list with dict cookies.
+            hsh: user identification hash.
+        """
+        self._request('PUT', '/cookies/{hsh}'.format(hsh=hsh), hsh=hsh, json={'cookies': cookies})
+
+    def update(
+        self,
+        changes: Callable[[Payload], None],
+        hashes: Optional[List[str]] = None,
+    ) -> None:
+        """Send difference made by changes to relay, relay applies it to latest payload under upstream lock.
+
+        Args:
+            changes: function that edits payload copy in place.
+            hashes: unused, relay gets only changed keys anyway.
+        """
+        payload = self.load()
+        new = copy.deepcopy(payload)
+        changes(new)
+        patch = make_patch(payload, new)
+        if patch['add'] or patch['set'] or patch['remove'] or patch['reserved']:
+            self._patch(patch)
+
+    @retry
+    def add_account(self, hsh: str) -> None:
+        """Add new account with sample cookies.
+
+        Args:
+            hsh: user identification hash.
+        """
+        self._request('PUT', '/accounts/{hsh}'.format(hsh=hsh))
+
+    @retry
+    def remove_account(self, hsh: str) -> None:
+        """Remove account.
+
+        Args:
+            hsh: user identification hash.
+        """
+        self._request('DELETE', '/accounts/{hsh}'.format(hsh=hsh))
+
+    @retry
+    def accounts(self) -> List[str]:
+        """Get available account hashes.
+
+        Returns:
+            List with hashes.
+        """
+        return self._request('GET', '/accounts').json()['accounts']
+
+    @retry
+    def lease(self, hsh: str) -> Optional[Tuple[str, float]]:
+        """Get writer lease of account from relay.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            Tuple with owner and unix expiry time or None, if nobody holds it.
+        """
+        lease = self._request('GET', '/lease/{hsh}'.format(hsh=hsh), hsh=hsh).json()['lease']
+        return (lease[0], lease[1]) if lease else None
+
+    @retry
+    def acquire_lease(
+        self,
+        hsh: str,
+        owner: str,
+        ttl: float,
+        force: bool = False,
+        cookies: Optional[List] = None,
+    ) -> bool:
+        """Take or renew writer lease of account, relay runs it against upstream store in one request.
+
+        Args:
+            hsh: user identification hash.
+            owner: client id.
+            ttl: seconds while lease is valid without renewal.
+            force: take lease held by other client.
+            cookies: cookies to publish, if lease is held.
+
+        Returns:
+            True if owner holds the lease and cookies are published.
+        """
+        body = {'owner': owner, 'ttl': ttl, 'force': force, 'cookies': cookies}
+        return self._request('POST', '/lease/{hsh}'.format(hsh=hsh), hsh=hsh, json=body).json()['acquired']
+
+    @retry
+    def release_lease(self, hsh: str, owner: str) -> None:
+        """Give up writer lease.
+
+        Args:
+            hsh: user identification hash.
+            owner: client id.
+        """
+        self._request('DELETE', '/lease/{hsh}'.format(hsh=hsh), hsh=hsh, params={'owner': owner})
+
+    @retry
+    def reinit(self) -> None:
+        """Reinitialize upstream store."""
+        self._request('POST', '/reinit')
+
+    @retry
+    def _patch(self, patch: Dict) -> None:
+        self._request('POST', '/patch', json=patch)
+
+    def _request(self, method: str, path: str, hsh: str = '', **kwargs: Any) -> Response:
+        response = self.session.request(method, self.url + path, timeout=self.timeout, **kwargs)
+        if response.status_code == HTTPStatus.UNAUTHORIZED:
+            raise InvalidRelayToken(InvalidRelayToken.msg)
+        if response.status_code == HTTPStatus.NOT_FOUND:
+            raise InvalidHash(InvalidHash.msg.format(hash=hsh))
+        if response.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE:
+            raise MessageTooLong(MessageTooLong.msg)
+        if response.status_code >= HTTPStatus.BAD_REQUEST:
+            raise TelegramError(response.json().get('error', response.reason))
+        return response
+
+    def listen(self) -> None:
+        """Start long-poll listener of relay, it sets changed event right after other client changes cookies."""
+        if self._listener is None:
+            self._listener = Thread(target=self._listen_forever, name='RelayListener', daemon=True)
+            self._listener.start()
+
+    def _new_session(self) -> Session:
+        session = Session()
+        if self.token:
+            session.headers['Authorization'] = 'Bearer {token}'.format(token=self.token)
+        return session
+
+    def _listen_forever(self) -> None:
+        session = self._new_session()
+        while True:
+            try:
+                response = session.get(
+                    '{url}/wait'.format(url=self.url),
+                    params={'version': self.version or 0, 'timeout': self.long_poll},
+                    timeout=self.long_poll + self.timeout,
+                )
+                version = response.json()['version']
+            except (RequestException, ValueError, KeyError):
+                time.sleep(self.error_delay)
+                continue
+            if self.version is not None and version != self.version:
+                self.changed.set()
+            self.version = version
+
+
+if __name__ == '__main__':
+    from src.config import get_ini_options, get_intervals, get_metrics_exporter, parse_listen
+    from src.manager import MessageManager
+
+    ini_options = get_ini_options(required=False)
+    exporter = get_metrics_exporter(ini_options)
+    if exporter is not None:
+        exporter.start()
+    manager = MessageManager()
+    listen = DEFAULT_RELAY_LISTEN if ini_options is None else ini_options.get('relay-listen', DEFAULT_RELAY_LISTEN)
+    token = None if ini_options is None else ini_options.get('relay-token')
+    Relay(manager, poll_interval=get_intervals()['tick-min'], token=token).serve(*parse_listen(listen))
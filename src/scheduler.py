@@ -0,0 +1,102 @@
+"""Adaptive intervals for browser loop and telegram retries."""
+
+import random
+from typing import Optional
+
+from telebot.apihelper import ApiTelegramException
+
+from src.config import get_intervals
+
+
+class TickScheduler(object):
+    """Interval source: slow when state is stable, fast after changes, jittered backoff on errors."""
+
+    # во сколько раз растет пауза, пока ничего не меняется
+    growth = 1.5
+
+    def __init__(
+        self,
+        min_interval: float = 1.0,
+        max_interval: float = 5.0,
+        backoff_base: float = 1.5,
+        backoff_cap: float = 30.0,
+    ) -> None:
+        """Scheduler initial method.
+
+        Args:
+            min_interval: tick interval right after changes.
+            max_interval: tick interval limit for stable state.
+            backoff_base: minimal pause after error.
+            backoff_cap: maximal pause after error.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.interval = min_interval
+        self.backoff = 0.0
+
+    @classmethod
+    def from_ini(cls) -> 'TickScheduler':
+        """Create scheduler with intervals from reso.ini.
+
+        Returns:
+            TickScheduler instance.
+        """
+        intervals = get_intervals()
+        return cls(
+            min_interval=intervals['tick-min'],
+            max_interval=intervals['tick-max'],
+            backoff_base=intervals['retry-base'],
+            backoff_cap=intervals['retry-cap'],
+        )
+
+    def stable(self) -> float:
+        """Get next interval when nothing has changed.
+
+        Returns:
+            Seconds to wait.
+        """
+        self.backoff = 0.0
+        self.interval = min(self.max_interval, self.interval * self.growth)
+        return self.interval
+
+    def activity(self) -> float:
+        """Get next interval right after cookies change or logout.
+
+        Returns:
+            Seconds to wait.
+        """
+        self.backoff = 0.0
+        self.interval = self.min_interval
+        return self.interval
+
+    def failure(self, retry_after: Optional[float] = None) -> float:
+        """Get pause after error, decorrelated jitter exponential backoff.
+
+        Args:
+            retry_after: seconds that server asked to wait.
+
+        Returns:
+            Seconds to wait.
+        """
+        # у клиентов разные паузы, и после ограничения телеграм они не повторяют запросы одновременно
+        upper = max(self.backoff_base, self.backoff * 3)
+        self.backoff = min(self.backoff_cap, random.uniform(self.backoff_base, upper))
+        if retry_after:
+            return retry_after + random.uniform(0, self.backoff)
+        return self.backoff
+
+
+def retry_after(error: ApiTelegramException) -> Optional[float]:
+    """Get retry_after of telegram 429 error.
+
+    Args:
+        error: telegram api error.
+
+    Returns:
+        Seconds to wait or None, if it is another error.
+    """
+    if error.error_code != 429:
+        return None
+    return (error.result_json or {}).get('parameters', {}).get('retry_after')
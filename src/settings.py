@@ -1,10 +1,32 @@
 """Settings module."""
 
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
 load_dotenv()
 BOT_TOKEN = os.environ.get('BOT_TOKEN')
 CHAT_ID = os.environ.get('CHAT_ID')
-TELEGRAM_MSG_LIMIT = 4096
\ No newline at end of file
+TELEGRAM_MSG_LIMIT = 4096
+# сколько секунд закрепленное сообщение берется из памяти без запроса к телеграм
+PINNED_CACHE_TTL = float(os.environ.get('PINNED_CACHE_TTL', 5))
+# сжимать закрепленное сообщение zlib + base85, если так оно получается короче
+PAYLOAD_PACKING = os.environ.get('PAYLOAD_PACKING', '0') == '1'
+# чаты, по закрепленным сообщениям которых распределяются аккаунты, через запятую
+SHARD_CHAT_IDS = [chat.strip() for chat in os.environ.get('SHARD_CHAT_IDS', '').split(',') if chat.strip()]
+# бюджет запросов к боту в токенах в секунду и максимальный запас токенов
+TELEGRAM_RATE = float(os.environ.get('TELEGRAM_RATE', 20))
+TELEGRAM_BURST = float(os.environ.get('TELEGRAM_BURST', 30))
+# через этот файл бюджет делят все процессы на компьютере, пустое значение - только текущий процесс
+TELEGRAM_BUDGET_FILE = os.environ.get(
+    'TELEGRAM_BUDGET_FILE',
+    os.path.join(tempfile.gettempdir(), 'reso_telegram_budget.json'),
+) or None
+# найденные пути драйвера и браузера, чтобы не запускать Selenium Manager каждый раз, пустое значение - без кэша
+DRIVER_CACHE_FILE = os.environ.get(
+    'DRIVER_CACHE_FILE',
+    os.path.join(tempfile.gettempdir(), 'reso_drivers.json'),
+) or None
+# вывод времени этапов запуска
+DIAGNOSTICS = os.environ.get('RESO_DIAGNOSTICS', '0') == '1'
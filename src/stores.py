@@ -0,0 +1,485 @@
+"""Cookie stores: shared cookies of accounts by hash."""
+
+import copy
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from threading import Condition
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.codec import RESERVED_PREFIX
+from src.cookies import same
+from src.exceptions import InvalidHash
+from src.files import atomic_write, file_lock
+
+Payload = Dict[str, List]
+# аренда записи по хэшу: владелец и unix время окончания
+LEASE_FIELD = '_lease'
+MESSAGE_SAMPLE = '{"test":[{"name":"ASP.NET_SessionId","value":"yrtu1tgknmxnjpeswaygtxqw","path":"/","secure":false,"httpOnly":true,"sameSite":"None","domain":".reso.ru"},{"name":"ResoOffice60","value":"3BDDB47353A1DBFBC4AE88C9659B35F136FEAB9E3F00A7E9F0FB21ADAC89E66B05F3D8E06052F6AF30C5B7628B4610979B604C5DB4046828B1B8658C7657F8AE45D53DE18201013C1492F10EE56F1469575D2D89","path":"/","secure":false,"httpOnly":true,"sameSite":"None","domain":".reso.ru"}]}'
+
+
+def set_change(cookies: List, hsh: str) -> Callable[[Payload], None]:
+    """Build change that sets cookies of existing account.
+
+    Args:
+        cookies: list with dict cookies.
+        hsh: user identification hash.
+
+    Returns:
+        Idempotent change for store update.
+    """
+    def changes(payload: Payload) -> None:
+        # аккаунт, удаленный за это время, не восстанавливаем
+        if hsh in payload and not same(payload[hsh], cookies):
+            payload[hsh] = cookies
+    return changes
+
+
+def add_change(hsh: str, cookies: List) -> Callable[[Payload], None]:
+    """Build change that adds account, existing account is kept.
+
+    Args:
+        hsh: user identification hash.
+        cookies: initial cookies of account.
+
+    Returns:
+        Idempotent change for store update.
+    """
+    def changes(payload: Payload) -> None:
+        payload.setdefault(hsh, cookies)
+    return changes
+
+
+def remove_change(hsh: str) -> Callable[[Payload], None]:
+    """Build change that removes account together with its writer lease.
+
+    Args:
+        hsh: user identification hash.
+
+    Returns:
+        Idempotent change for store update.
+    """
+    def changes(payload: Payload) -> None:
+        payload.pop(hsh, None)
+        payload.get(LEASE_FIELD, {}).pop(hsh, None)  # type: ignore
+    return changes
+
+
+class ChangeSignal(object):
+    """Change notification of store, like Event, but every change is counted.
+
+    Each waiter keeps the generation it has seen and waits for a newer one, so the waiter that wakes first
+    doesn't hide the change from others by clearing shared flag.
+    """
+
+    def __init__(self) -> None:
+        """Signal initial method."""
+        self.condition = Condition()
+        self.generation = 0
+        self.flag = False
+
+    def set(self) -> None:
+        """Signal change to every waiter."""
+        with self.condition:
+            self.generation += 1
+            self.flag = True
+            self.condition.notify_all()
+
+    def is_set(self) -> bool:
+        """Check flag, that is set by change and cleared by the only waiter.
+
+        Returns:
+            bool variable.
+        """
+        return self.flag
+
+    def clear(self) -> None:
+        """Clear flag, generation stays."""
+        with self.condition:
+            self.flag = False
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until flag is set, for the only waiter.
+
+        Args:
+            timeout: seconds to wait, forever if not passed.
+
+        Returns:
+            Flag value.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: self.flag, timeout)
+
+    def wait_newer(self, generation: int, timeout: Optional[float] = None) -> int:
+        """Wait for change after the passed generation.
+
+        Args:
+            generation: generation seen by waiter.
+            timeout: seconds to wait, forever if not passed.
+
+        Returns:
+            Current generation, the passed one if nothing has changed.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.generation != generation, timeout)
+            return self.generation
+
+
+class CookieStore(ABC):
+    """Base store interface, payload is a dictionary with cookies lists by hash."""
+
+    def __init__(self) -> None:
+        """Store initial method."""
+        # выставляется, когда данные изменил кто-то другой
+        self.changed = ChangeSignal()
+        # записи, пропущенные потому что в хранилище уже та же сессия
+        self.avoided_writes = 0
+
+    @property
+    def message_sample(self) -> Payload:
+        """Initial payload with test account.
+
+        Returns:
+            New copy of payload sample.
+        """
+        return json.loads(MESSAGE_SAMPLE)
+
+    @abstractmethod
+    def load(self) -> Payload:
+        """Get whole payload.
+
+        Returns:
+            Payload that must not be changed by caller.
+        """
+
+    @abstractmethod
+    def update(
+        self,
+        changes: Callable[[Payload], None],
+        hashes: Optional[List[str]] = None,
+    ) -> None:
+        """Apply changes to latest payload and save it, changes must be idempotent.
+
+        Args:
+            changes: function that edits payload copy in place.
+            hashes: hashes touched by changes, lets store read and write only part of payload.
+        """
+
+    @abstractmethod
+    def reinit(self) -> None:
+        """Initialize or reinitialize store with payload sample."""
+
+    def get_cookies(self, hsh: str) -> List:
+        """Get cookies by hash.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            List with dict cookies.
+        """
+        try:
+            return self.load()[hsh]
+        except KeyError:
+            raise InvalidHash(InvalidHash.msg.format(hash=hsh))
+
+    def set_cookies(self, cookies: List, hsh: str) -> None:
+        """Set new cookies by hash.
+
+        Args:
+            cookies: list with dict cookies.
+            hsh: user identification hash.
+        """
+        if same(self.load().get(hsh), cookies):
+            self.avoided_writes += 1
+            return
+        self.update(set_change(cookies, hsh), hashes=[hsh])
+
+    def add_account(self, hsh: str) -> None:
+        """Add new account with sample cookies.
+
+        Args:
+            hsh: user identification hash.
+        """
+        self.update(add_change(hsh, self.message_sample['test']), hashes=[hsh])
+
+    def remove_account(self, hsh: str) -> None:
+        """Remove account.
+
+        Args:
+            hsh: user identification hash.
+        """
+        self.update(remove_change(hsh), hashes=[hsh])
+
+    def change_accounts(
+        self,
+        add: Optional[List[str]] = None,
+        remove: Optional[List[str]] = None,
+        rename: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Add, remove and rename many accounts with one read-modify-write.
+
+        Args:
+            add: new hashes, they get sample cookies.
+            remove: hashes to remove.
+            rename: new hashes by old ones, cookies are kept.
+        """
+        add, remove, rename = add or [], remove or [], rename or {}
+
+        def changes(payload: Payload) -> None:
+            for old, new in rename.items():
+                # не затираем существующий аккаунт
+                if old in payload and new not in payload:
+                    payload[new] = payload.pop(old)
+            for hsh in remove:
+                remove_change(hsh)(payload)
+            for hsh in add:
+                payload.setdefault(hsh, self.message_sample['test'])
+        self.update(changes, hashes=[*add, *remove, *rename, *rename.values()])
+
+    def export_accounts(self) -> Payload:
+        """Get cookies of all accounts without reserved fields.
+
+        Returns:
+            New dictionary with cookies lists by hash.
+        """
+        return {
+            hsh: copy.deepcopy(cookies) for hsh, cookies in self.load().items() if not hsh.startswith(RESERVED_PREFIX)
+        }
+
+    def import_accounts(self, accounts: Payload, replace: bool = False) -> None:
+        """Write cookies of many accounts with one read-modify-write.
+
+        Args:
+            accounts: cookies lists by hash, like export_accounts result.
+            replace: remove accounts that are absent in accounts.
+        """
+        for hsh, cookies in accounts.items():
+            if hsh.startswith(RESERVED_PREFIX) or not isinstance(cookies, list):
+                raise ValueError('Неверные куки аккаунта {hsh}'.format(hsh=hsh))
+
+        def changes(payload: Payload) -> None:
+            if replace:
+                for hsh in [hsh for hsh in payload if not hsh.startswith(RESERVED_PREFIX)]:
+                    if hsh not in accounts:
+                        remove_change(hsh)(payload)
+            payload.update(copy.deepcopy(accounts))
+        self.update(changes, hashes=None if replace else list(accounts))
+
+    def accounts(self) -> List[str]:
+        """Get available account hashes.
+
+        Returns:
+            List with hashes.
+        """
+        return [hsh for hsh in self.load() if not hsh.startswith(RESERVED_PREFIX)]
+
+    def lease(self, hsh: str) -> Optional[Tuple[str, float]]:
+        """Get writer lease of account.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            Tuple with owner and unix expiry time or None, if nobody holds it.
+        """
+        lease = self.load().get(LEASE_FIELD, {}).get(hsh)  # type: ignore
+        return (lease[0], lease[1]) if lease else None
+
+    def acquire_lease(
+        self,
+        hsh: str,
+        owner: str,
+        ttl: float,
+        force: bool = False,
+        cookies: Optional[List] = None,
+    ) -> bool:
+        """Take or renew writer lease of account, only its holder publishes cookies.
+
+        Lease is written only when it is taken or half of ttl is left, cookies go with the same write,
+        so publishing account costs one write regardless of amount of clients.
+
+        Args:
+            hsh: user identification hash.
+            owner: client id.
+            ttl: seconds while lease is valid without renewal.
+            force: take lease held by other client, like after human login.
+            cookies: cookies to publish, if lease is held.
+
+        Returns:
+            True if owner holds the lease and cookies are published.
+        """
+        now = time.time()
+        current = self.lease(hsh)
+        if current is not None and current[1] > now:
+            if current[0] != owner and not force:
+                return False
+            if current[0] == owner and current[1] - now > ttl / 2:
+                if cookies is not None:
+                    self.set_cookies(cookies, hsh)
+                return True
+        expiry = round(now + ttl)
+
+        def changes(payload: Payload) -> None:
+            if hsh not in payload:
+                return
+            leases = payload.setdefault(LEASE_FIELD, {})  # type: ignore
+            lease = leases.get(hsh)  # type: ignore
+            if lease and lease[0] != owner and lease[1] > time.time() and not force:
+                # другой клиент успел взять аренду раньше, уступаем ему
+                return
+            leases[hsh] = [owner, expiry]  # type: ignore
+            if cookies is not None and not same(payload[hsh], cookies):
+                payload[hsh] = cookies
+        self.update(changes, hashes=[hsh])
+        current = self.lease(hsh)
+        return current is not None and current[0] == owner
+
+    def release_lease(self, hsh: str, owner: str) -> None:
+        """Give up writer lease, so other client takes it without waiting for expiry.
+
+        Args:
+            hsh: user identification hash.
+            owner: client id.
+        """
+        current = self.lease(hsh)
+        if current is None or current[0] != owner:
+            return
+
+        def changes(payload: Payload) -> None:
+            lease = payload.get(LEASE_FIELD, {}).get(hsh)  # type: ignore
+            if lease and lease[0] == owner:
+                payload[LEASE_FIELD].pop(hsh)  # type: ignore
+        self.update(changes, hashes=[hsh])
+
+    def refresh(self, hashes: Optional[List[str]] = None) -> None:
+        """Drop cached data, so the next read sees changes of other clients.
+
+        Stores without cache read fresh data anyway.
+
+        Args:
+            hashes: hashes to refresh, all if not passed.
+        """
+
+    def listen(self) -> None:
+        """Start push notifications of changes made by other clients, they set changed event.
+
+        Stores without notifications are polled by browser ticks.
+        """
+
+    def changed_at(self, hsh: str) -> Optional[float]:
+        """Get time of the last read change of account, for adoption latency.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            Unix time or None, if store doesn't know it.
+        """
+        return None
+
+
+class FileStore(CookieStore):
+    """Store in local json file, shared by clients on one host or shared volume."""
+
+    def __init__(self, path: str) -> None:
+        """File store initial method.
+
+        Args:
+            path: json file path.
+        """
+        super().__init__()
+        self.path = path
+        self.lock_path = '{path}.lock'.format(path=path)
+        # (mtime, size) of the file that payload was read from
+        self._key: Optional[Tuple[int, int]] = None
+        self._payload: Optional[Payload] = None
+
+    def load(self) -> Payload:
+        """Get payload, file is parsed again only if it was changed.
+
+        Returns:
+            Payload that must not be changed by caller.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            # файл будет создан при первой записи
+            return self.message_sample
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key != self._key or self._payload is None:
+            if self._payload is not None:
+                self.changed.set()
+            with open(self.path, encoding='UTF-8') as store_file:
+                self._payload = json.load(store_file)
+            self._key = key
+        return self._payload  # type: ignore
+
+    def update(
+        self,
+        changes: Callable[[Payload], None],
+        hashes: Optional[List[str]] = None,
+    ) -> None:
+        """Apply changes under file lock, so other processes don't lose them.
+
+        Args:
+            changes: function that edits payload copy in place.
+            hashes: unused, whole file is rewritten.
+        """
+        with file_lock(self.lock_path):
+            payload = copy.deepcopy(self.load())
+            changes(payload)
+            self._save(payload)
+
+    def reinit(self) -> None:
+        """Write payload sample to file."""
+        with file_lock(self.lock_path):
+            self._save(self.message_sample)
+
+    def changed_at(self, hsh: str) -> Optional[float]:
+        """Get modification time of the file that payload was read from.
+
+        Args:
+            hsh: user identification hash.
+
+        Returns:
+            Unix time or None, if file wasn't read yet.
+        """
+        if self._key is None:
+            return None
+        return self._key[0] / 1e9
+
+    def _save(self, payload: Payload) -> None:
+        atomic_write(self.path, json.dumps(payload))
+        stat = os.stat(self.path)
+        self._key = (stat.st_mtime_ns, stat.st_size)
+        self._payload = payload
+
+
+class SnapshotStore(FileStore):
+    """Last known good cookies of this host, used to start without waiting for remote store."""
+
+    @property
+    def message_sample(self) -> Payload:
+        """Snapshot starts empty.
+
+        Returns:
+            Empty payload.
+        """
+        return {}
+
+    def set_cookies(self, cookies: List, hsh: str) -> None:
+        """Save cookies by hash, account is added on first save.
+
+        Args:
+            cookies: list with dict cookies.
+            hsh: user identification hash.
+        """
+        if same(self.load().get(hsh), cookies):
+            self.avoided_writes += 1
+            return
+
+        def changes(payload: Payload) -> None:
+            payload[hsh] = cookies
+        self.update(changes, hashes=[hsh])
@@ -0,0 +1,142 @@
+"""Supervisor to run browser sessions of several accounts in one process."""
+
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from src.config import get_choice, get_ini_options
+from src.exceptions import DriverCrashed
+from src.handlers import quit_driver, show_error
+from src.keepalive import SessionKeeper
+from src.main import ResoBrowser
+from src.pool import DriverPool
+from src.probe import SessionProbe
+
+
+class Supervisor(object):
+    """Run one ResoBrowser session per hash, all sessions share one cookie store, crashed browsers are replaced."""
+
+    # после стольких падений браузер сессии больше не заменяется
+    max_restarts = 10
+
+    def __init__(
+        self,
+        hashes: Optional[List[str]] = None,
+        standby: Optional[bool] = None,
+        keepalive: Optional[bool] = None,
+    ) -> None:
+        """Supervisor initial method.
+
+        Args:
+            hashes: user identification hashes, hashes from ini file are used if not passed.
+            standby: keep warm standby browser, value from ini file is used if not passed.
+            keepalive: keep shared sessions alive between browser ticks, value from ini file is used if not passed.
+        """
+        self.hashes = hashes or ResoBrowser.hashes
+        # ResoBrowser.manager общий для всех сессий: один запрос к хранилищу на всех за время жизни кэша
+        self.manager = ResoBrowser.manager
+        options = get_ini_options(required=False)
+        if standby is None:
+            standby = get_choice(options, 'standby') == 'yes'
+        if keepalive is None:
+            keepalive = get_choice(options, 'keepalive') == 'yes'
+        self.pool = DriverPool(ResoBrowser, standby=standby)
+        self.keeper: Optional[SessionKeeper] = None
+        if keepalive:
+            # http клиент проверок сессий переиспользуется, чтобы не держать второй пул соединений
+            self.keeper = SessionKeeper(self.manager, ResoBrowser.probe or SessionProbe(), hashes=self.hashes)
+        self.errors: Dict[str, BaseException] = {}
+        self.lock = Lock()
+        self.restarts: Counter = Counter()
+        # секунды от падения браузера до открытой главной страницы в новом
+        self.recovery_latencies: List[float] = []
+
+    def run(self) -> None:
+        """Run sessions on thread pool and wait until all of them finish."""
+        self.pool.start()
+        if self.keeper is not None:
+            self.keeper.start()
+        try:
+            with ThreadPoolExecutor(max_workers=len(self.hashes), thread_name_prefix='session') as pool:
+                futures: Dict[Future, str] = {pool.submit(self.session, hsh): hsh for hsh in self.hashes}
+                for future in as_completed(futures):
+                    error = future.exception()
+                    # закрытие окна браузера завершает сессию через exit(0)
+                    if error is not None and not isinstance(error, SystemExit):
+                        self.errors[futures[future]] = error
+        finally:
+            if self.keeper is not None:
+                self.keeper.stop()
+            self.pool.close()
+
+    def session(self, hsh: str) -> None:
+        """Run browser session, errors stay inside the session thread.
+
+        Args:
+            hsh: user identification hash.
+        """
+        try:
+            driver = ResoBrowser(hsh)
+            try:
+                while True:
+                    driver.supervised = True
+                    try:
+                        driver.run()
+                        return
+                    except DriverCrashed:
+                        if self.restarts[hsh] >= self.max_restarts:
+                            raise
+                        driver = self.replace(driver, hsh)
+            finally:
+                quit_driver(driver)
+        except Exception as error:
+            show_error('Ошибка сессии {hsh}'.format(hsh=hsh), 'Произошла ошибка:\n\n{error}'.format(error=error))
+            raise
+
+    def replace(self, crashed: Any, hsh: str) -> Any:
+        """Get new browser with session state of crashed one.
+
+        Args:
+            crashed: crashed browser, already quit.
+            hsh: user identification hash.
+
+        Returns:
+            Browser ready to run.
+        """
+        crashed_at = time.perf_counter()
+        with self.lock:
+            self.restarts[hsh] += 1
+        driver = self.pool.take(hsh)
+        driver.resume_from(crashed)
+        driver.on_ready = lambda: self.recovered(crashed_at)
+        return driver
+
+    def recovered(self, crashed_at: float) -> None:
+        """Record recovery latency.
+
+        Args:
+            crashed_at: perf_counter value at the moment of crash.
+        """
+        with self.lock:
+            self.recovery_latencies.append(time.perf_counter() - crashed_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get restart statistics.
+
+        Returns:
+            Dictionary with restarts by hash, warm and cold starts and recovery latencies in milliseconds.
+        """
+        with self.lock:
+            latencies = [round(latency * 1000) for latency in self.recovery_latencies]
+            return {
+                'restarts': dict(self.restarts),
+                'warm_starts': self.pool.warm_starts,
+                'cold_starts': self.pool.cold_starts,
+                'recovery_ms': latencies,
+            }
+
+
+if __name__ == '__main__':
+    Supervisor().run()
@@ -0,0 +1,74 @@
+"""Offline doubles for telegram bot used by tests."""
+
+import time
+from typing import Dict, List, Optional
+
+from telebot.types import Chat, Message
+
+
+class FakeBot(object):
+    """In-memory TeleBot replacement with call counters, every chat has its own pinned message."""
+
+    token = 'fake'
+
+    def __init__(self, text: Optional[str] = None, delay: float = 0.0, chat: Optional[str] = None) -> None:
+        """Create bot with optional pinned message text.
+
+        Args:
+            text: pinned message text of the chat, no pinned message if not passed.
+            delay: seconds of simulated network latency for every call.
+            chat: chat id of the pinned message.
+        """
+        self.delay = delay
+        self.messages: Dict[int, Dict] = {}
+        self.pinned: Dict[Optional[str], int] = {}
+        self.calls: List[str] = []
+        # ошибки, которые по очереди получат следующие getChat
+        self.errors: List[Exception] = []
+        if text is not None:
+            self.pinned[chat] = self._new_message(chat, text)['message_id']
+
+    def get_chat(self, chat_id: str) -> Chat:
+        """Return chat with current pinned message or raise the next queued error."""
+        self.calls.append('getChat')
+        time.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        chat = {'id': 1, 'type': 'group'}
+        if chat_id in self.pinned:
+            chat['pinned_message'] = self.messages[self.pinned[chat_id]]
+        return Chat.de_json(chat)
+
+    def send_message(self, chat_id: str, text: str) -> Message:
+        """Send new message."""
+        self.calls.append('sendMessage')
+        return Message.de_json(self._new_message(chat_id, text))
+
+    def pin_chat_message(self, chat_id: str, message_id: int) -> bool:
+        """Pin message by id."""
+        self.calls.append('pinChatMessage')
+        self.pinned[chat_id] = message_id
+        return True
+
+    def edit_message_text(self, text: str, chat_id: str, message_id: int) -> Message:
+        """Edit message text."""
+        self.calls.append('editMessageText')
+        time.sleep(self.delay)
+        message = self.messages[message_id]
+        message['text'] = text
+        message['edit_date'] = int(time.time())
+        return Message.de_json(dict(message))
+
+    def text(self, chat: Optional[str] = None) -> str:
+        """Get pinned message text of chat."""
+        return self.messages[self.pinned[chat]]['text']
+
+    def _new_message(self, chat: Optional[str], text: str) -> Dict:
+        message_id = len(self.messages) + 1
+        self.messages[message_id] = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': 1, 'type': 'group'},
+            'text': text,
+        }
+        return self.messages[message_id]
@@ -0,0 +1,110 @@
+"""Offline tests for asyncio pinned message manager against local fake Bot API."""
+
+import asyncio
+import unittest
+
+from telebot.async_telebot import AsyncTeleBot
+
+from benchmarks.fake_telegram import FakeBotApi, FakeBotApiServer
+from src.async_manager import AsyncMessageManager, SyncMessageManager
+from src.bot import AsyncRateLimitedBot, TokenBucket
+from src.stores import LEASE_FIELD
+
+TOKEN = '123456:async'
+
+
+def new_manager(chats: list) -> AsyncMessageManager:
+    """Create manager with real AsyncTeleBot."""
+    bucket = TokenBucket(rate=1000, capacity=1000)
+    return AsyncMessageManager(bot=AsyncRateLimitedBot(AsyncTeleBot(TOKEN), bucket), cache_ttl=60, chats=chats)
+
+
+class AsyncManagerTestCase(unittest.TestCase):
+    """Async manager shares requests and reads shards concurrently."""
+
+    def setUp(self) -> None:
+        """Start fake api with latency."""
+        self.api = FakeBotApi(latency=0.05)
+        self.server = FakeBotApiServer(self.api)
+        self.server.__enter__()
+
+    def tearDown(self) -> None:
+        """Stop fake api."""
+        self.server.__exit__()
+
+    def test_accounts_managing(self) -> None:
+        """Test add, set and concurrent reads of one shard with one request."""
+        async def scenario() -> list:
+            manager = new_manager(['1', '2'])
+            await manager.reinit()
+            await manager.add_account('hash')
+            await manager.set_cookies([{'name': 'a', 'value': '1'}], 'hash')
+            manager.caches[manager.chat_for('hash')].invalidate()
+            self.api.calls.clear()
+            results = await asyncio.gather(*(manager.get_cookies('hash') for _ in range(10)))
+            accounts = sorted(await manager.accounts())
+            calls = self.api.calls['getChat']
+            await manager.remove_account('hash')
+            self.assertEqual(await manager.accounts(), ['test'])
+            await manager.close()
+            return [results, accounts, calls]
+
+        results, accounts, calls = asyncio.run(scenario())
+        self.assertEqual(results, [[{'name': 'a', 'value': '1'}]] * 10)
+        # десять одновременных чтений одного шарда и список из кэша стоят одного запроса
+        self.assertEqual(calls, 1)
+        self.assertEqual(accounts, ['hash', 'test'])
+
+    def test_remove_account_drops_lease(self) -> None:
+        """Test that removed account doesn't leave its writer lease in shard, like in MessageManager."""
+        async def scenario() -> dict:
+            manager = new_manager(['1', '2'])
+            await manager.reinit()
+            await manager.add_account('hash')
+            await manager.update(lambda payload: payload.setdefault(LEASE_FIELD, {}).update(hash=['owner', 1e10]))
+            await manager.remove_account('hash')
+            payload = await manager.load()
+            await manager.close()
+            return payload
+
+        self.assertEqual(asyncio.run(scenario()).get(LEASE_FIELD, {}), {})
+
+    def test_sync_facade(self) -> None:
+        """Test blocking CookieStore interface for existing callers."""
+        store = SyncMessageManager(new_manager(['1']))
+        store.reinit()
+        store.add_account('hash')
+        store.set_cookies([{'name': 'a', 'value': '1'}], 'hash')
+        self.assertEqual(store.get_cookies('hash'), [{'name': 'a', 'value': '1'}])
+        self.assertEqual(sorted(store.accounts()), ['hash', 'test'])
+        store.close()
+
+    def test_lease_reads_one_shard(self) -> None:
+        """Test that lease of sync facade reads only the shard of hash, like MessageManager."""
+        store = SyncMessageManager(new_manager(['1', '2', '3']))
+        store.reinit()
+        store.add_account('hash')
+        self.assertTrue(store.acquire_lease('hash', 'owner', 60))
+        for cache in store.manager.caches.values():
+            cache.invalidate()
+        self.api.calls.clear()
+        self.assertEqual(store.lease('hash')[0], 'owner')
+        self.assertEqual(self.api.calls['getChat'], 1)
+        store.close()
+
+    def test_accounts_dont_create_message(self) -> None:
+        """Test that listing accounts of chat without pinned message doesn't create it."""
+        async def scenario() -> None:
+            manager = new_manager(['1'])
+            try:
+                with self.assertRaises(AttributeError):
+                    await manager.accounts()
+            finally:
+                await manager.close()
+
+        asyncio.run(scenario())
+        self.assertEqual(self.api.calls['sendMessage'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
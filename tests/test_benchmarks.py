@@ -0,0 +1,36 @@
+"""Smoke test of offline benchmark harness."""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from benchmarks.fake_reso import FakeResoServer
+from benchmarks.fake_telegram import FakeBotApi, FakeBotApiServer
+from benchmarks.run import bench_store, bench_ticks, main
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    """Benchmark runs against local fakes."""
+
+    def test_small_run(self) -> None:
+        """Test that rotations are published and calm ticks cost no api calls."""
+        api = FakeBotApi()
+        with FakeBotApiServer(api), FakeResoServer() as site_server:
+            store = bench_store(api, site_server.site, accounts=2, rate=1000)
+            ticks = bench_ticks(api, site_server, accounts=2, ticks=4, rotate_every=2, rate=1000)
+        self.assertEqual(store['add_account']['operations'], 2)
+        self.assertEqual(ticks['api_calls_by_method'].get('editMessageText'), 4)
+        self.assertEqual(ticks['ticks'] - ticks['calm_ticks'], 4)
+
+    def test_default_arguments(self) -> None:
+        """Test that `make bench` run with default amount of accounts fits into pinned messages."""
+        with tempfile.TemporaryDirectory() as directory, redirect_stdout(io.StringIO()):
+            path = os.path.join(directory, 'bench.json')
+            main(['--output', path])
+            with open(path, encoding='UTF-8') as result_file:
+                results = json.load(result_file)
+        self.assertEqual(results['store']['add_account']['operations'], 20)
+        self.assertEqual(results['ticks']['clients'], 20)
@@ -0,0 +1,58 @@
+"""Offline tests for rate limited telegram bot."""
+
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+from src.bot import RateLimitedBot, TokenBucket
+from tests.fakes import FakeBot
+
+
+class TokenBucketTestCase(unittest.TestCase):
+    """Request budget tests."""
+
+    def test_reserve_is_left_for_writes(self) -> None:
+        """Test that reads can't take reserved tokens, but writes can."""
+        bucket = TokenBucket(rate=1, capacity=5, reserve=2)
+        self.assertEqual(bucket.take(3), 0)
+        self.assertGreater(bucket.take(1), 0)
+        self.assertEqual(bucket.take(1, high=True), 0)
+
+    def test_budget_is_shared_through_file(self) -> None:
+        """Test that two buckets with one state file spend one budget."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'budget.json')
+            first = TokenBucket(rate=0.1, capacity=4, path=path)
+            second = TokenBucket(rate=0.1, capacity=4, path=path)
+            self.assertEqual(first.take(3), 0)
+            self.assertGreater(second.take(3), 0)
+
+    def test_async_acquire_doesnt_block_loop(self) -> None:
+        """Test that file locked take of async acquire runs outside of event loop thread."""
+        bucket = TokenBucket(rate=100, capacity=100)
+        take = bucket.take
+        threads = []
+
+        def recorded(cost: float, high: bool = False) -> float:
+            threads.append(threading.current_thread())
+            return take(cost, high)
+
+        bucket.take = recorded  # type: ignore
+        self.assertEqual(asyncio.run(bucket.acquire_async(1, high=True)), 0)
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertEqual(bucket.waiting_high, 0)
+
+    def test_calls_are_counted_by_method(self) -> None:
+        """Test per method call and cost accounting."""
+        bot = RateLimitedBot(FakeBot('{}'), TokenBucket(rate=100, capacity=100))
+        bot.get_chat(None)
+        bot.get_chat(None)
+        self.assertEqual(bot.calls['get_chat'], 2)
+        self.assertEqual(bot.tokens['get_chat'], 2)
+        self.assertEqual(bot.token, 'fake')
+
+
+if __name__ == '__main__':
+    unittest.main()
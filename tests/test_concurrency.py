@@ -0,0 +1,93 @@
+"""Offline tests for single-flight reads and combined writes."""
+
+import json
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src import codec
+from src.concurrency import SingleFlight, WriteQueue
+from src.manager import MessageManager
+from tests.fakes import FakeBot
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    """Shared in-flight calls."""
+
+    def test_concurrent_calls_share_result(self) -> None:
+        """Test that one call is made for concurrent callers and error is shared too."""
+        flights = SingleFlight()
+        calls = []
+
+        def slow() -> int:
+            calls.append(1)
+            time.sleep(0.05)
+            return len(calls)
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            results = list(pool.map(lambda _: flights.do('key', slow), range(5)))
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual((flights.leaders, flights.shared), (1, 4))
+        with self.assertRaises(ZeroDivisionError):
+            flights.do('key', lambda: 1 / 0)
+        self.assertEqual(flights.calls, {})
+
+
+class WriteQueueTestCase(unittest.TestCase):
+    """Writes queued while lock is busy."""
+
+    def test_queued_writes_are_combined(self) -> None:
+        """Test that writes waiting for lock are applied with one call in order."""
+        payload: dict = {}
+        applied = []
+        lock = threading.RLock()
+
+        def apply(changes, hashes) -> None:
+            applied.append(hashes)
+            changes(payload)
+
+        queue = WriteQueue(apply, lock)
+        with lock:
+            threads = [
+                threading.Thread(target=queue.submit, args=(lambda data, num=num: data.update(key=num), ['key']))
+                for num in range(3)
+            ]
+            for thread in threads:
+                thread.start()
+            while len(queue.queue) < 3:
+                time.sleep(0.001)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(applied), 1)
+        self.assertEqual(applied[0], ['key', 'key', 'key'])
+        self.assertEqual(queue.combined, 2)
+        self.assertEqual(queue.contended, 3)
+        self.assertIn(payload['key'], range(3))
+
+
+class ManagerStatsTestCase(unittest.TestCase):
+    """Manager used from many threads."""
+
+    def test_threads_share_reads_and_writes(self) -> None:
+        """Test dedup of concurrent reads and serialized writes of different hashes."""
+        bot = FakeBot(json.dumps({'hash{num}'.format(num=num): [] for num in range(6)}), delay=0.05)
+        manager = MessageManager(bot=bot, cache_ttl=60)
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            list(pool.map(manager.get_cookies, ['hash0'] * 6))
+            list(pool.map(
+                lambda num: manager.set_cookies([{'name': 'a', 'value': str(num)}], 'hash{num}'.format(num=num)),
+                range(6),
+            ))
+        payload = codec.loads(bot.text())
+        self.assertEqual([payload['hash{num}'.format(num=num)][0]['value'] for num in range(6)], list('012345'))
+        stats = manager.stats()
+        self.assertEqual(stats['reads'], 1)
+        self.assertEqual(stats['shared_reads'], 5)
+        self.assertEqual(stats['writes'], 6)
+        self.assertLess(stats['write_batches'], 6)
+        self.assertEqual(stats['coalesced_writes'], 6 - stats['write_batches'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Offline tests for non-interactive account administration."""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.exceptions import TelegramError
+from src.manager import MessageManager
+from src.manager_console import Console, parse_batch, run
+from src.stores import FileStore
+from tests.fakes import FakeBot
+
+
+class BatchTestCase(unittest.TestCase):
+    """Batch changes are written with one edit."""
+
+    def setUp(self) -> None:
+        """Create manager with two accounts."""
+        self.bot = FakeBot(json.dumps({'old': [{'name': 'a', 'value': '1'}], 'gone': []}))
+        self.manager = MessageManager(bot=self.bot, cache_ttl=60)
+
+    def run_json(self, *argv: str) -> dict:
+        """Run command with json output."""
+        output = io.StringIO()
+        self.assertEqual(run(['--json', *argv], self.manager, output), 0)
+        return json.loads(output.getvalue())
+
+    def test_apply_is_one_edit(self) -> None:
+        """Test add, remove and rename of many accounts."""
+        result = self.run_json(
+            'apply', '--add', 'ivan', '--add', 'petr', '--remove', 'gone', '--remove', 'absent',
+            '--rename', 'old', 'new',
+        )
+        self.assertEqual(self.bot.calls.count('editMessageText'), 1)
+        self.assertEqual(len(result['added']), 2)
+        self.assertEqual(result['removed'], ['gone'])
+        self.assertEqual(result['renamed'], {'old': 'new'})
+        self.assertEqual(result['missing'], ['absent'])
+        self.assertEqual(sorted(result['accounts']), sorted(['new', *result['added']]))
+        self.assertEqual(self.manager.get_cookies('new'), [{'name': 'a', 'value': '1'}])
+
+    def test_reshard(self) -> None:
+        """Test that accounts of old shard list are moved, store without shards reports error."""
+        bot = FakeBot(json.dumps({'old': [{'name': 'a', 'value': '1'}], 'gone': []}), chat='w')
+        manager = MessageManager(bot=bot, cache_ttl=60, chats=['x', 'y'])
+        output = io.StringIO()
+        self.assertEqual(run(['--json', 'reshard', '--previous', 'w'], manager, output), 0)
+        result = json.loads(output.getvalue())
+        self.assertEqual(sorted(result['accounts']), ['gone', 'old'])
+        self.assertEqual(result['moved'], ['gone', 'old'])
+        with tempfile.TemporaryDirectory() as directory:
+            output = io.StringIO()
+            store = FileStore(os.path.join(directory, 'cookies.json'))
+            self.assertEqual(run(['--json', 'reshard', '--previous', 'x'], store, output), 1)
+        self.assertIn('error', json.loads(output.getvalue()))
+
+    def test_parse_batch(self) -> None:
+        """Test apply file lines."""
+        lines = ['add ivan  # new user', '', 'add', 'remove h1', 'rename h2 h3']
+        self.assertEqual(parse_batch(lines), (['ivan', ''], ['h1'], {'h2': 'h3'}))
+        with self.assertRaises(ValueError):
+            parse_batch(['delete h1'])
+
+
+class ExportImportTestCase(unittest.TestCase):
+    """Whole account set moves between stores."""
+
+    def test_roundtrip(self) -> None:
+        """Test export from telegram and import into file store with replace."""
+        manager = MessageManager(bot=FakeBot(json.dumps({'hash': [{'name': 'a', 'value': '1'}]})), cache_ttl=60)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'accounts.json')
+            self.assertEqual(run(['export', path], manager, io.StringIO()), 0)
+            store = FileStore(os.path.join(directory, 'cookies.json'))
+            output = io.StringIO()
+            self.assertEqual(run(['--json', 'import', path, '--replace'], store, output), 0)
+            self.assertEqual(store.get_cookies('hash'), [{'name': 'a', 'value': '1'}])
+        result = json.loads(output.getvalue())
+        self.assertEqual(result['removed'], ['test'])
+        self.assertEqual(result['accounts'], ['hash'])
+
+    def test_invalid_import(self) -> None:
+        """Test that error is reported with exit code."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'accounts.json')
+            with open(path, 'w', encoding='UTF-8') as import_file:
+                json.dump({'hash': 'not cookies'}, import_file)
+            output = io.StringIO()
+            self.assertEqual(run(['--json', 'import', path], FileStore(path + '.store'), output), 1)
+        self.assertIn('error', json.loads(output.getvalue()))
+
+
+class InitialErrorTestCase(unittest.TestCase):
+    """Interactive console start with unavailable store."""
+
+    def test_store_without_chat(self) -> None:
+        """Test that error of file or relay store is shown instead of telegram chat and token."""
+        with tempfile.TemporaryDirectory() as directory:
+            store = FileStore(os.path.join(directory, 'cookies.json'))
+            with mock.patch.object(Console, 'manager', store, create=True):
+                with mock.patch.object(store, 'accounts', side_effect=TelegramError('relay down')):
+                    with self.assertRaises(SystemExit) as error:
+                        Console.main()
+        self.assertIn('relay down', str(error.exception.code))
+
+
+if __name__ == '__main__':
+    unittest.main()
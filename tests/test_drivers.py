@@ -0,0 +1,56 @@
+"""Offline tests for driver path cache and startup timer."""
+
+import os
+import tempfile
+import unittest
+
+from src.diagnostics import StartupTimer
+from src.drivers import DriverCache
+
+
+class DriverCacheTestCase(unittest.TestCase):
+    """Driver cache file tests."""
+
+    def setUp(self) -> None:
+        """Create cache and fake driver in temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.driver_path = os.path.join(self.directory.name, 'chromedriver')
+        open(self.driver_path, 'w').close()
+        self.cache = DriverCache(os.path.join(self.directory.name, 'drivers.json'))
+
+    def tearDown(self) -> None:
+        """Remove temporary directory."""
+        self.directory.cleanup()
+
+    def test_put_get_drop(self) -> None:
+        """Test that paths survive new cache instance and can be dropped."""
+        self.assertIsNone(self.cache.get('Chrome'))
+        self.cache.put('Chrome', self.driver_path, '', '120.0')
+        entry = DriverCache(self.cache.path).get('Chrome')
+        self.assertEqual(entry, {'driver_path': self.driver_path, 'browser_path': '', 'version': '120.0'})
+        self.cache.drop('Chrome')
+        self.assertIsNone(self.cache.get('Chrome'))
+
+    def test_missing_driver_is_ignored(self) -> None:
+        """Test that removed driver file is not returned."""
+        self.cache.put('Chrome', self.driver_path, '', '120.0')
+        os.remove(self.driver_path)
+        self.assertIsNone(self.cache.get('Chrome'))
+
+    def test_disabled_cache(self) -> None:
+        """Test that cache without path keeps nothing."""
+        cache = DriverCache(None)
+        cache.put('Chrome', self.driver_path, '', '120.0')
+        self.assertIsNone(cache.get('Chrome'))
+
+
+class StartupTimerTestCase(unittest.TestCase):
+    """Startup phases report tests."""
+
+    def test_phases(self) -> None:
+        """Test that report has every phase and total."""
+        timer = StartupTimer()
+        timer.mark('imports')
+        timer.mark('driver')
+        lines = timer.text().splitlines()
+        self.assertEqual([line.split()[0] for line in lines], ['imports', 'driver', 'total'])
@@ -0,0 +1,71 @@
+"""Offline tests for browser cookie events."""
+
+import unittest
+from threading import Event
+from types import SimpleNamespace
+from typing import Any, List
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.bidi.network import NetworkEvent
+
+from src.events import CookieEvents
+
+
+class FakeConnection(object):
+    """Bidi websocket connection that records callbacks and commands."""
+
+    def __init__(self) -> None:
+        """Connection initial method."""
+        self.callbacks: List[Any] = []
+        self.commands: List[dict] = []
+
+    def add_callback(self, event: NetworkEvent, callback: Any) -> int:
+        """Remember event callback."""
+        self.callbacks.append((event.event_class, callback))
+        return id(callback)
+
+    def execute(self, command: Any) -> None:
+        """Remember command payload."""
+        self.commands.append(next(command))
+
+
+class NoBidiDriver(object):
+    """Driver without webSocketUrl capability."""
+
+    @property
+    def network(self) -> None:
+        """Raise like selenium does without bidi."""
+        raise WebDriverException('Unable to find url to connect to from capabilities')
+
+
+def response(*cookies: str) -> NetworkEvent:
+    """Create bidi response event with Set-Cookie headers."""
+    headers = [{'name': 'Content-Type', 'value': {'type': 'string', 'value': 'text/html'}}]
+    headers += [{'name': 'Set-Cookie', 'value': {'type': 'string', 'value': cookie}} for cookie in cookies]
+    return NetworkEvent('network.responseStarted', response={'url': 'https://office.reso.ru/', 'headers': headers})
+
+
+class CookieEventsTestCase(unittest.TestCase):
+    """Bidi subscription and Set-Cookie detection tests."""
+
+    def test_subscribes_and_reports_reso_cookies(self) -> None:
+        """Test that only reso session cookies trigger change and wake."""
+        connection = FakeConnection()
+        wake = Event()
+        events = CookieEvents.attach(SimpleNamespace(network=SimpleNamespace(conn=connection)), wake=wake)
+        self.assertIsNotNone(events)
+        self.assertEqual(connection.commands[0]['method'], 'session.subscribe')
+        (name, callback), = connection.callbacks
+        self.assertEqual(name, 'network.responseStarted')
+        events.read()
+        self.assertFalse(events.stale())
+        callback(response('_ga=1; path=/'))
+        self.assertFalse(events.changed.is_set())
+        callback(response('ResoOffice60=abc; path=/; HttpOnly'))
+        self.assertTrue(events.stale())
+        self.assertTrue(wake.is_set())
+        self.assertEqual(events.events, 1)
+
+    def test_driver_without_bidi(self) -> None:
+        """Test that polling fallback is used without bidi support."""
+        self.assertIsNone(CookieEvents.attach(NoBidiDriver()))
@@ -0,0 +1,144 @@
+"""Offline tests for cookie journal and rollback to the last known good session."""
+
+import os
+import tempfile
+import unittest
+
+from benchmarks.fake_reso import FakeResoServer
+from benchmarks.http_driver import make_browser_class
+from benchmarks.run import session_cookies
+from src.cookies import fingerprint
+from src.journal import CookieJournal
+from src.stores import FileStore, SnapshotStore
+
+
+class CookieJournalTestCase(unittest.TestCase):
+    """Journal file tests."""
+
+    def setUp(self) -> None:
+        """Create journal in temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'journal.jsonl')
+        self.journal = CookieJournal(self.path)
+
+    def tearDown(self) -> None:
+        """Remove temporary directory."""
+        self.directory.cleanup()
+
+    def test_last_good_version(self) -> None:
+        """Test that known outcome isn't written twice and the latest good version is found by other instance."""
+        first, second = session_cookies('a', '1'), session_cookies('a', '2')
+        self.journal.record('hash', first, True, origin='one')
+        size = os.path.getsize(self.path)
+        self.journal.record('hash', first, True, origin='two')
+        self.assertEqual(os.path.getsize(self.path), size)
+        self.journal.record('hash', second, None, origin='two')
+        other = CookieJournal(self.path)
+        self.assertEqual(fingerprint(other.last_good('hash')), fingerprint(first))
+        self.journal.record('hash', second, True)
+        self.journal.record('hash', first, False)
+        self.assertEqual([fingerprint(cookies) for cookies in other.candidates('hash')], [fingerprint(second)])
+        self.assertIsNone(other.last_good('hash', exclude=[fingerprint(second)]))
+        self.assertEqual([entry.origin for entry in other.history('hash')], ['one', 'two'])
+
+    def test_rotation_keeps_good_versions(self) -> None:
+        """Test that rotated journal stays small and still knows the last good version."""
+        journal = CookieJournal(self.path, max_size=1000)
+        good = session_cookies('good', 'x' * 100)
+        journal.record('hash', good, True)
+        for num in range(50):
+            journal.record('hash', session_cookies('bad', str(num)), False)
+        self.assertLess(os.path.getsize(self.path), 2000)
+        self.assertTrue(os.path.exists(journal.backup_path))
+        self.assertEqual(fingerprint(CookieJournal(self.path).last_good('hash')), fingerprint(good))
+
+
+class RollbackTestCase(unittest.TestCase):
+    """Browser rollback tests against fake office."""
+
+    def test_bad_store_cookies_are_rolled_back(self) -> None:
+        """Test that browser replaces broken store cookies with the last good version right on logout."""
+        with tempfile.TemporaryDirectory() as directory, FakeResoServer() as server:
+            store = FileStore(os.path.join(directory, 'cookies.json'))
+            store.add_account('hash')
+            good = session_cookies(*server.site.login())
+            store.set_cookies(good, 'hash')
+            journal = CookieJournal(os.path.join(directory, 'journal.jsonl'))
+            browser_class = make_browser_class(
+                server.url, store, SnapshotStore(os.path.join(directory, 'snapshot.json')), ['hash'], journal=journal,
+            )
+            with browser_class('hash') as browser:
+                browser.open_session()
+                self.assertTrue(browser.tick())
+                self.assertEqual(fingerprint(journal.last_good('hash')), fingerprint(good))
+                # другой клиент опубликовал куки, которые сервер не принимает
+                store.set_cookies(session_cookies('broken', 'broken'), 'hash')
+                browser.tick()
+                browser.tick()
+                self.assertFalse(browser.need_to_set_telegram_cookies)
+                self.assertEqual(fingerprint(store.get_cookies('hash')), fingerprint(good))
+                self.assertTrue(browser.tick())
+            self.assertEqual(journal.candidates('hash', exclude=[fingerprint(good)]), [])
+
+    def test_only_lease_holder_rolls_back(self) -> None:
+        """Test that follower waits for rollback of lease holder and adopts it, lease doesn't change hands."""
+        with tempfile.TemporaryDirectory() as directory, FakeResoServer() as server:
+            store = FileStore(os.path.join(directory, 'cookies.json'))
+            store.add_account('hash')
+            good = session_cookies(*server.site.login())
+            store.set_cookies(good, 'hash')
+            journal = CookieJournal(os.path.join(directory, 'journal.jsonl'))
+            browsers = [
+                make_browser_class(
+                    server.url, store, SnapshotStore(os.path.join(directory, '{num}.json'.format(num=num))), ['hash'],
+                    journal=journal,
+                )('hash')
+                for num in range(2)
+            ]
+            leader, follower = browsers
+            for browser in browsers:
+                browser.open_session()
+                browser.tick()
+            store.acquire_lease('hash', leader.owner, 100)
+            broken = session_cookies('broken', 'broken')
+            store.set_cookies(broken, 'hash')
+            # оба клиента перенимают неверные куки и видят выход
+            for browser in (follower, leader, follower):
+                browser.tick()
+            self.assertEqual(fingerprint(store.get_cookies('hash')), fingerprint(broken))
+            self.assertTrue(follower.need_to_set_telegram_cookies)
+            leader.tick()
+            self.assertEqual(fingerprint(store.get_cookies('hash')), fingerprint(good))
+            self.assertEqual(store.lease('hash')[0], leader.owner)
+            follower.tick()
+            self.assertFalse(follower.need_to_set_telegram_cookies)
+            self.assertEqual(fingerprint(follower.last_cookies), fingerprint(good))
+            self.assertEqual(store.lease('hash')[0], leader.owner)
+            for browser in browsers:
+                browser.quit()
+
+    def test_adopted_cookies_are_not_confirmed(self) -> None:
+        """Test that cookies taken from store aren't recorded as good before browser checks them."""
+        with tempfile.TemporaryDirectory() as directory, FakeResoServer() as server:
+            store = FileStore(os.path.join(directory, 'cookies.json'))
+            store.add_account('hash')
+            store.set_cookies(session_cookies(*server.site.login()), 'hash')
+            journal = CookieJournal(os.path.join(directory, 'journal.jsonl'))
+            browser_class = make_browser_class(
+                server.url, store, SnapshotStore(os.path.join(directory, 'snapshot.json')), ['hash'], journal=journal,
+            )
+            unchecked = session_cookies('never', 'validated')
+            with browser_class('hash') as browser:
+                browser.open_session()
+                self.assertTrue(browser.tick())
+                store.set_cookies(unchecked, 'hash')
+                # браузер залогинен и вставляет себе чужие куки
+                self.assertFalse(browser.tick())
+                self.assertEqual(fingerprint(browser.last_cookies), fingerprint(unchecked))
+            versions = {entry.fingerprint: entry.valid for entry in journal.history('hash')}
+            self.assertIn(fingerprint(unchecked), versions)
+            self.assertIsNot(versions[fingerprint(unchecked)], True)
+
+
+if __name__ == '__main__':
+    unittest.main()
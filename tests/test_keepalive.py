@@ -0,0 +1,102 @@
+"""Offline tests for session keep-alive against fake office site."""
+
+import os
+import tempfile
+import time
+import unittest
+
+from benchmarks.fake_reso import FakeResoServer
+from src.choiches import CookieFields
+from src.keepalive import SessionKeeper
+from src.probe import SessionProbe
+from src.stores import FileStore
+
+
+class SessionKeeperTestCase(unittest.TestCase):
+    """Keep-alive worker tests."""
+
+    def setUp(self) -> None:
+        """Start fake site and create store with logged in account."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = FakeResoServer().__enter__()
+        self.store = FileStore(os.path.join(self.directory.name, 'cookies.json'))
+        self.session, office = self.server.site.login()
+        self.store.add_account('hash')
+        self.store.set_cookies([
+            {'name': CookieFields.aspnet, 'value': self.session, 'path': '/'},
+            {'name': CookieFields.reso_office60, 'value': office, 'path': '/'},
+        ], 'hash')
+        probe = SessionProbe(cache_time=0, url=self.server.url)
+        self.keeper = SessionKeeper(self.store, probe, hashes=['hash'], min_interval=10, max_interval=100)
+
+    def tearDown(self) -> None:
+        """Stop fake site and remove temporary directory."""
+        self.server.__exit__()
+        self.directory.cleanup()
+
+    def test_rotation_is_published(self) -> None:
+        """Test that cookie issued by server replaces the old one in store and interval grows."""
+        self.server.site.rotate(self.session)
+        self.assertTrue(self.keeper.touch('hash'))
+        cookies = {cookie['name']: cookie['value'] for cookie in self.store.get_cookies('hash')}
+        self.assertEqual(cookies[CookieFields.reso_office60], self.server.site.sessions[self.session])
+        self.assertEqual(self.keeper.states['hash'].rotations, 1)
+        self.assertTrue(self.keeper.touch('hash'))
+        self.assertEqual(self.keeper.states['hash'].rotations, 1)
+        self.assertGreater(self.keeper.states['hash'].interval, 10)
+
+    def test_expired_session_shortens_interval(self) -> None:
+        """Test that pause which killed session lowers interval and dead session isn't touched again."""
+        self.assertTrue(self.keeper.touch('hash'))
+        state = self.keeper.states['hash']
+        state.last_ok = time.monotonic() - 60
+        self.server.site.logout(self.session)
+        self.assertFalse(self.keeper.touch('hash'))
+        self.assertAlmostEqual(state.interval, 30, delta=1)
+        self.assertLessEqual(state.idle_limit, 61)
+        requests = self.server.site.requests
+        self.assertIsNone(self.keeper.touch('hash'))
+        self.assertEqual(self.server.site.requests, requests)
+        # новый вход человека снова включает касания, интервал ограничен выученным пределом
+        session, office = self.server.site.login()
+        self.store.set_cookies([
+            {'name': CookieFields.aspnet, 'value': session},
+            {'name': CookieFields.reso_office60, 'value': office},
+        ], 'hash')
+        self.assertTrue(self.keeper.touch('hash'))
+        self.assertLessEqual(state.interval, state.idle_limit * SessionKeeper.safety)
+
+    def test_expiration_backs_off_to_working_interval(self) -> None:
+        """Test that after expiration interval returns to the last surviving pause and doesn't grow past it."""
+        self.assertTrue(self.keeper.touch('hash'))
+        state = self.keeper.states['hash']
+        state.last_ok = time.monotonic() - 40
+        self.assertTrue(self.keeper.touch('hash'))
+        self.assertAlmostEqual(state.worked, 40, delta=1)
+        state.last_ok = time.monotonic() - 90
+        self.server.site.logout(self.session)
+        self.assertFalse(self.keeper.touch('hash'))
+        self.assertAlmostEqual(state.interval, 45, delta=1)
+        session, office = self.server.site.login()
+        self.store.set_cookies([
+            {'name': CookieFields.aspnet, 'value': session},
+            {'name': CookieFields.reso_office60, 'value': office},
+        ], 'hash')
+        for _ in range(3):
+            self.assertTrue(self.keeper.touch('hash'))
+            self.assertLessEqual(state.interval, 45 + 1)
+
+    def test_rotation_respects_lease(self) -> None:
+        """Test that keeper leaves session held by other client and publishes rotated cookies under lease."""
+        self.assertTrue(self.store.acquire_lease('hash', 'browser', 60))
+        self.server.site.rotate(self.session)
+        requests = self.server.site.requests
+        self.assertIsNone(self.keeper.touch('hash'))
+        self.assertEqual(self.server.site.requests, requests)
+        self.store.release_lease('hash', 'browser')
+        self.assertTrue(self.keeper.touch('hash'))
+        self.assertEqual(self.keeper.states['hash'].rotations, 1)
+        self.assertEqual(self.store.lease('hash')[0], self.keeper.owner)
+
+if __name__ == '__main__':
+    unittest.main()
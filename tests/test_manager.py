@@ -0,0 +1,214 @@
+"""Offline tests for pinned message manager."""
+
+import json
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from unittest import mock
+
+from telebot.apihelper import ApiTelegramException
+
+from src import codec
+from src.exceptions import InvalidBotToken, MessageTooLong
+from src.manager import MessageManager
+from src.settings import PAYLOAD_PACKING, TELEGRAM_MSG_LIMIT
+from tests.fakes import FakeBot
+
+
+def api_error(code: int, retry_after: Optional[int] = None) -> ApiTelegramException:
+    """Build telegram api error like telebot raises it."""
+    result_json = {'ok': False, 'error_code': code, 'description': 'error {code}'.format(code=code)}
+    if retry_after is not None:
+        result_json['parameters'] = {'retry_after': retry_after}
+    return ApiTelegramException('getChat', None, result_json)
+
+
+class PinnedCacheTestCase(unittest.TestCase):
+    """Pinned message cache tests with fake bot."""
+
+    def setUp(self) -> None:
+        """Create manager with fake pinned message."""
+        self.bot = FakeBot(json.dumps({'hash': [{'name': 'a', 'value': '1'}]}))
+        self.manager = MessageManager(bot=self.bot, cache_ttl=60)
+
+    def test_reads_served_from_cache(self) -> None:
+        """Test that only the first read goes to telegram."""
+        for _ in range(5):
+            self.assertEqual(self.manager.get_cookies('hash'), [{'name': 'a', 'value': '1'}])
+        self.assertEqual(self.bot.calls, ['getChat'])
+        self.assertEqual((self.manager.cache.hits, self.manager.cache.misses), (4, 1))
+
+    def test_write_updates_cache(self) -> None:
+        """Test that own edit is visible without new getChat."""
+        self.manager.get_cookies('hash')
+        self.manager.set_cookies([{'name': 'b', 'value': '2'}], 'hash')
+        self.bot.calls.clear()
+        self.assertEqual(self.manager.get_cookies('hash'), [{'name': 'b', 'value': '2'}])
+        self.assertEqual(self.bot.calls, [])
+
+    def test_same_session_is_not_written(self) -> None:
+        """Test that cookies differing only in order and browser fields are not written."""
+        self.manager.set_cookies([{'name': 'a', 'value': '1', 'path': '/', 'expiry': 1}], 'hash')
+        self.assertNotIn('editMessageText', self.bot.calls)
+        self.assertEqual(self.manager.avoided_writes, 1)
+
+    def test_expired_cache_keeps_unchanged_payload(self) -> None:
+        """Test that unchanged message is not parsed again after ttl."""
+        self.manager.get_cookies('hash')
+        payload = self.manager.cache.payload
+        self.manager.cache.invalidate()
+        self.manager.get_cookies('hash')
+        self.assertIs(self.manager.cache.payload, payload)
+        self.assertEqual(self.manager.cache.misses, 2)
+
+    def test_rate_limit_is_retried(self) -> None:
+        """Test that 429 on read waits retry_after and repeats, only bad token or chat is InvalidBotToken."""
+        self.bot.errors.append(api_error(429, retry_after=3))
+        with mock.patch('src.handlers.time.sleep') as sleep:
+            self.assertEqual(self.manager.get_cookies('hash'), [{'name': 'a', 'value': '1'}])
+        self.assertEqual(self.bot.calls, ['getChat', 'getChat'])
+        # time общий для модулей, задержка фейкового бота тоже попадает в вызовы
+        self.assertGreaterEqual(max(call[0][0] for call in sleep.call_args_list), 3)
+        self.manager.cache.invalidate()
+        self.bot.errors.append(api_error(401))
+        with self.assertRaises(InvalidBotToken):
+            self.manager.load()
+
+    def test_sessions_share_one_read(self) -> None:
+        """Test that concurrent sessions of one process make one telegram read."""
+        self.bot.delay = 0.05
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            results = list(pool.map(self.manager.get_cookies, ['hash'] * 10))
+        self.assertEqual(len(results), 10)
+        self.assertEqual(self.bot.calls, ['getChat'])
+
+
+class ConcurrentWriteTestCase(unittest.TestCase):
+    """Optimistic writes of several clients to one pinned message."""
+
+    def setUp(self) -> None:
+        """Create two clients with their own caches on one chat."""
+        self.bot = FakeBot(json.dumps({'first': [], 'second': []}))
+        self.first = MessageManager(bot=self.bot, cache_ttl=60)
+        self.second = MessageManager(bot=self.bot, cache_ttl=60)
+
+    def test_stale_client_does_not_lose_update(self) -> None:
+        """Test that write based on stale cache keeps changes of another client."""
+        self.first.get_cookies('first')
+        self.second.set_cookies([{'name': 'b', 'value': '2'}], 'second')
+        self.first.set_cookies([{'name': 'a', 'value': '1'}], 'first')
+        payload = codec.loads(self.bot.text())
+        self.assertEqual(payload['first'][0]['value'], '1')
+        self.assertEqual(payload['second'][0]['value'], '2')
+        self.assertEqual(payload['_rev'], 2)
+        self.assertEqual(self.first.conflicts, 1)
+
+    def test_removed_account_is_not_restored(self) -> None:
+        """Test that cookies rotation of removed account does not add it back."""
+        self.second.remove_account('second')
+        self.first.set_cookies([], 'second')
+        self.assertNotIn('second', codec.loads(self.bot.text()))
+
+    def test_pending_cookies_are_coalesced(self) -> None:
+        """Test that cookies of sessions waiting for write go out with one edit."""
+        self.first.get_cookies('first')
+        self.bot.delay = 0.05
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            for num in range(4):
+                hsh = 'first' if num % 2 else 'second'
+                pool.submit(self.first.set_cookies, [{'name': 'a', 'value': str(num)}], hsh)
+        self.assertLess(self.bot.calls.count('editMessageText'), 4)
+        self.assertGreater(self.first.coalesced, 0)
+
+
+class ShardingTestCase(unittest.TestCase):
+    """Compact payload and sharding tests."""
+
+    def setUp(self) -> None:
+        """Create manager with three shard chats and one account in every shard."""
+        self.bot = FakeBot()
+        self.manager = MessageManager(bot=self.bot, cache_ttl=60, chats=['a', 'b', 'c'])
+        self.manager.reinit()
+        self.hashes = {}
+        for num in range(30):
+            self.hashes.setdefault(self.manager.chat_for(str(num)), str(num))
+        for hsh in self.hashes.values():
+            self.manager.add_account(hsh)
+
+    def test_compact_roundtrip(self) -> None:
+        """Test that compact text is shorter and decodes to the same cookies."""
+        sample = self.manager.message_sample
+        for pack in (False, True):
+            text = codec.dumps(sample, pack)
+            self.assertLess(len(text), len(json.dumps(sample)))
+            self.assertEqual(codec.loads(text), sample)
+        self.assertEqual(codec.loads(json.dumps(sample)), sample)
+
+    def test_read_touches_one_shard(self) -> None:
+        """Test that getting cookies of hash reads only pinned message of its shard."""
+        self.manager.refresh()
+        for cache in self.manager.caches.values():
+            cache.invalidate()
+        self.bot.calls.clear()
+        hsh = self.hashes['b']
+        self.manager.get_cookies(hsh)
+        self.assertEqual(self.bot.calls, ['getChat'])
+        self.assertIn(hsh, codec.loads(self.bot.text('b')))
+        self.assertEqual(sorted(self.manager.accounts()), sorted(['test', *self.hashes.values()]))
+
+    def test_lease_lives_in_hash_shard(self) -> None:
+        """Test that lease and cookies go to shard of hash with one edit, renewal costs nothing."""
+        hsh = self.hashes['c']
+        self.bot.calls.clear()
+        self.assertTrue(self.manager.acquire_lease(hsh, 'leader', 60, cookies=[{'name': 'a', 'value': '1'}]))
+        self.assertEqual(self.bot.calls.count('editMessageText'), 1)
+        self.assertEqual(codec.loads(self.bot.text('c'))['_lease'][hsh][0], 'leader')
+        self.assertNotIn('_lease', codec.loads(self.bot.text('a')))
+        self.bot.calls.clear()
+        self.assertTrue(self.manager.acquire_lease(hsh, 'leader', 60))
+        self.assertFalse(self.manager.acquire_lease(hsh, 'follower', 60, cookies=[]))
+        self.assertNotIn('editMessageText', self.bot.calls)
+
+    def test_reshard_moves_accounts(self) -> None:
+        """Test that changed shard list keeps every account and lease, dropped chat is emptied."""
+        hsh = self.hashes['c']
+        self.manager.acquire_lease(hsh, 'leader', 60)
+        hashes = ['test', *self.hashes.values()]
+        manager = MessageManager(bot=self.bot, cache_ttl=60, chats=['a', 'd'])
+        moved = manager.reshard(['a', 'b', 'c'])
+        self.assertEqual(sorted(manager.accounts()), sorted(hashes))
+        self.assertEqual(moved, sorted(
+            account for account in hashes if manager.placement(account, ['a', 'b', 'c']) != manager.chat_for(account)
+        ))
+        self.assertTrue(moved)
+        for account in hashes:
+            self.assertEqual(manager.get_cookies(account), self.manager.get_cookies(account))
+        self.assertEqual(manager.lease(hsh)[0], 'leader')
+        self.assertEqual(list(codec.loads(self.bot.text('c'))), ['_rev'])
+        self.assertEqual(sorted(self.manager.caches), ['a', 'b', 'c'])
+        self.assertEqual(sorted(manager.caches), ['a', 'd'])
+        # повторный запуск ничего не переносит и не правит
+        self.bot.calls.clear()
+        self.assertEqual(manager.reshard(['a', 'b', 'c']), moved)
+        self.assertNotIn('editMessageText', self.bot.calls)
+
+    def test_too_long_edit_is_not_sent(self) -> None:
+        """Test that size is checked on the text with revision and no shard is edited if one doesn't fit."""
+        small, big = self.hashes['a'], self.hashes['b']
+        payload = self.manager.export_accounts()
+        payload[small] = [{'name': 'a', 'value': '1'}]
+        shard = {hsh: cookies for hsh, cookies in payload.items() if self.manager.chat_for(hsh) == 'b'}
+        value = ''
+        # без ревизии текст ровно на символ короче предела
+        while len(codec.dumps(shard, PAYLOAD_PACKING)) < TELEGRAM_MSG_LIMIT - 1:
+            value += '0123456789abcdef'[len(value) % 16]
+            shard[big] = payload[big] = [{'name': 'a', 'value': value}]
+        self.assertEqual(len(codec.dumps(shard, PAYLOAD_PACKING)), TELEGRAM_MSG_LIMIT - 1)
+        self.bot.calls.clear()
+        with self.assertRaises(MessageTooLong):
+            self.manager.import_accounts(payload)
+        self.assertNotIn('editMessageText', self.bot.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Offline tests for metrics registry and telegram call instrumentation."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from telebot.apihelper import ApiTelegramException
+
+from src.bot import RateLimitedBot, TokenBucket
+from src.metrics import Metrics, MetricsExporter, metrics
+from tests.fakes import FakeBot
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Registry formatting tests."""
+
+    def test_prometheus_text(self) -> None:
+        """Test counters and cumulative histogram buckets."""
+        registry = Metrics()
+        registry.describe('calls_total', 'Calls.')
+        registry.inc('calls_total', method='get_chat')
+        registry.inc('calls_total', method='get_chat')
+        registry.observe('tick_seconds', 0.02)
+        registry.observe('tick_seconds', 3.0)
+        text = registry.prometheus()
+        self.assertIn('# HELP calls_total Calls.', text)
+        self.assertIn('calls_total{method="get_chat"} 2.0', text)
+        self.assertIn('tick_seconds_bucket{le="0.025"} 1', text)
+        self.assertIn('tick_seconds_bucket{le="5.0"} 2', text)
+        self.assertIn('tick_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn('tick_seconds_count 2', text)
+
+    def test_json_log_line(self) -> None:
+        """Test that exporter appends json line with snapshot."""
+        registry = Metrics()
+        registry.inc('events_total', event='rotation')
+        with tempfile.TemporaryDirectory() as directory:
+            log_path = os.path.join(directory, 'metrics.jsonl')
+            exporter = MetricsExporter(registry, path=os.path.join(directory, 'reso.prom'), log_path=log_path)
+            exporter.export()
+            exporter.export()
+            with open(log_path, encoding='UTF-8') as log_file:
+                lines = log_file.read().splitlines()
+            self.assertEqual(len(lines), 2)
+            self.assertEqual(json.loads(lines[0])['metrics']['events_total'], {'event=rotation': 1.0})
+            self.assertTrue(os.path.exists(os.path.join(directory, 'reso.prom')))
+
+
+class FailingBot(FakeBot):
+    """Bot that answers get_chat with api error."""
+
+    def get_chat(self, chat_id: str) -> None:
+        """Raise too many requests."""
+        raise ApiTelegramException('getChat', None, {'error_code': 429, 'description': 'Too Many Requests'})
+
+
+class TelegramCallsTestCase(unittest.TestCase):
+    """Telegram calls are counted by method and outcome."""
+
+    def setUp(self) -> None:
+        """Clean global registry."""
+        metrics.reset()
+
+    def test_outcomes(self) -> None:
+        """Test ok and api error outcomes."""
+        bot = RateLimitedBot(FakeBot(), TokenBucket(rate=1000, capacity=1000))
+        bot.get_chat('chat')
+        with self.assertRaises(ApiTelegramException):
+            RateLimitedBot(FailingBot(), TokenBucket(rate=1000, capacity=1000)).get_chat('chat')
+        calls = metrics.snapshot()['reso_telegram_calls_total']
+        self.assertEqual(calls['method=get_chat,outcome=ok'], 1.0)
+        self.assertEqual(calls['method=get_chat,outcome=429'], 1.0)
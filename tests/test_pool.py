@@ -0,0 +1,101 @@
+"""Offline tests for standby driver pool and supervised crash handling."""
+
+import unittest
+from types import SimpleNamespace
+from typing import List, Optional
+from unittest import mock
+
+from selenium.common.exceptions import UnexpectedAlertPresentException, WebDriverException
+
+from src.exceptions import DriverCrashed
+from src.handlers import RECOVERY_DELAY, exception_run_handler
+from src.pool import DriverPool
+
+
+class FakeDriver(object):
+    """Browser stand-in that records warm and quit calls."""
+
+    created: List['FakeDriver'] = []
+
+    def __init__(self, hsh: Optional[str] = None) -> None:
+        """Driver initial method."""
+        self.hash = hsh
+        self.warmed = False
+        self.quit_calls = 0
+        self.supervised = False
+        FakeDriver.created.append(self)
+
+    def warm(self) -> None:
+        """Pretend to open reso domain."""
+        self.warmed = True
+
+    def quit(self) -> None:
+        """Pretend to close browser."""
+        self.quit_calls += 1
+
+    @exception_run_handler
+    def run(self) -> None:
+        """Crash like dead driver."""
+        raise WebDriverException('chrome not reachable')
+
+
+class DriverPoolTestCase(unittest.TestCase):
+    """Standby browser tests."""
+
+    def setUp(self) -> None:
+        """Forget created drivers."""
+        FakeDriver.created = []
+
+    def test_standby_is_taken_and_replenished(self) -> None:
+        """Test that warm standby is used and the next one is prepared."""
+        pool = DriverPool(FakeDriver, standby=True)
+        pool.start()
+        pool._warming.join()
+        driver = pool.take('hash')
+        self.assertTrue(driver.warmed)
+        self.assertEqual((pool.warm_starts, pool.cold_starts), (1, 0))
+        pool._warming.join()
+        pool.close()
+        self.assertEqual(len(FakeDriver.created), 2)
+        self.assertEqual(FakeDriver.created[1].quit_calls, 1)
+
+    def test_without_standby(self) -> None:
+        """Test that browser is created on demand."""
+        pool = DriverPool(FakeDriver)
+        driver = pool.take('hash')
+        self.assertEqual(driver.hash, 'hash')
+        self.assertFalse(driver.warmed)
+        self.assertEqual(pool.cold_starts, 1)
+
+
+class SupervisedHandlerTestCase(unittest.TestCase):
+    """Crash handling of run decorator."""
+
+    def test_supervised_driver_raises(self) -> None:
+        """Test that supervised driver crash is reported instead of program exit."""
+        driver = FakeDriver()
+        driver.supervised = True
+        with self.assertRaises(DriverCrashed):
+            driver.run()
+        self.assertEqual(driver.quit_calls, 1)
+
+    def test_unsupervised_driver_exits(self) -> None:
+        """Test that usual driver finishes program as before."""
+        with self.assertRaises(SystemExit):
+            FakeDriver().run()
+
+    def test_recoverable_error_is_retried_quickly(self) -> None:
+        """Test that js alert is retried after short fixed pause, not after error backoff."""
+        errors = [UnexpectedAlertPresentException('alert')]
+
+        @exception_run_handler
+        def tick(driver: SimpleNamespace) -> bool:
+            if errors:
+                raise errors.pop()
+            return True
+
+        driver = SimpleNamespace(scheduler=mock.Mock())
+        with mock.patch('src.handlers.time.sleep') as sleep:
+            self.assertTrue(tick(driver))
+        sleep.assert_called_once_with(RECOVERY_DELAY)
+        driver.scheduler.failure.assert_not_called()
@@ -0,0 +1,63 @@
+"""Offline tests for http session probe against fake office site."""
+
+import socket
+import unittest
+
+from benchmarks.fake_reso import FakeResoServer
+from benchmarks.run import session_cookies
+from src.probe import SessionProbe
+
+
+class SessionProbeTestCase(unittest.TestCase):
+    """Session check by plain http request."""
+
+    def setUp(self) -> None:
+        """Start fake site with logged in session."""
+        self.server = FakeResoServer().__enter__()
+        self.cookies = session_cookies(*self.server.site.login())
+        self.probe = SessionProbe(url=self.server.url)
+
+    def tearDown(self) -> None:
+        """Stop fake site."""
+        self.server.__exit__()
+
+    def test_result_is_cached(self) -> None:
+        """Test that the same cookies are checked by one request while cache time lasts."""
+        for _ in range(3):
+            self.assertTrue(self.probe.check(self.cookies))
+        self.assertEqual(self.server.site.requests, 1)
+        self.assertEqual((self.probe.requests, self.probe.hits), (1, 2))
+        # касание идет мимо кэша, а истекший результат запрашивается заново
+        self.probe.touch(self.cookies)
+        self.probe.cache_time = 0
+        self.probe.touch(self.cookies)
+        self.assertTrue(self.probe.check(self.cookies))
+        self.assertEqual(self.server.site.requests, 4)
+
+    def test_login_page_means_logged_out(self) -> None:
+        """Test that page with password field is recognized as login page."""
+        self.assertFalse(self.probe.check(session_cookies('unknown', 'session')))
+        self.server.site.logout(self.cookies[0]['value'])
+        self.assertFalse(SessionProbe(url=self.server.url).check(self.cookies))
+
+    def test_server_error_is_unknown(self) -> None:
+        """Test that 5xx answer isn't treated as logout and isn't cached."""
+        self.server.site.status = 503
+        self.assertIsNone(self.probe.check(self.cookies))
+        self.assertEqual(self.probe.touch(self.cookies), (None, {}))
+        self.server.site.status = 200
+        self.assertTrue(self.probe.check(self.cookies))
+
+    def test_network_error_is_unknown(self) -> None:
+        """Test that unreachable site and empty cookies give None."""
+        with socket.socket() as closed:
+            closed.bind(('127.0.0.1', 0))
+            url = 'http://127.0.0.1:{port}/'.format(port=closed.getsockname()[1])
+        probe = SessionProbe(url=url)
+        self.assertIsNone(probe.check(self.cookies))
+        self.assertEqual(probe.requests, 0)
+        self.assertIsNone(self.probe.check([]))
+
+
+if __name__ == '__main__':
+    unittest.main()
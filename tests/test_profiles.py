@@ -0,0 +1,56 @@
+"""Offline tests for lightweight browser profile."""
+
+import unittest
+
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.webdriver.firefox.options import Options as FirefoxOptions
+
+from src.profiles import BrowserProfile
+
+
+class FakeChromium(object):
+    """Driver that records devtools commands."""
+
+    def __init__(self) -> None:
+        """Driver initial method."""
+        self.commands = []
+
+    def execute_cdp_cmd(self, cmd: str, cmd_args: dict) -> dict:
+        """Remember command."""
+        self.commands.append((cmd, cmd_args))
+        return {}
+
+
+class BrowserProfileTestCase(unittest.TestCase):
+    """Profile options for firefox and chromium browsers."""
+
+    profile = BrowserProfile(headless=True, block=('images', 'fonts'), cache_size=16, disable_background=True)
+
+    def test_firefox(self) -> None:
+        """Test that firefox gets preferences."""
+        options = FirefoxOptions()
+        self.profile.apply(options)
+        self.assertIn('-headless', options.arguments)
+        self.assertEqual(options.preferences['permissions.default.image'], 2)
+        self.assertFalse(options.preferences['gfx.downloadable_fonts.enabled'])
+        self.assertEqual(options.preferences['browser.cache.disk.capacity'], 16 * 1024)
+        self.assertFalse(options.preferences['app.update.auto'])
+
+    def test_chromium(self) -> None:
+        """Test that chromium gets arguments and blocked urls."""
+        options = ChromeOptions()
+        self.profile.apply(options)
+        self.assertIn('--headless=new', options.arguments)
+        self.assertIn('--blink-settings=imagesEnabled=false', options.arguments)
+        self.assertIn('--disk-cache-size={size}'.format(size=16 * 1024 * 1024), options.arguments)
+        self.assertIn('--disable-background-networking', options.arguments)
+        driver = FakeChromium()
+        self.profile.apply_to_driver(driver)
+        self.assertEqual(driver.commands[-1][0], 'Network.setBlockedURLs')
+        self.assertIn('*.woff2', driver.commands[-1][1]['urls'])
+
+    def test_default_profile_changes_nothing(self) -> None:
+        """Test that usual browser keeps its options."""
+        options = ChromeOptions()
+        BrowserProfile().apply(options)
+        self.assertEqual(options.arguments, [])
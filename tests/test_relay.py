@@ -0,0 +1,209 @@
+"""Offline tests for local cookie relay."""
+
+import os
+import tempfile
+import time
+import unittest
+from http.server import ThreadingHTTPServer
+from threading import Thread
+from unittest import mock
+
+from requests import Timeout
+
+from benchmarks.fake_reso import FakeResoServer
+from benchmarks.http_driver import make_browser_class
+from benchmarks.run import session_cookies
+from src.config import INI_FILENAME, get_ini_options, get_store
+from src.exceptions import InvalidHash, InvalidIniValueError, InvalidRelayToken, TelegramError
+from src.relay import Relay, RelayHandler, RelayStore, apply_patch, make_patch, patch_hashes
+from src.stores import LEASE_FIELD, FileStore, SnapshotStore
+
+
+class RelayTestCase(unittest.TestCase):
+    """Relay server and client tests with file store upstream."""
+
+    def setUp(self) -> None:
+        """Run relay on free local port."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.upstream = FileStore(os.path.join(self.directory.name, 'cookies.json'))
+        self.relay = Relay(self.upstream)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RelayHandler)
+        self.server.daemon_threads = True
+        self.server.relay = self.relay  # type: ignore
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.store = RelayStore('http://127.0.0.1:{port}/'.format(port=self.server.server_address[1]))
+        self.store.long_poll = 1.0
+
+    def tearDown(self) -> None:
+        """Stop relay and remove temporary directory."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def test_get_and_set(self) -> None:
+        """Test that cookies pass through relay to upstream store."""
+        self.store.add_account('hash')
+        self.store.set_cookies([{'name': 'a', 'value': '1'}], 'hash')
+        self.assertEqual(self.upstream.get_cookies('hash'), [{'name': 'a', 'value': '1'}])
+        self.assertEqual(self.store.get_cookies('hash'), [{'name': 'a', 'value': '1'}])
+        self.assertEqual(sorted(self.store.accounts()), ['hash', 'test'])
+        self.store.remove_account('hash')
+        with self.assertRaises(InvalidHash):
+            self.store.get_cookies('hash')
+
+    def test_update_sends_only_difference(self) -> None:
+        """Test that client update is applied as patch of changed keys."""
+        self.store.add_account('hash')
+        self.store.update(lambda payload: payload.pop('test'))
+        self.assertEqual(self.upstream.accounts(), ['hash'])
+
+    def test_leases_of_different_hashes(self) -> None:
+        """Test that concurrent leases of different hashes through relay don't erase each other."""
+        for hsh in ('a', 'b'):
+            self.store.add_account(hsh)
+        other = RelayStore(self.store.url)
+        threads = [
+            Thread(target=client.acquire_lease, args=(hsh, hsh + '-owner', 60))
+            for client, hsh in ((self.store, 'a'), (other, 'b'))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.upstream.lease('a')[0], 'a-owner')
+        self.assertEqual(other.lease('b')[0], 'b-owner')
+        self.assertFalse(other.acquire_lease('a', 'b-owner', 60))
+        self.store.release_lease('a', 'a-owner')
+        self.assertIsNone(self.store.lease('a'))
+        self.assertEqual(self.upstream.lease('b')[0], 'b-owner')
+
+    def test_patch_keeps_other_reserved_hashes(self) -> None:
+        """Test that patch made from stale payload changes only its own hash of reserved dictionary."""
+        old = {'a': [], '_lease': {'a': ['x', 1]}}
+        patch = make_patch(old, {'a': [], '_lease': {}})
+        self.assertEqual(patch_hashes(patch), ['a'])
+        payload = {'a': [], 'b': [], '_lease': {'a': ['x', 1], 'b': ['y', 2]}}
+        apply_patch(patch)(payload)
+        self.assertEqual(payload['_lease'], {'b': ['y', 2]})
+
+    def test_patch_does_not_restore_removed_account(self) -> None:
+        """Test that stale client change of account removed meanwhile doesn't bring it back, new ones are added."""
+        self.store.add_account('hash')
+        self.upstream.add_account('gone')
+
+        def changes(payload: dict) -> None:
+            self.upstream.remove_account('gone')
+            payload['gone'] = [{'name': 'a', 'value': '1'}]
+            payload['hash'] = [{'name': 'a', 'value': '2'}]
+            payload['new'] = []
+            payload.setdefault(LEASE_FIELD, {})['gone'] = ['owner', time.time() + 60]
+
+        self.store.update(changes)
+        self.assertEqual(sorted(self.upstream.accounts()), ['hash', 'new', 'test'])
+        self.assertEqual(self.upstream.get_cookies('hash'), [{'name': 'a', 'value': '2'}])
+        self.assertIsNone(self.upstream.lease('gone'))
+
+    def test_timeout_is_retried(self) -> None:
+        """Test that relay timeouts are retried and final error names relay instead of telegram."""
+        response = self.store.session.request('GET', self.store.url + '/accounts', timeout=5)
+        with mock.patch('src.handlers.time.sleep'):
+            with mock.patch.object(self.store.session, 'request', side_effect=[Timeout(), response]):
+                self.assertEqual(self.store.accounts(), ['test'])
+            with mock.patch.object(self.store.session, 'request', side_effect=Timeout()):
+                with self.assertRaises(TelegramError) as error:
+                    self.store.accounts()
+        self.assertIn(self.store.store_name, str(error.exception))
+        self.assertNotIn('Telegram', str(error.exception))
+
+    def test_idle_leader_does_not_write(self) -> None:
+        """Test that idle ticks don't renew lease, expired lease is taken by the next publisher."""
+        with FakeResoServer() as server:
+            self.upstream.add_account('hash')
+            self.upstream.set_cookies(session_cookies(*server.site.login()), 'hash')
+            snapshot = SnapshotStore(os.path.join(self.directory.name, 'snapshot.json'))
+            browser_class = make_browser_class(server.url, self.store, snapshot, ['hash'])
+            with browser_class('hash') as browser:
+                browser.open_session()
+                self.assertTrue(browser.tick())
+                expiry = round(time.time() + 30)
+                self.upstream.update(lambda payload: payload.setdefault(LEASE_FIELD, {}).update(
+                    hash=[browser.owner, expiry],
+                ))
+                version = self.relay.observe()
+                for _ in range(3):
+                    self.assertTrue(browser.tick())
+                self.assertEqual(self.upstream.lease('hash'), (browser.owner, expiry))
+                self.assertEqual(self.relay.observe(), version)
+            self.assertFalse(self.store.acquire_lease('hash', 'other', 60))
+            self.upstream.update(lambda payload: payload[LEASE_FIELD].update(hash=[browser.owner, time.time() - 1]))
+            self.assertTrue(self.store.acquire_lease('hash', 'other', 60))
+            self.assertEqual(self.upstream.lease('hash')[0], 'other')
+
+    def test_token_is_required(self) -> None:
+        """Test that relay with token rejects clients without it, reads included."""
+        self.relay.token = 'secret'
+        self.upstream.add_account('hash')
+        with self.assertRaises(InvalidRelayToken):
+            self.store.get_cookies('hash')
+        with self.assertRaises(InvalidRelayToken):
+            RelayStore(self.store.url, 'wrong').set_cookies([], 'hash')
+        store = RelayStore(self.store.url, 'secret')
+        store.set_cookies([{'name': 'a', 'value': '1'}], 'hash')
+        self.assertEqual(store.get_cookies('hash'), [{'name': 'a', 'value': '1'}])
+
+    def test_long_poll_reports_changes(self) -> None:
+        """Test that change made by other client wakes listener."""
+        self.store.get_cookies('test')
+        self.assertIsNone(self.store._listener)
+        self.store.listen()
+        self.relay.observe()
+        while self.store.version is None:
+            self.store.changed.wait(0.05)
+        self.upstream.set_cookies([], 'test')
+        self.relay.observe()
+        self.assertTrue(self.store.changed.wait(5))
+
+
+class RelayConfigTestCase(unittest.TestCase):
+    """Relay options of reso.ini tests."""
+
+    def setUp(self) -> None:
+        """Work in temporary directory with own reso.ini."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self) -> None:
+        """Return to working directory."""
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def write_ini(self, **options: str) -> None:
+        """Write reso.ini with passed options.
+
+        Args:
+            options: option values by field, underscores are replaced with dashes.
+        """
+        with open(INI_FILENAME, 'w', encoding='UTF-8') as ini_file:
+            ini_file.write('[options]\n')
+            for field, value in options.items():
+                ini_file.write('{field} = {value}\n'.format(field=field.replace('_', '-'), value=value))
+
+    def test_push_needs_relay(self) -> None:
+        """Test that push mode is accepted only with relay, telegram doesn't notify bot about its own edits."""
+        self.write_ini(sync='push', store='relay')
+        self.assertEqual(get_ini_options()['sync'], 'push')  # type: ignore
+        self.write_ini(sync='push', store='telegram')
+        with self.assertRaises(InvalidIniValueError):
+            get_ini_options()
+
+    def test_network_relay_needs_token(self) -> None:
+        """Test that relay listening outside this host must have token and client store sends it."""
+        self.write_ini(relay_listen='0.0.0.0:8765')
+        with self.assertRaises(InvalidIniValueError):
+            get_ini_options()
+        self.write_ini(relay_listen='127.0.0.1:8765')
+        get_ini_options()
+        self.write_ini(relay_listen='0.0.0.0:8765', relay_token='secret', store='relay')
+        store = get_store(get_ini_options())
+        self.assertEqual(store.session.headers['Authorization'], 'Bearer secret')  # type: ignore
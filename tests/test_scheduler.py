@@ -0,0 +1,41 @@
+"""Offline tests for tick scheduler."""
+
+import unittest
+
+from telebot.apihelper import ApiTelegramException
+
+from src.scheduler import TickScheduler, retry_after
+
+
+class TickSchedulerTestCase(unittest.TestCase):
+    """Tick and backoff intervals tests."""
+
+    def setUp(self) -> None:
+        """Create scheduler with default intervals."""
+        self.scheduler = TickScheduler(min_interval=1, max_interval=5, backoff_base=1.5, backoff_cap=30)
+
+    def test_stable_state_slows_down(self) -> None:
+        """Test that interval grows up to maximum and drops after activity."""
+        intervals = [self.scheduler.stable() for _ in range(10)]
+        self.assertEqual(intervals, sorted(intervals))
+        self.assertEqual(intervals[-1], 5)
+        self.assertEqual(self.scheduler.activity(), 1)
+
+    def test_backoff_is_bounded(self) -> None:
+        """Test that error pauses stay between base and cap."""
+        for _ in range(50):
+            self.assertTrue(1.5 <= self.scheduler.failure() <= 30)
+
+    def test_retry_after_is_honoured(self) -> None:
+        """Test that telegram 429 retry_after is the lower bound of the pause."""
+        error = ApiTelegramException(
+            'getChat',
+            None,
+            {'error_code': 429, 'description': 'Too Many Requests', 'parameters': {'retry_after': 7}},
+        )
+        self.assertEqual(retry_after(error), 7)
+        self.assertGreaterEqual(self.scheduler.failure(retry_after(error)), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
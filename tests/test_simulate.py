@@ -0,0 +1,22 @@
+"""Offline smoke test of convergence simulator."""
+
+import unittest
+
+from benchmarks.simulate import simulate
+
+
+class SimulateTestCase(unittest.TestCase):
+    """Small scenario converges without lost updates."""
+
+    def test_two_clients(self) -> None:
+        """Test login on one client and server rotations reach every client."""
+        result = simulate(2, rotations=2, scale=0.05, timeout=10.0)
+        self.assertEqual(result['not_converged'], 0)
+        self.assertEqual(result['lost_updates'], 0)
+        self.assertIsNotNone(result['login_convergence_s'])
+        self.assertGreater(result['api_calls'], 0)
+        self.assertIn('getChat', result['api_calls_by_method'])
+
+
+if __name__ == '__main__':
+    unittest.main()
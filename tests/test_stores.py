@@ -0,0 +1,100 @@
+"""Offline tests for local cookie stores."""
+
+import os
+import tempfile
+import unittest
+from threading import Thread
+
+from src.exceptions import InvalidHash
+from src.stores import ChangeSignal, CookieStore, FileStore, SnapshotStore
+
+
+class FileStoreTestCase(unittest.TestCase):
+    """Json file store tests."""
+
+    def setUp(self) -> None:
+        """Create store in temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cookies.json')
+        self.store = FileStore(self.path)
+
+    def tearDown(self) -> None:
+        """Remove temporary directory."""
+        self.directory.cleanup()
+
+    def test_base_store_is_abstract(self) -> None:
+        """Test that store without load, update and reinit can't be created."""
+        with self.assertRaises(TypeError):
+            CookieStore()  # type: ignore
+
+    def test_accounts_managing(self) -> None:
+        """Test add, set and remove account methods."""
+        self.store.add_account('hash')
+        self.assertEqual(sorted(self.store.accounts()), ['hash', 'test'])
+        self.store.set_cookies([{'name': 'a', 'value': '1'}], 'hash')
+        self.assertEqual(FileStore(self.path).get_cookies('hash'), [{'name': 'a', 'value': '1'}])
+        self.store.remove_account('hash')
+        with self.assertRaises(InvalidHash):
+            self.store.get_cookies('hash')
+
+    def test_other_process_changes_are_seen(self) -> None:
+        """Test that changes of another store instance are read and reported."""
+        self.store.reinit()
+        self.store.load()
+        FileStore(self.path).set_cookies([], 'test')
+        self.assertEqual(self.store.get_cookies('test'), [])
+        self.assertTrue(self.store.changed.is_set())
+
+    def test_snapshot_adds_account_on_save(self) -> None:
+        """Test that snapshot starts empty and keeps saved cookies across instances."""
+        snapshot = SnapshotStore(self.path)
+        with self.assertRaises(InvalidHash):
+            snapshot.get_cookies('hash')
+        snapshot.set_cookies([{'name': 'a', 'value': '1'}], 'hash')
+        self.assertEqual(SnapshotStore(self.path).get_cookies('hash'), [{'name': 'a', 'value': '1'}])
+
+    def test_writer_lease(self) -> None:
+        """Test that only lease holder publishes and lease passes on expiry, release and force."""
+        self.store.add_account('hash')
+        cookies = [{'name': 'a', 'value': '1'}]
+        self.assertTrue(self.store.acquire_lease('hash', 'leader', 60, cookies=cookies))
+        self.assertEqual(self.store.get_cookies('hash'), cookies)
+        key = self.store._key
+        # свежая аренда не переписывается, чужая не отдается
+        self.assertTrue(self.store.acquire_lease('hash', 'leader', 60))
+        self.assertFalse(self.store.acquire_lease('hash', 'follower', 60, cookies=[]))
+        self.assertEqual(self.store._key, key)
+        self.assertEqual(self.store.get_cookies('hash'), cookies)
+        self.assertTrue(self.store.acquire_lease('hash', 'human', 60, force=True))
+        self.store.release_lease('hash', 'human')
+        self.assertIsNone(self.store.lease('hash'))
+        self.assertTrue(self.store.acquire_lease('hash', 'follower', -1))
+        self.assertTrue(self.store.acquire_lease('hash', 'leader', 60))
+        self.assertEqual(self.store.lease('hash')[0], 'leader')  # type: ignore
+        self.store.remove_account('hash')
+        self.assertIsNone(self.store.lease('hash'))
+
+
+class ChangeSignalTestCase(unittest.TestCase):
+    """Change notification shared by sessions of one store."""
+
+    def test_every_waiter_sees_change(self) -> None:
+        """Test that waiter woken first doesn't hide change from the others."""
+        signal = ChangeSignal()
+        seen = signal.generation
+        results = []
+        waiters = [Thread(target=lambda: results.append(signal.wait_newer(seen, 5))) for _ in range(3)]
+        for waiter in waiters:
+            waiter.start()
+        signal.set()
+        for waiter in waiters:
+            waiter.join()
+        self.assertEqual(results, [seen + 1] * 3)
+        self.assertEqual(signal.wait_newer(seen + 1, 0), seen + 1)
+        self.assertTrue(signal.wait(0))
+        signal.clear()
+        self.assertFalse(signal.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()